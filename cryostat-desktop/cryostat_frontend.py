@@ -10,6 +10,8 @@ import time
 import json
 import socket
 
+from pull_socket_client import PullSocketClient
+
 
 class InvalidFieldError(Exception):
     pass
@@ -22,10 +24,12 @@ class MainWindow(QtWidgets.QMainWindow):
         self.write_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
         self.write_socket.setblocking(0)
 
-        # Used for continous communication with cryostat
+        # Used for replies to commands sent to the cryostat
         self.read_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
         self.read_socket.setblocking(0)
-        self.read_socket_in_use = False
+
+        # Used for continous communication with cryostat
+        self.cryostat_client = PullSocketClient('10.54.4.78', timeout=0.2)
 
         self.latest_measurement_type = None
         self.t_start = time.time()
@@ -339,30 +343,10 @@ class MainWindow(QtWidgets.QMainWindow):
         setpoint = self.sample_temp_setpoint.value()
         self._update_via_socket('sample_temperature_setpoint', setpoint)
 
-    def _read_socket(self, cmd, port=9000):
-        self.read_socket_in_use = True
-        try:
-            socket_cmd = cmd + '#json'
-            self.read_socket.sendto(socket_cmd.encode(), ('10.54.4.78', port))
-            time.sleep(0.01)
-            recv = self.read_socket.recv(65535).decode('ascii')
-            data = json.loads(recv)
-            if 'OLD' in data:
-                value = None
-            else:
-                value = data[1]
-        except BlockingIOError:
-            value = None
-        self.read_socket_in_use = False
-        return value
-
-    def _update_temp_and_field(self):
-        # TODO:
-        # Consider to move all the socket reads into a separate thread that
-        # will continuously track these values
-        vti_temp = self._read_socket('cryostat_vti_temperature')
-        sample_temp = self._read_socket('cryostat_sample_temperature')
-        b_field = self._read_socket('cryostat_magnetic_field')
+    def _update_temp_and_field(self, values):
+        vti_temp = values['cryostat_vti_temperature']
+        sample_temp = values['cryostat_sample_temperature']
+        b_field = values['cryostat_magnetic_field']
         if vti_temp is None or b_field is None:
             return
         self.sample_temp_show.setText('{:.2f}K'.format(sample_temp))
@@ -406,15 +390,23 @@ class MainWindow(QtWidgets.QMainWindow):
         else:
             self.ramp_time_show.setText('')
 
-        if self.read_socket_in_use:
-            time.sleep(0.05)
-            return
-
-        self._update_temp_and_field()
-
-        # Read status of ongoing measurement
-        status = self._read_socket('status', 9002)
+        # Mercury values on port 9000 and the status of the ongoing
+        # measurement on port 9002 are read in a single round trip
+        values = self.cryostat_client.read_ports(
+            {
+                9000: [
+                    'cryostat_vti_temperature',
+                    'cryostat_sample_temperature',
+                    'cryostat_magnetic_field',
+                ],
+                9002: ['status', 'v_tot', 'v_xx'],
+            }
+        )
+        self._update_temp_and_field(values[9000])
 
+        status = values[9002]['status']
+        if status is None:
+            return
         measurement_type = status['type']
         print(measurement_type)
         if not measurement_type == self.latest_measurement_type:
@@ -423,12 +415,12 @@ class MainWindow(QtWidgets.QMainWindow):
 
         if measurement_type is None:
             # v_tot is just a value, not a (time, value) point
-            v_tot = self._read_socket('v_tot', 9002)
+            v_tot = values[9002]['v_tot']
             self.measurement_plot_x.append(time.time() - self.t_start)
             self.measurement_plot_y.append(v_tot)
             self.current_measurement_show.setText('No measurement')
         else:
-            v_xx = self._read_socket('v_xx', 9002)
+            v_xx = values[9002]['v_xx']
             self.current_measurement_show.setText(measurement_type)
             if v_xx is not None:
                 if None not in v_xx:
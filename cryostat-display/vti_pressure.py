@@ -3,13 +3,13 @@ from PyQt5 import QtGui, QtWidgets, QtCore, uic
 import pyqtgraph as pg
 
 import sys  # why?
-import json
 import time
-import socket
 import threading
 
 from collections import deque
 
+from pull_socket_client import PullSocketClient
+
 
 SERVER_IP = '10.54.4.78'
 
@@ -22,9 +22,7 @@ class CryostatReader(threading.Thread):
         self.running = True
         self.daemon = True
 
-        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        self.sock.setblocking(1)
-        self.sock.settimeout(1)
+        self.client = PullSocketClient(SERVER_IP, timeout=1)
         self.values = {
             'cryostat_vti_pressure': (-1, -1),
             'cryostat_vti_temperature': (-1, -1),
@@ -33,17 +31,13 @@ class CryostatReader(threading.Thread):
     def run(self):
         while self.running:
             time.sleep(1.0)
-            for codename in self.values.keys():
-                try:
-                    cmd = '{}#json'.format(codename).encode()
-                    self.sock.sendto(cmd, (SERVER_IP, 9000))
-                    print('klaf', codename, time.time())
-                    recv = self.sock.recv(65535)
-                    data = json.loads(recv)
-                    self.values[codename] = (time.time(), data[1])
-                except socket.timeout:
-                    print('Timeout')
-                    time.sleep(1)
+            values = self.client.read(list(self.values.keys()))
+            if None in values.values():
+                print('Timeout')
+                time.sleep(1)
+            for codename, value in values.items():
+                if value is not None:
+                    self.values[codename] = (time.time(), value)
 
 
 class MainWindow(QtWidgets.QMainWindow):
@@ -0,0 +1,263 @@
+"""Local spool in front of the continuous data savers"""
+
+import time
+import sqlite3
+import threading
+
+from PyExpLabSys.common.database_saver import ContinuousDataSaver
+
+
+class DataSpool(object):
+    """
+    Append-only list of (codename, time, value) points in a local
+    SQLite file. Points stay in the spool until explicitly removed, also
+    across restarts of the program.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self._lock = threading.Lock()
+        self.connection = sqlite3.connect(
+            filename, check_same_thread=False, isolation_level=None
+        )
+        # WAL makes appends cheap and lets reads run next to writes
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS spool ('
+            'id INTEGER PRIMARY KEY AUTOINCREMENT, '
+            'codename TEXT NOT NULL, time REAL NOT NULL, value REAL)'
+        )
+
+    def __len__(self):
+        with self._lock:
+            cursor = self.connection.execute('SELECT COUNT(*) FROM spool')
+            return cursor.fetchone()[0]
+
+    def count(self, codename):
+        with self._lock:
+            cursor = self.connection.execute(
+                'SELECT COUNT(*) FROM spool WHERE codename = ?', (codename,)
+            )
+            return cursor.fetchone()[0]
+
+    def append(self, codename, unixtime, value):
+        with self._lock:
+            self.connection.execute(
+                'INSERT INTO spool (codename, time, value) VALUES (?, ?, ?)',
+                (codename, unixtime, value),
+            )
+
+    def read(self, max_points, skip=()):
+        """
+        Return the oldest points as a list of (id, codename, time, value),
+        points of the codenames in skip are left out
+        """
+        query = 'SELECT id, codename, time, value FROM spool{} ORDER BY id LIMIT ?'
+        with self._lock:
+            cursor = self.connection.execute(
+                query.format(self._exclude(skip)), list(skip) + [max_points]
+            )
+            return cursor.fetchall()
+
+    def remove(self, last_id, keep=()):
+        """
+        Remove all points up to and including last_id, except the points
+        of the codenames in keep
+        """
+        query = 'DELETE FROM spool WHERE id <= ?'
+        if keep:
+            query += ' AND codename NOT IN ({})'.format(', '.join('?' * len(keep)))
+        with self._lock:
+            self.connection.execute(query, [last_id] + list(keep))
+
+    @staticmethod
+    def _exclude(codenames):
+        if not codenames:
+            return ''
+        return ' WHERE codename NOT IN ({})'.format(', '.join('?' * len(codenames)))
+
+    def close(self):
+        with self._lock:
+            self.connection.close()
+
+
+class SpooledContinuousDataSaver(threading.Thread):
+    """
+    Drop-in replacement for ContinuousDataSaver that writes all points to
+    a local DataSpool. A background thread uploads the spooled points to
+    the database in bulk and keeps retrying while the database is
+    unreachable, so saving a point never waits for the network.
+    """
+
+    def __init__(
+        self,
+        continuous_data_table,
+        username,
+        password,
+        measurement_codenames=None,
+        spool_file=None,
+        batch_size=500,
+        upload_interval=1,
+        retry_interval=30,
+        resolve_interval=300,
+    ):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.continuous_data_table = continuous_data_table
+        self.username = username
+        self.password = password
+        self._codenames_lock = threading.Lock()
+        self.codenames = set()
+        if measurement_codenames is not None:
+            self.codenames.update(measurement_codenames)
+        if spool_file is None:
+            spool_file = continuous_data_table + '_spool.sqlite'
+        self.spool = DataSpool(spool_file)
+        self.batch_size = batch_size
+        self.upload_interval = upload_interval
+        self.retry_interval = retry_interval
+        self.resolve_interval = resolve_interval
+
+        # Database id of the codenames, ids never change so the cache is
+        # kept across reconnects. Codenames without a description in the
+        # database are looked up again after resolve_interval
+        self.codename_ids = {}
+        self._unresolved = {}  # codename -> time of latest failed lookup
+
+        self.insert_query = (
+            'INSERT INTO {} (type, time, value) VALUES (%s, FROM_UNIXTIME(%s), %s)'
+        ).format(continuous_data_table)
+        self.saver = None  # Connected ContinuousDataSaver, None when offline
+        self.uploaded_points = 0
+        self.failed_uploads = 0
+        self._stop_event = threading.Event()
+
+    def add_continuous_measurement(self, codename):
+        """
+        Codenames can be added at any time, the id is looked up by the
+        upload thread together with other new codenames. Codenames that are
+        not added are registered when their first point is uploaded. Until
+        a codename has an id in the database, its points stay in the spool.
+        """
+        with self._codenames_lock:
+            self.codenames.add(codename)
+
+    def save_point_now(self, codename, value):
+        unixtime = time.time()
+        self.save_point(codename, (unixtime, value))
+        return unixtime
+
+    def save_point(self, codename, point):
+        self.spool.append(codename, point[0], point[1])
+
+    def _connect(self):
+        # The ContinuousDataSaver is only used for its connection, its own
+        # saving thread is never started. Codenames are resolved by
+        # _resolve_codenames() rather than one query pr. codename. The
+        # connection of a previous saver is closed before it is replaced
+        if self.saver is not None:
+            self._disconnect()
+        self.saver = ContinuousDataSaver(
+            continuous_data_table=self.continuous_data_table,
+            username=self.username,
+            password=self.password,
+        )
+
+    def _resolve_codenames(self, codenames):
+        """
+        Look up the ids of all new codenames in a single query
+        """
+        now = time.time()
+        missing = []
+        for codename in codenames:
+            if codename in self.codename_ids:
+                continue
+            failed = self._unresolved.get(codename)
+            if failed is not None and now - failed < self.resolve_interval:
+                continue
+            missing.append(codename)
+        if not missing:
+            return
+
+        query = (
+            'SELECT codename, id FROM dateplots_descriptions WHERE codename IN ({})'
+        ).format(', '.join(['%s'] * len(missing)))
+        cursor = self.saver.connection.cursor()
+        cursor.execute(query, missing)
+        for codename, codename_id in cursor.fetchall():
+            self.codename_ids[codename] = codename_id
+        self.saver.codename_translation.update(self.codename_ids)
+        for codename in missing:
+            if codename in self.codename_ids:
+                self._unresolved.pop(codename, None)
+            else:
+                msg = 'No database id for codename {}, {} points kept in the spool'
+                print(msg.format(codename, self.spool.count(codename)))
+                self._unresolved[codename] = now
+
+    def _disconnect(self):
+        saver = self.saver
+        self.saver = None
+        try:
+            saver.connection.close()
+        except Exception:  # Connection is most likely gone already
+            pass
+
+    def _upload_batch(self):
+        """
+        Upload the oldest batch of spooled points. Returns the number of points
+        that was taken from the spool.
+        """
+        with self._codenames_lock:
+            codenames = list(self.codenames)
+        self._resolve_codenames(codenames)
+        # Points of codenames without a database id stay in the spool until
+        # the id is found, they must not hold back the other codenames
+        unresolved = [c for c in codenames if c not in self.codename_ids]
+        rows = self.spool.read(self.batch_size, skip=unresolved)
+        if not rows:
+            return 0
+        # Points may also arrive for codenames never explicitly added
+        new_codenames = set(row[1] for row in rows).difference(codenames)
+        if new_codenames:
+            with self._codenames_lock:
+                self.codenames.update(new_codenames)
+            self._resolve_codenames(new_codenames)
+            unresolved += [c for c in new_codenames if c not in self.codename_ids]
+        translation = self.codename_ids
+        query_args = []
+        for _, codename, unixtime, value in rows:
+            if codename in translation:
+                query_args.append((translation[codename], unixtime, value))
+
+        cursor = self.saver.connection.cursor()
+        cursor.executemany(self.insert_query, query_args)
+        self.saver.connection.commit()
+        self.spool.remove(rows[-1][0], keep=unresolved)
+        self.uploaded_points += len(query_args)
+        return len(rows)
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                if self.saver is None:
+                    self._connect()
+                while self._upload_batch() == self.batch_size:
+                    pass
+                wait = self.upload_interval
+            except Exception as exception:  # Typically the database is offline
+                print('Spool upload failed, {} points waiting: {}'.format(
+                    len(self.spool), exception))
+                self.failed_uploads += 1
+                if self.saver is not None:
+                    self._disconnect()
+                wait = self.retry_interval
+            self._stop_event.wait(wait)
+        if self.saver is not None:
+            self._disconnect()
+        self.spool.close()
@@ -7,10 +7,11 @@ from PyExpLabSys.common.sockets import DataPushSocket
 from PyExpLabSys.common.sockets import DateDataPullSocket
 
 from PyExpLabSys.common.value_logger import ValueLogger
-from PyExpLabSys.common.database_saver import ContinuousDataSaver
 
 import credentials
 
+from data_spool import SpooledContinuousDataSaver
+
 
 class MercuryComm(threading.Thread):
     """ Read values from the mercury controlle """
@@ -123,7 +124,7 @@ class Logger(object):
             'cryostat_magnet_voltage': 0.05, 'cryostat_magnet_current': 0.1,
             'cryostat_magnetic_field': 0.005, 'cryostat_vti_heater_power': 0.2,
         }
-        self.db_logger = ContinuousDataSaver(
+        self.db_logger = SpooledContinuousDataSaver(
             continuous_data_table='dateplots_cryostat',
             username=credentials.user,
             password=credentials.passwd,
@@ -1,11 +1,19 @@
 import time
 
+from cryostat_measurement_base import CryostatMeasurementBase
 from cryostat_dc_base import CryostatDCBase
 
 
 class Cryostat4PointDC(CryostatDCBase):
     def __init__(self):
-        super().__init__()
+        # Trigger all instruments, no hurt in also triggering non-used instruments
+        trigger_list = [
+            1,  # Vxy - white
+            2,  # DMM - brown
+            3,  # Vxx - Green
+            4,  # Osciloscope - Yellow
+        ]
+        super().__init__(trigger_list)
 
     def abort_measurement(self):
         print('ABORT')
@@ -35,7 +43,7 @@ class Cryostat4PointDC(CryostatDCBase):
         self.reset_current_measurement('dc_sweep')
 
         # Configure instruments:
-        self._configure_back_gate()  # Also used to trigger 2182a's
+        self.configure_back_gate()  # Also used to trigger 2182a's
         if gate_v is not None:
             self.back_gate.set_voltage(gate_v)
 
@@ -52,7 +60,11 @@ class Cryostat4PointDC(CryostatDCBase):
             self._read_voltages(nplc, store_gate=False)
 
         iteration = 0
-        for current in self._calculate_steps(start, stop, steps):
+        # CryostatDCBase._calculate_steps() calculates gate sweeps, this is a
+        # linear current sweep
+        current_steps = CryostatMeasurementBase._calculate_steps(
+            self, start, stop, steps)
+        for current in current_steps:
             iteration += 1
             if self.current_measurement['type'] is None:
                 # Measurement has been aborted, skip through the
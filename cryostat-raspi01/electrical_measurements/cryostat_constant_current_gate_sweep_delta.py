@@ -17,7 +17,7 @@ class CryostatDeltaConstantCurrentGateSweep(CryostatDCBase):
             2,  # DMM - brown
             4,  # Osciloscope - Yellow
         ]
-        super().__init__()
+        super().__init__(trigger_list)
 
     def abort_measurement(self):
         print('ABORT')
@@ -55,7 +55,7 @@ class CryostatDeltaConstantCurrentGateSweep(CryostatDCBase):
         self._configure_nano_voltmeters(nplc)
 
         
-        self._configure_back_gate()
+        self.configure_back_gate()
         # time.sleep(1)
         # I do not know, why this is necessary - find out!!!
         # self.back_gate.set_current_limit(1e-6)
@@ -1,5 +1,4 @@
 import time
-import threading
 # import logging
 
 import numpy as np
@@ -10,6 +9,7 @@ from cryostat_measurement_base import CryostatMeasurementBase
 from cryostat_threaded_voltage import MeasureVxx
 from cryostat_threaded_voltage import MeasureVxy
 from cryostat_threaded_voltage import MeasureVTotal
+from instrument_trace import LatencyHistogram
 
 
 class CryostatDCBase(CryostatMeasurementBase):
@@ -34,9 +34,43 @@ class CryostatDCBase(CryostatMeasurementBase):
             interface='serial',
             device='/dev/serial/by-id/' + device,
         )
-        self.masure_voltage_xx = MeasureVxx(self.xx_nanov)
-        self.masure_voltage_xy = MeasureVxy(self.xy_nanov)
-        self.masure_voltage_total = MeasureVTotal(self.dmm)
+        self.tracer.trace(self.xx_nanov, 'xx_nanov')
+        self.tracer.trace(self.xy_nanov, 'xy_nanov')
+
+        # One long-lived reader thread pr. instrument, the histograms show
+        # which of the serial links is limiting the measurement rate
+        self.read_latency = {
+            'v_xx': LatencyHistogram(),
+            'v_xy': LatencyHistogram(),
+            'v_total': LatencyHistogram(),
+        }
+        self.masure_voltage_xx = MeasureVxx(
+            self.xx_nanov, self.read_latency['v_xx'])
+        self.masure_voltage_xy = MeasureVxy(
+            self.xy_nanov, self.read_latency['v_xy'])
+        self.masure_voltage_total = MeasureVTotal(
+            self.dmm, self.read_latency['v_total'])
+        self.masure_voltage_xx.start()
+        self.masure_voltage_xy.start()
+        self.masure_voltage_total.start()
+
+    def stop(self):
+        super().stop()
+        readers = (
+            self.masure_voltage_xx,
+            self.masure_voltage_xy,
+            self.masure_voltage_total,
+        )
+        for reader in readers:
+            reader.stop()
+        for reader in readers:
+            reader.join()
+
+    def read_latency_summary(self):
+        summary = {}
+        for channel, histogram in self.read_latency.items():
+            summary[channel] = histogram.summary()
+        return summary
 
     # This code is also used in the Linkham code
     def _calculate_steps(self, v_low, v_high, steps, repeats):
@@ -98,21 +132,9 @@ class CryostatDCBase(CryostatMeasurementBase):
 
     def _read_voltages(self, nplc, store_gate=True):
         # Prepare to listen for triggers
-        t_vxx = threading.Thread(
-            target=self.masure_voltage_xx.start_measurement,
-            kwargs={'nplc': nplc}
-        )
-        t_vxx.start()
-        t_vxy = threading.Thread(
-            target=self.masure_voltage_xy.start_measurement,
-            kwargs={'nplc': nplc}
-        )
-        t_vxy.start()
-        t_vtotal = threading.Thread(
-            target=self.masure_voltage_total.start_measurement,
-            # kwargs={'nplc': nplc}  # TODO!
-        )
-        t_vtotal.start()
+        self.masure_voltage_xx.start_measurement(nplc=nplc)
+        self.masure_voltage_xy.start_measurement(nplc=nplc)
+        self.masure_voltage_total.start_measurement()  # TODO: nplc
 
         # Read the measured result
         v_total = self.masure_voltage_total.read_voltage()
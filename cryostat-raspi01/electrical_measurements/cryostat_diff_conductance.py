@@ -5,7 +5,14 @@ from cryostat_measurement_base import CryostatMeasurementBase
 
 class CryostatDifferentialConductance(CryostatMeasurementBase):
     def __init__(self):
-        super().__init__()
+        # Trigger all instruments, no hurt in also triggering non-used instruments
+        trigger_list = [
+            1,  # Vxy - white
+            2,  # DMM - brown
+            3,  # Vxx - Green
+            4,  # Osciloscope - Yellow
+        ]
+        super().__init__(trigger_list)
 
     def abort_measurement(self):
         print('ABORT')
@@ -41,7 +48,7 @@ class CryostatDifferentialConductance(CryostatMeasurementBase):
         # TODO: We cannot measure gate_v and current here, because it currently
         # messes up with the trigger-mechanism of the differential conductance
         # Consider to do a single measurement before and after main run
-        self._configure_back_gate()
+        self.configure_back_gate()
         if gate_v is not None:
             self.back_gate.set_voltage(gate_v)
 
@@ -55,11 +62,8 @@ class CryostatDifferentialConductance(CryostatMeasurementBase):
             if self.current_measurement['type'] is None:
                 # Measurement has been aborted - do something!
                 break
-            t = time.time()
+            # Latency of the reads is available from self.tracer
             row = self.current_source.read_diff_conduct_line()
-            print('Get row: {}'.format(time.time() - t))
-
-            t = time.time()
             if row:
                 data = {
                     'current': row['current'],
@@ -67,7 +71,6 @@ class CryostatDifferentialConductance(CryostatMeasurementBase):
                     'dv_di': row['reading'],
                 }
                 self.add_to_current_measurement(data)
-            print('Added row: {}'.format(time.time() - t))
 
             # TODO! Find a better way to detect that the measurement has ended!
             # Possibly by counting rows if we trust we get all of them
@@ -75,12 +78,10 @@ class CryostatDifferentialConductance(CryostatMeasurementBase):
             if row.get('current', 0) >= stop - step_size:
                 break
 
-            t = time.time()
             # This will fail due to lag of triggering at the very last row
             v_total = self.dmm.next_reading()
             data = {'v_total': v_total}
             self.add_to_current_measurement(data)
-            print('Read DMM: {}'.format(time.time() - t))
 
             # if (i > 15) and (len(data) < 5):
             if (i > 15) and (row is None):
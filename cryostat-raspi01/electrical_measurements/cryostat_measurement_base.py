@@ -1,3 +1,4 @@
+import os
 import json
 import time
 import socket
@@ -12,31 +13,50 @@ from PyExpLabSys.common.database_saver import DataSetSaver, CustomColumn
 
 import credentials
 
+from measurement_buffer import MeasurementBuffer
+from batched_point_writer import BatchedPointWriter
+from socket_subscriber import shared_subscriber
+from instrument_trace import InstrumentTracer
+
 
 CURRENT_MEASUREMENT_PROTOTYPE = {
     'type': None,  # DC-sweep, AC-sweep
     'error': None,
     'start_time': 0,
     'current_time': 0,
-    'current': [],
-    'v_total': [],
-    'v_xx': [],
-    'v_xy': [],
-    'dv_di': [],
-    'theta': [],
-    'v_backgate': [],
-    'i_backgate': [],
-    'v_frontgate': [],
-    'i_frontgate': [],
-    'b_field': [],
-    'vti_temp': [],
-    'sample_temp': [],
 }
 
+# Each channel is stored as a MeasurementBuffer in current_measurement
+CURRENT_MEASUREMENT_CHANNELS = [
+    'current',
+    'v_total',
+    'v_xx',
+    'v_xy',
+    'dv_di',
+    'theta',
+    'v_backgate',
+    'i_backgate',
+    'v_frontgate',
+    'i_frontgate',
+    'b_field',
+    'vti_temp',
+    'sample_temp',
+]
+# Maximal number of points kept in memory pr channel, older points are
+# still available in the database. None will keep all points.
+CURRENT_MEASUREMENT_MAX_POINTS = 100000
+# If not None, every instrument call of a measurement is written to a trace
+# file in this directory
+TRACE_DIRECTORY = None
+
 
 class CryostatMeasurementBase(object):
     def __init__(self, trigger_list):
         self.current_measurement = CURRENT_MEASUREMENT_PROTOTYPE.copy()
+        for channel in CURRENT_MEASUREMENT_CHANNELS:
+            self.current_measurement[channel] = MeasurementBuffer(
+                max_length=CURRENT_MEASUREMENT_MAX_POINTS
+            )
 
         self.current_source = Keithley6220(interface='lan', path='192.168.0.3')
         self.back_gate = Keithley2450(interface='lan', device='192.168.0.30')
@@ -47,6 +67,13 @@ class CryostatMeasurementBase(object):
             baudrate=9600,
         )
 
+        # Latency of every instrument call, published by the controller
+        self.tracer = InstrumentTracer()
+        self.tracer.trace(self.current_source, 'current_source')
+        self.tracer.trace(self.back_gate, 'back_gate')
+        self.tracer.trace(self.front_gate, 'front_gate')
+        self.tracer.trace(self.dmm, 'dmm')
+
         # TODO: Currently we trig all instruments; we should aim towards
         # trigging only the ones we will actually use
         self.back_gate.configure_digital_port_as_triggers(trigger_list)
@@ -57,6 +84,16 @@ class CryostatMeasurementBase(object):
         self.sock.setblocking(1)
         self.sock.settimeout(1.0)
 
+        # Latest values from the Mercury datalogger, kept up to date in
+        # the background so _read_cryostat() never waits for the network
+        self.cryostat_state = shared_subscriber(
+            codenames=[
+                'cryostat_magnetic_field',
+                'cryostat_vti_temperature',
+                'cryostat_sample_temperature',
+            ]
+        )
+
         # self.chamber_name = 'cryostat'
         self.chamber_name = 'dummy'
 
@@ -66,6 +103,15 @@ class CryostatMeasurementBase(object):
                                            "xy_values_" + self.chamber_name,
                                            credentials.user, credentials.passwd)
         self.data_set_saver.start()
+        self.point_writer = BatchedPointWriter(self.data_set_saver)
+        self.point_writer.start()
+
+    def stop(self):
+        """
+        Stop the background threads, called before the controller replaces
+        the measurement object
+        """
+        self.point_writer.stop()
 
     def _identify_all_instruments(self):
         raise NotImplementedError
@@ -82,9 +128,9 @@ class CryostatMeasurementBase(object):
         return value
 
     def _read_cryostat(self):
-        field = self._read_socket('cryostat_magnetic_field#json')
-        vti_temp = self._read_socket('cryostat_vti_temperature#json')
-        sample_temp = self._read_socket('cryostat_sample_temperature#json')
+        field = self.cryostat_state.value('cryostat_magnetic_field')
+        vti_temp = self.cryostat_state.value('cryostat_vti_temperature')
+        sample_temp = self.cryostat_state.value('cryostat_sample_temperature')
         data = {
             'b_field': field,
             'vti_temp': vti_temp,
@@ -130,12 +176,17 @@ class CryostatMeasurementBase(object):
         stops, in this case keep the data for now.
         """
         if measurement_type is None:
+            self.point_writer.flush()
+            self.tracer.stop_trace_file()
             self.current_measurement['type'] = None
             self.current_measurement['error'] = error
         else:
+            if TRACE_DIRECTORY is not None:
+                filename = '{}_{:.0f}.jsonl'.format(measurement_type, time.time())
+                self.tracer.start_trace_file(os.path.join(TRACE_DIRECTORY, filename))
             for key, value in self.current_measurement.items():
-                if isinstance(value, list):
-                    self.current_measurement[key].clear()
+                if isinstance(value, MeasurementBuffer):
+                    value.clear()
             self.current_measurement.update(
                 {
                     'type': measurement_type,
@@ -151,11 +202,11 @@ class CryostatMeasurementBase(object):
         and temporarely in the local dict self.current_measurement
         """
         now = time.time() - self.current_measurement['start_time']
-        for key in self.current_measurement.keys():
-            if key in data_point:
-                value = data_point[key]
-                self.current_measurement[key].append((now, value))
-                self.data_set_saver.save_point(key, (now, value))
+        for key, value in data_point.items():
+            channel = self.current_measurement.get(key)
+            if isinstance(channel, MeasurementBuffer):
+                channel.append(now, value)
+                self.point_writer.save_point(key, (now, value))
         self.current_measurement['current_time'] = time.time()
 
     def _add_metadata(self,
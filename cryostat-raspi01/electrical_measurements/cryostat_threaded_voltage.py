@@ -1,32 +1,67 @@
 import time
+import queue
+import threading
+from concurrent.futures import Future
+
 import pyvisa
 
+from instrument_trace import LatencyHistogram
+
+
+class BackgroundMeasure(threading.Thread):
+    """
+    Long-lived worker thread that owns the communication with a single
+    instrument. start_measurement() queues a request and returns at once,
+    the result is delivered through a Future that read_voltage() waits for.
+    """
 
-class BackgroundMeasure():
-    def __init__(self):
-        self.t_start = None
-        self.voltage = None
+    def __init__(self, histogram=None):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        if histogram is None:
+            histogram = LatencyHistogram()
+        self.histogram = histogram
+        self._requests = queue.Queue()
+        self._pending = None
 
-    def read_voltage(self):
-        while self.voltage is None:
-            time.sleep(0.01)
-        voltage = self.voltage
-        self.voltage = None
+    def read_voltage(self, timeout=None):
+        voltage = self._pending.result(timeout)
+        self._pending = None
         return voltage
 
     def _start_measurement(self):
         raise NotImplementedError
 
     def start_measurement(self, nplc=1):
-        self.t_start = time.time()
-        # Sleep a bit less than the integration time
-        time.sleep(nplc * 0.02 * 0.9)
-        self._start_measurement()
+        future = Future()
+        self._pending = future
+        self._requests.put((future, nplc, time.time()))
+        return future
+
+    def stop(self):
+        self._requests.put(None)
+
+    def run(self):
+        while True:
+            request = self._requests.get()
+            if request is None:
+                break
+            future, nplc, t_start = request
+            # Sleep a bit less than the integration time
+            time.sleep(nplc * 0.02 * 0.9)
+            try:
+                voltage = self._start_measurement()
+            except Exception as exception:  # Hand over to the reader
+                future.set_exception(exception)
+                continue
+            self.histogram.add(time.time() - t_start)
+            future.set_result(voltage)
 
 
 class MeasureVxx(BackgroundMeasure):
-    def __init__(self, nano_v):
-        super().__init__()
+    def __init__(self, nano_v, histogram=None):
+        super().__init__(histogram)
+        self.name = 'Vxx reader thread'
         self.nano_v = nano_v
 
     def _start_measurement(self):
@@ -36,13 +71,13 @@ class MeasureVxx(BackgroundMeasure):
             voltage = None
         if voltage is None:
             voltage = -1001
-        msg = 'Vxx: Voltage: {:.3f}. Time: {:.0f}ms'
-        # print(msg.format(voltage, 1000 * (time.time() - self.t_start)))
-        self.voltage = voltage
+        return voltage
+
 
 class MeasureVxy(BackgroundMeasure):
-    def __init__(self, nano_v):
-        super().__init__()
+    def __init__(self, nano_v, histogram=None):
+        super().__init__(histogram)
+        self.name = 'Vxy reader thread'
         self.nano_v = nano_v
 
     def _start_measurement(self):
@@ -52,18 +87,15 @@ class MeasureVxy(BackgroundMeasure):
             voltage = None
         if voltage is None:
             voltage = -1001
-        msg = 'Vxy: Voltage: {:.3f}. Time: {:.0f}ms'
-        # print(msg.format(voltage, 1000 * (time.time() - self.t_start)))
-        self.voltage = voltage
+        return voltage
 
 
 class MeasureVTotal(BackgroundMeasure):
-    def __init__(self, dmm):
-        super().__init__()
+    def __init__(self, dmm, histogram=None):
+        super().__init__(histogram)
+        self.name = 'DMM reader thread'
         self.dmm = dmm
 
     def _start_measurement(self):
         voltage = self.dmm.next_reading()
-        msg = 'DMM: Voltage: {:.3f}. Time: {:.0f}ms'
-        # print(msg.format(voltage, 1000 * (time.time() - self.t_start)))
-        self.voltage = voltage
+        return voltage
@@ -25,7 +25,10 @@ class CryostatController(threading.Thread):
         self.pushsocket.start()
 
         self.pullsocket = DateDataPullSocket(
-            'cryostat', ['status', 'v_xx', 'v_tot'], timeouts=[999999, 3, 3], port=9002
+            'cryostat',
+            ['status', 'v_xx', 'v_tot', 'read_latency', 'instrument_latency'],
+            timeouts=[999999, 3, 3, 999999, 999999],
+            port=9002,
         )
         self.pullsocket.start()
 
@@ -43,6 +46,7 @@ class CryostatController(threading.Thread):
 
     def start_dc_4_point(self, **kwargs):
         # TODO: Check that measurement is not already running
+        self.measurement.stop()
         del(self.measurement)
         self.measurement = Cryostat4PointDC()
         t = threading.Thread(
@@ -54,6 +58,7 @@ class CryostatController(threading.Thread):
 
     def start_diff_conductance(self, **kwargs):
         # TODO: Check that measurement is not already running
+        self.measurement.stop()
         del(self.measurement)
         self.measurement = CryostatDifferentialConductance()
         t = threading.Thread(
@@ -65,6 +70,7 @@ class CryostatController(threading.Thread):
 
     def start_constant_current(self, **kwargs):
         # TODO: Check that measurement is not already running
+        self.measurement.stop()
         del(self.measurement)
         self.measurement = CryostatConstantCurrent()
         t = threading.Thread(
@@ -76,6 +82,7 @@ class CryostatController(threading.Thread):
 
     def start_delta_constant_current(self, **kwargs):
         # TODO: Check that measurement is not already running
+        self.measurement.stop()
         del(self.measurement)
         self.measurement = CryostatDeltaConstantCurrent()
         t = threading.Thread(
@@ -87,6 +94,7 @@ class CryostatController(threading.Thread):
 
     def start_constant_current_gate_sweep(self, **kwargs):
         # TODO: Check that measurement is not already running
+        self.measurement.stop()
         del(self.measurement)
         self.measurement = CryostatConstantCurrentGateSweep()
         t = threading.Thread(
@@ -98,6 +106,7 @@ class CryostatController(threading.Thread):
 
     def start_delta_constant_current_gate_sweep(self, **kwargs):
         # TODO: Check that measurement is not already running
+        self.measurement.stop()
         del(self.measurement)
         self.measurement = CryostatDeltaConstantCurrentGateSweep()
         t = threading.Thread(
@@ -169,16 +178,19 @@ class CryostatController(threading.Thread):
             # Do not feed socket with old data, update v_xx only if a measurement
             # is running
             if self.measurement.current_measurement['type'] is not None:
-                if len(self.measurement.current_measurement['v_xx']) > 2:
-                    self.pullsocket.set_point_now(
-                        'v_xx',
-                        self.measurement.current_measurement['v_xx'][-1]
-                    )
+                v_xx = self.measurement.current_measurement['v_xx']
+                if len(v_xx) > 2:
+                    self.pullsocket.set_point_now('v_xx', v_xx.latest())
             status = {
                 'type': self.measurement.current_measurement['type'],
                 'start_time': self.measurement.current_measurement['start_time'],
             }
             self.pullsocket.set_point_now('status', status)
+            if hasattr(self.measurement, 'read_latency_summary'):
+                latency = self.measurement.read_latency_summary()
+                self.pullsocket.set_point_now('read_latency', latency)
+            latency = self.measurement.tracer.summary()
+            self.pullsocket.set_point_now('instrument_latency', latency)
 
             # if self.measurement.current_measurement['type'] is None:
             #     # gate_v = self.measurement.read_gate(store_data=False)
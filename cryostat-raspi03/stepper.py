@@ -0,0 +1,116 @@
+"""
+Hardware timed step pulses for a stepper motor driver (step and direction
+inputs).
+
+The pulses of a chunk of steps are handed to the backend as a list of step
+intervals. PigpioStepper turns them into a pigpio waveform, the pulses are
+then timed by the DMA of the Raspberry Pi and not by the Python thread.
+SimulatedStepper keeps the timing without any hardware, eg. for testing on
+a plain Linux machine. It is only used when asked for explicitly, with the
+environment variable VTI_SIMULATE=1.
+"""
+import os
+import time
+import math
+
+try:
+    import pigpio
+except ImportError:
+    pigpio = None
+
+PULSE_WIDTH = 50  # us, width of the high part of a step pulse
+
+
+def ramp_intervals(steps, rate, start_rate=50, acceleration=2000):
+    """
+    Intervals in seconds between the steps of a move of steps steps.
+    The step rate is ramped linearly in time from start_rate to rate (both
+    in steps/s) and back down at the end of the move, with acceleration in
+    steps/s^2.
+    """
+    if rate <= start_rate:
+        return [1.0 / rate] * steps
+    intervals = []
+    for n in range(steps):
+        # Distance to the nearest end of the move
+        distance = min(n, steps - 1 - n)
+        step_rate = math.sqrt(start_rate**2 + 2 * acceleration * distance)
+        intervals.append(1.0 / min(step_rate, rate))
+    return intervals
+
+
+class SimulatedStepper(object):
+    """
+    Backend without hardware, send() takes as long as the real pulses
+    """
+
+    def __init__(self):
+        self.direction_level = 0
+        self.steps = 0
+
+    def set_direction(self, level):
+        self.direction_level = level
+
+    def send(self, intervals):
+        time.sleep(sum(intervals))
+        self.steps += len(intervals)
+
+    def stop(self):
+        pass
+
+
+class PigpioStepper(object):
+    """
+    Backend using pigpio waveforms, pigpiod must be running
+    """
+
+    def __init__(self, step_pin, direction_pin, pulse_width=PULSE_WIDTH):
+        if pigpio is None:
+            raise RuntimeError('pigpio is not installed')
+        self.pi = pigpio.pi()
+        if not self.pi.connected:
+            raise RuntimeError('Cannot connect to pigpiod')
+        self.step_pin = step_pin
+        self.direction_pin = direction_pin
+        self.pulse_width = pulse_width
+        self.pi.set_mode(step_pin, pigpio.OUTPUT)
+        self.pi.set_mode(direction_pin, pigpio.OUTPUT)
+        self.pi.wave_clear()
+
+    def set_direction(self, level):
+        self.pi.write(self.direction_pin, level)
+
+    def send(self, intervals):
+        """
+        Send one step pulse pr. interval, returns when all are sent
+        """
+        mask = 1 << self.step_pin
+        pulses = []
+        for interval in intervals:
+            period = int(interval * 1e6)
+            pulses.append(pigpio.pulse(mask, 0, self.pulse_width))
+            pulses.append(pigpio.pulse(0, mask, max(period - self.pulse_width, 1)))
+        self.pi.wave_add_generic(pulses)
+        wave = self.pi.wave_create()
+        try:
+            self.pi.wave_send_once(wave)
+            # The last pulse is sent a full interval before the wave is done
+            time.sleep(max(sum(intervals) - intervals[-1], 0))
+            while self.pi.wave_tx_busy():
+                time.sleep(0.001)
+        finally:
+            self.pi.wave_delete(wave)
+
+    def stop(self):
+        self.pi.wave_tx_stop()
+
+
+def default_backend(step_pin, direction_pin):
+    """
+    pigpio, raises RuntimeError if pigpio is not installed or pigpiod is
+    not running. The simulation is used if VTI_SIMULATE=1 is set
+    """
+    if os.environ.get('VTI_SIMULATE') == '1':
+        print('VTI_SIMULATE=1, the needle valve is simulated')
+        return SimulatedStepper()
+    return PigpioStepper(step_pin, direction_pin)
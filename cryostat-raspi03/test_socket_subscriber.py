@@ -0,0 +1,85 @@
+"""
+Network failures must not stop the SocketSubscriber, run with:
+    python3 -m pytest test_socket_subscriber.py
+"""
+import json
+import time
+import socket
+import threading
+
+import pull_socket_client
+from pull_socket_client import PullSocketClient
+from socket_subscriber import SocketSubscriber
+
+
+class FakePullSocket(threading.Thread):
+    """Answers 'json_wn' like a DateDataPullSocket with a single value"""
+
+    def __init__(self, codename, value):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(('127.0.0.1', 0))
+        self.port = self.sock.getsockname()[1]
+        self.codename = codename
+        self.value = value
+
+    def run(self):
+        while True:
+            request, sender = self.sock.recvfrom(1024)
+            if request == b'json_wn':
+                reply = {self.codename: [time.time(), self.value]}
+                self.sock.sendto(json.dumps(reply).encode(), sender)
+
+
+def test_unresolvable_host_returns_none():
+    client = PullSocketClient('host.that.does.not.resolve.invalid', timeout=0.1)
+    assert client.read(['pressure'], port=9000) == {'pressure': None}
+    assert client.failed_reads == 1
+
+
+def test_subscriber_survives_failed_lookup(monkeypatch):
+    server = FakePullSocket('pressure', 12.5)
+    server.start()
+
+    lookups = []
+    gethostbyname = socket.gethostbyname
+
+    def failing_once(host):
+        lookups.append(host)
+        if len(lookups) == 1:
+            raise socket.gaierror('Name or service not known')
+        return gethostbyname(host)
+
+    monkeypatch.setattr(pull_socket_client.socket, 'gethostbyname', failing_once)
+    subscriber = SocketSubscriber(
+        port=server.port, codenames=['pressure'], interval=0.05, timeout=0.5
+    )
+    subscriber.start()
+    try:
+        update = subscriber.wait_for_update('pressure', timeout=2)
+    finally:
+        subscriber.stop()
+    assert update is not None
+    assert update[1] == 12.5
+    assert len(lookups) > 1
+
+
+def test_subscriber_survives_client_error():
+    subscriber = SocketSubscriber(codenames=['pressure'], interval=0.05)
+    reads = []
+
+    def read(codenames, port, points):
+        reads.append(codenames)
+        if len(reads) == 1:
+            raise OSError('Network is unreachable')
+        return {'pressure': (time.time(), 3.0)}
+
+    subscriber.client.read = read
+    subscriber.start()
+    try:
+        update = subscriber.wait_for_update('pressure', timeout=2)
+    finally:
+        subscriber.stop()
+    assert update is not None
+    assert update[1] == 3.0
@@ -1,14 +1,13 @@
 import time
-import socket
 import threading
-import RPi.GPIO as GPIO
-
-import PyExpLabSys.auxiliary.pid as PID
 
 from PyExpLabSys.common.sockets import LiveSocket
 from PyExpLabSys.common.sockets import DataPushSocket
 from PyExpLabSys.common.sockets import DateDataPullSocket
 
+from socket_subscriber import SocketSubscriber
+from stepper import default_backend, ramp_intervals
+
 DIRECTION_PIN = 23
 ROTATE_PIN = 24
 
@@ -16,49 +15,65 @@ ROTATE_PIN = 24
 class VTIControl(threading.Thread):
     """Physically control VTI needle valve"""
 
-    def __init__(self):
+    # ~12000 is a quarter of a turn
+    MAX_PULSES = 40000
+    MOVE_RATE = 500  # Steps / s of turn_valve()
+    CHUNK_TIME = 0.25  # Continuous rotation is sent in chunks of this length
+
+    def __init__(self, backend=None):
         threading.Thread.__init__(self)
         self.name = 'VTI control'
         self.daemon = True
 
-        # ~12000 is a quarter of a turn
-        self.pulses = 0
+        if backend is None:
+            backend = default_backend(ROTATE_PIN, DIRECTION_PIN)
+        self.backend = backend
+        self.pulses = 0  # Position, updated when a chunk of steps is sent
         self.step_direction = True  # -> Higer pressure
         self.rotation_speed = 0  # Steps / s
-        # Configure the two gpio pins as outputs
-        GPIO.setmode(GPIO.BCM)
-        GPIO.setup(DIRECTION_PIN, GPIO.OUT)
-        GPIO.setup(ROTATE_PIN, GPIO.OUT)
+        self._moves = []  # Pending turn_valve() moves, (steps, direction)
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._idle = threading.Event()
+        self._idle.set()
 
     def set_direction(self, direction: bool):
+        # Used for the continuous rotation, the pin is set before each chunk
         self.step_direction = direction
-        if direction:
-            GPIO.output(DIRECTION_PIN, GPIO.LOW)
-        else:
-            GPIO.output(DIRECTION_PIN, GPIO.HIGH)
 
-    def _single_step(self):
-        if abs(self.pulses) > 40000:
+    def _send(self, intervals, direction):
+        """
+        Send the steps, as many as the limits of the valve allow. Returns
+        False if the valve has reached a limit
+        """
+        sign = 1 if direction else -1
+        room = self.MAX_PULSES - sign * self.pulses
+        steps = min(len(intervals), max(room, 0))
+        if steps > 0:
+            self.backend.set_direction(0 if direction else 1)
+            self.backend.send(intervals[:steps])
+            self.pulses += sign * steps
+        if steps < len(intervals):
             print('Needle valve cannot turn any further')
             return False
-        GPIO.output(ROTATE_PIN, GPIO.HIGH)
-        time.sleep(0.001)
-        GPIO.output(ROTATE_PIN, GPIO.LOW)
-        time.sleep(0.001)
-        if self.step_direction:
-            self.pulses += 1
-        else:
-            self.pulses -= 1
         return True
 
     def turn_valve(self, steps: int, direction: bool):
-        self.rotation_speed = 0
-        self.set_direction(direction)
-        for i in range(0, steps):
-            result = self._single_step()
-            if not result:
-                break
-        return result
+        """
+        Queue a move of steps steps, the move is ramped up and down and
+        runs in the background, see wait()
+        """
+        with self._lock:
+            self.rotation_speed = 0
+            self._moves.append((steps, direction))
+            self._idle.clear()
+        self._wake.set()
+
+    def wait(self, timeout=None):
+        """
+        Wait for the queued moves to finish
+        """
+        return self._idle.wait(timeout)
 
     def set_rotation_speed(self, rotation_speed):
         if rotation_speed < 0.5:
@@ -67,22 +82,75 @@ class VTIControl(threading.Thread):
             self.rotation_speed = 100
         else:
             self.rotation_speed = rotation_speed
+        self._wake.set()
 
     def run(self):
         rotate_ok = True
         while rotate_ok:
-            if self.rotation_speed > 0:
-                wait_time = 1.0 / self.rotation_speed
-                msg = 'Waiting for {}ms. Steps are: {}'
-                # print(msg.format(wait_time * 1000, self.pulses))
-                rotate_ok = self._single_step()
-                time.sleep(wait_time)
+            with self._lock:
+                move = self._moves.pop(0) if self._moves else None
+            if move is not None:
+                steps, direction = move
+                intervals = ramp_intervals(steps, self.MOVE_RATE)
+                # Long moves are sent in chunks to keep the position current
+                chunk = int(self.MOVE_RATE)
+                for start in range(0, steps, chunk):
+                    if not self._send(intervals[start:start + chunk], direction):
+                        break
+                continue
+
+            with self._lock:
+                if not self._moves:
+                    self._idle.set()
+            speed = self.rotation_speed
+            if speed > 0:
+                # The speed is read again after every chunk, at low speeds
+                # a chunk is a single step
+                steps = max(1, int(speed * self.CHUNK_TIME))
+                rotate_ok = self._send([1.0 / speed] * steps, self.step_direction)
             else:
-                # print('Rotation is 0')
-                time.sleep(1)
+                self._wake.wait(1)
+                self._wake.clear()
+
+
+class RatePI(object):
+    """
+    PI regulator for irregularly spaced samples, the integral grows with
+    the time between the samples. Same interface as the PID of
+    PyExpLabSys, pid_i is pr. second.
+    """
+
+    def __init__(self, pid_p, pid_i, p_max, p_min):
+        self.pid_p = pid_p
+        self.pid_i = pid_i
+        self.p_max = p_max
+        self.p_min = p_min
+        self.setpoint = 0
+        self.error = 0
+        self.integral = 0
+
+    def update_setpoint(self, setpoint):
+        self.setpoint = setpoint
+
+    def wanted_power(self, value, dt):
+        self.error = self.setpoint - value
+        # The integral is limited to the output range to avoid wind-up
+        integral = self.integral + self.pid_i * self.error * dt
+        self.integral = min(max(integral, self.p_min), self.p_max)
+        power = self.pid_p * self.error + self.integral
+        return min(max(power, self.p_min), self.p_max)
+
+    def proportional_contribution(self):
+        return self.pid_p * self.error
+
+    def integration_contribution(self):
+        return self.integral
 
 
 class VTIRegulator:
+    # Longest time between two samples the integral is updated for
+    MAX_DT = 5
+
     def __init__(self):
         self.vti_control = VTIControl()
         self.vti_control.start()
@@ -97,22 +165,24 @@ class VTIRegulator:
         self.pushsocket = DataPushSocket('VTI Setpoint', action='enqueue')
         self.pushsocket.start()
 
-        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        self.sock.settimeout(1)
+        # Polled often, a new pressure from MercuryComm is seen at once
+        self.cryostat_state = SocketSubscriber(
+            host='cryostat-raspi01.fys.clients.local.',
+            codenames=['cryostat_vti_pressure'],
+            interval=0.1,
+        )
+        self.cryostat_state.start()
 
         # self.setpoint = 4
-        self.pid = PID.PID(pid_p=8, pid_i=0.001, pid_d=0, p_max=100, p_min=-50)
+        # pid_i of 0.001 pr. iteration of the earlier 2s loop
+        self.pid = RatePI(pid_p=8, pid_i=0.0005, p_max=100, p_min=-50)
         self.pid.update_setpoint(6)  # Default of 6 is never quite wrong
 
     def read_vti_pressure(self):
-        network_adress = 'cryostat-raspi01.fys.clients.local.'
-        command = 'cryostat_vti_pressure#raw'.encode()
-        self.sock.sendto(command, (network_adress, 9000))
-        received = self.sock.recv(1024)
-        received = received.decode('ascii')
-        value_raw = received.split(',')[1]
-        value = float(value_raw)
-        return value
+        """
+        Latest VTI pressure, None if no recent value is available
+        """
+        return self.cryostat_state.value('cryostat_vti_pressure', max_age=5)
 
     def _initial_exercise(self):
         steps = 5000
@@ -122,43 +192,64 @@ class VTIRegulator:
         time.sleep(5)
         print('Turn {} steps open'.format(steps))
         self.vti_control.turn_valve(steps, True)
+        self.vti_control.wait()
         time.sleep(5)
         print('And now, turn {} steps close'.format(steps))
         self.vti_control.turn_valve(steps, False)
+        self.vti_control.wait()
         print('Now, wait 60s for pressure to stabalize a bit')
         for i in range(0, 60):
             time.sleep(1)
             pressure = self.read_vti_pressure()
             print('{}. Pressure is: {}'.format(i, pressure))
 
+    def _read_setpoint(self):
+        qsize = self.pushsocket.queue.qsize()
+        new_setpoint = None
+        while qsize > 0:
+            element = self.pushsocket.queue.get()
+            qsize = self.pushsocket.queue.qsize()
+            print(element)
+            if element.get('cmd') == 'vti_setpoint':
+                try:
+                    new_setpoint = float(element.get('setpoint'))
+                except ValueError:
+                    pass
+        if new_setpoint:
+            self.pid.update_setpoint(new_setpoint)
+
     def main(self):
         # self._initial_exercise()
 
+        last_sample = None
         while True:
-            time.sleep(2)
-            qsize = self.pushsocket.queue.qsize()
-            new_setpoint = None
-            while qsize > 0:
-                element = self.pushsocket.queue.get()
-                qsize = self.pushsocket.queue.qsize()
-                print(element)
-                if element.get('cmd') == 'vti_setpoint':
-                    try:
-                        new_setpoint = float(element.get('setpoint'))
-                    except ValueError:
-                        pass
-
-            if new_setpoint:
-                self.pid.update_setpoint(new_setpoint)
-
-            pressure = self.read_vti_pressure()
-            rotation_speed = self.pid.wanted_power(pressure)
+            self._read_setpoint()
+            # The regulator runs once for every new pressure
+            sample = self.cryostat_state.wait_for_update(
+                'cryostat_vti_pressure', after=last_sample, timeout=5
+            )
+            if sample is None:
+                print('No recent VTI pressure, stop the needle valve')
+                self.vti_control.set_rotation_speed(0)
+                continue
+            sample_time, pressure = sample
+            if last_sample is None:
+                dt = 0
+            else:
+                dt = min(sample_time - last_sample, self.MAX_DT)
+            last_sample = sample_time
+            rotation_speed = self.pid.wanted_power(pressure, dt)
 
             p = self.pid.proportional_contribution()
             i = self.pid.integration_contribution()
+            pulses = self.vti_control.pulses
+            self.pullsocket.set_point_now('p', p)
+            self.pullsocket.set_point_now('i', i)
+            self.pullsocket.set_point_now('rate', rotation_speed)
+            self.pullsocket.set_point_now('pulses', pulses)
 
             msg = 'P: {:.2f}. I: {:.2f} Pressure: {:.2f}. Speed: {:.2f}/s. Pulses: {}'
-            print(msg.format(p, i, pressure, rotation_speed, self.vti_control.pulses))
+            print(msg.format(p, i, pressure, rotation_speed, pulses))
 
             self.vti_control.set_direction(rotation_speed > 0)
             self.vti_control.set_rotation_speed(abs(rotation_speed))
@@ -3,18 +3,17 @@
 import time
 import pickle
 import logging
-import threading
-import collections
 
 from PyExpLabSys.common.utilities import get_logger
-from PyExpLabSys.common.sockets import DataPushSocket
-from PyExpLabSys.common.value_logger import ValueLogger
 from PyExpLabSys.common.sockets import LiveSocket
 from PyExpLabSys.common.sockets import DateDataPullSocket
-from PyExpLabSys.common.database_saver import ContinuousDataSaver
 
 import credentials
 
+from data_spool import SpooledContinuousDataSaver
+from value_logger_engine import ValueLoggerEngine
+from udp_ingest import UDPIngestServer
+
 
 TABLE = 'dateplots_environment'
 
@@ -31,102 +30,29 @@ LOGGER = get_logger(
 )
 
 
-class NetworkReader(threading.Thread):
-    """Network reader"""
-
-    def __init__(self, pushsocket, pullsocket):
-        LOGGER.warning('Starting network reader')
-        threading.Thread.__init__(self)
-        self.name = 'NetworkReader Thread'
-        self.pushsocket = pushsocket
-        self.pullsocket = pullsocket
-        self.values = {}
-
-        # These are used to hold data to be send to socket
-        self.latest_values = {}
-        self.elements = collections.deque(maxlen=5)
-
-        # If we want a live-socket, we make it here
-        # livesocket = LiveSocket('NetworkLogger', codenames)
-        # livesocket.start()
-        self.quit = False
-        self.ttl = 1500
-
-    def _add_codename(self, codename):
-        print('NetworkReader, adding codename {}'.format(codename))
-        if codename.find('resistance') > -1:
-            maxlen = 30
-        else:
-            maxlen = 5
-        self.values[codename] = collections.deque(maxlen=maxlen)
-
-    def value(self, channel):
-        """Read temperature and  pressure"""
-        self.ttl = self.ttl - 1
-        if self.ttl < 200:
-            print('TTL is: {}'.format(self.ttl))
-        return_val = None
-        if self.ttl < 0:
-            print('NetworkReader TTL is 0 - quitting!')
-            self.quit = True
-        else:
-            raw_values = self.values.get(channel, [])
-            values = []
-            for value in raw_values:
-                if (time.time() - value[1]) < 300:
-                    values.append(value[0])
-            if values:
-                return_val = sum(values) / len(values)
-        return return_val
-
-    def run(self):
-        while not self.quit:
-            time.sleep(0.5)
-            self.ttl = 2500
-            qsize = self.pushsocket.queue.qsize()
-            self.pullsocket.set_point_now('qsize', qsize)
-            if qsize > 15:
-                LOGGER.warning('Queue is currently {} elements long'.format(qsize))
-            while qsize > 0:
-                element = self.pushsocket.queue.get()
-                # print(element['location'])
-                # print(element)
-                # Expose element on network socket
-                self.elements.append(element)
-                self.pullsocket.set_point_now('latest_elements', list(self.elements))
-
-                qsize = self.pushsocket.queue.qsize()
-                location = element['location']
-                for key, value in element.items():
-                    if key == 'location':
-                        continue
-                    codename = key + '_' + location
-                    if codename not in self.values:
-                        self._add_codename(codename)
-                    timed_value = (value, time.time())
-                    self.values[codename].append(timed_value)
-                    self.latest_values[codename] = timed_value
-                self.pullsocket.set_point_now('latest_values', self.latest_values)
-        LOGGER.error('Network reader is no longer running!!!')
-
-
 class NetworkLogger(object):
     def __init__(self):
         LOGGER.warning('Starting network logger')
-        # self.codenames = []
-        self.loggers = {}
+        # All codenames are evaluated by the engine in a single pass, rather
+        # than by a ValueLogger thread pr. codename
+        self.engine = ValueLoggerEngine(maximumtime=600)
 
-        self.db_logger = None
-        self.pushsocket = DataPushSocket('device-bridge', action='enqueue')
-        self.pushsocket.name = 'push-socket thread'
-        self.pushsocket.start()
+        # Codenames are added to the running saver, see add_codename()
+        self.db_logger = SpooledContinuousDataSaver(
+            continuous_data_table=TABLE,
+            username=credentials.user,
+            password=credentials.passwd,
+        )
+        self.db_logger.name = 'DB Logger Thread'
+        self.db_logger.start()
 
         # bridge_status: Overall status of the device bridge
         # latest_values: Dict with the latest received values
+        # ingest: Packet counters and latency of the UDP server
         self.pullsocket = DateDataPullSocket(
             'DeviceBridgeStatus',
-            ['qsize', 'latest_values', 'latest_elements', 'dead', 'alive'],
-            timeouts=[3, 5, 5, 60, 60],
+            ['qsize', 'latest_values', 'latest_elements', 'dead', 'alive', 'ingest'],
+            timeouts=[3, 5, 5, 60, 60, 5],
             port=9000,
         )
         self.pullsocket.start()
@@ -138,38 +64,20 @@ class NetworkLogger(object):
         )
         self.livesocket.start()
 
-        self.reader = NetworkReader(self.pushsocket, self.pullsocket)
+        # Replaces the DataPushSocket on port 8500 the nodes send to
+        self.reader = UDPIngestServer(self.engine, self.pullsocket, port=8500)
         self.reader.start()
 
     def add_codename(self, codename, comp_val=0.5, comp_type='lin'):
-        # TODO: Allow a list of codenames, no need to
-        # restart db_connection for every single item
-
+        """
+        Start logging codename. The saver resolves the database ids of new
+        codenames in bulk, so this can be called at any time.
+        """
         print('Adding codename: {}'.format(codename))
-        if codename in self.loggers:
+        if codename in self.engine.logged_codenames():
             return
-        # self.codenames.append(codename)
-        self.loggers[codename] = ValueLogger(
-            self.reader,
-            comp_val=comp_val,
-            comp_type=comp_type,
-            maximumtime=600,
-            channel=codename,
-        )
-        self.loggers[codename].name = 'Logger_thread_{}'.format(codename)
-        self.loggers[codename].start()
-
-        if self.db_logger is not None:
-            self.db_logger.stop()
-            del self.db_logger
-        self.db_logger = ContinuousDataSaver(
-            continuous_data_table=TABLE,
-            username=credentials.user,
-            password=credentials.passwd,
-            measurement_codenames=self.loggers.keys(),
-        )
-        self.db_logger.name = 'DB Logger Thread'
-        self.db_logger.start()
+        self.engine.add_logger(codename, comp_val=comp_val, comp_type=comp_type)
+        self.db_logger.add_continuous_measurement(codename)
         return codename
 
     def main(self):
@@ -279,38 +187,38 @@ class NetworkLogger(object):
         n = 0
         while self.reader.is_alive():
             n = (n + 1) % 100
+            time.sleep(1)
+            if time.time() - self.reader.heartbeat > 60:
+                LOGGER.error('UDP ingest server is not responding - quitting!')
+                self.reader.stop()
+                break
+
+            # Values from a new location or of a new kind are logged with
+            # default settings, the configuration above is only needed to
+            # set the comparison values
+            for codename in self.engine.unlogged_codenames():
+                LOGGER.warning('Auto-registering codename {}'.format(codename))
+                self.add_codename(codename)
+
+            latest_values, to_log = self.engine.evaluate()
+            for name, value, timestamp in to_log:
+                msg = '{} is logging value: {} at {:.0f}'
+                LOGGER.info(msg.format(name, value, timestamp))
+                # Backdated samples keep the time they were measured
+                self.db_logger.save_point(name, (timestamp, value))
+            for name in self.live_list:
+                self.livesocket.set_point_now(name, latest_values.get(name))
+            self.pullsocket.set_point_now('latest_values', latest_values)
 
-            alive = []
-            dead = []
-            for codename in self.loggers.keys():
-                # print(codename)
-                if self.loggers[codename].is_alive():
-                    alive.append(codename)
-                else:
-                    dead.append(codename)
+            # Alive: Codenames with recent values, dead: no recent values
+            alive = [name for name, v in latest_values.items() if v is not None]
+            dead = [name for name, v in latest_values.items() if v is None]
             self.pullsocket.set_point_now('dead', dead)
             self.pullsocket.set_point_now('alive', alive)
             if n == 0:
                 print()
                 print('Alive: {}'.format(alive))
                 print('Dead: {}'.format(dead))
-            # todo: Attempt to re-start dead threads?
-
-            time.sleep(2)
-            latest_values = {}  # Will be supplied to socket in a short while
-            for name in self.loggers.keys():
-                value = self.loggers[name].read_value()
-
-                if name in self.live_list:
-                    self.livesocket.set_point_now(name, value)
-
-                latest_values[name] = value
-                if self.loggers[name].read_trigged():
-                    msg = '{} is logging value: {}'
-                    LOGGER.info(msg.format(name, value))
-                    self.db_logger.save_point_now(name, value)
-                    self.loggers[name].clear_trigged()
-            self.pullsocket.set_point_now('latest_values', latest_values)
 
         print('Reader is not alive - quit!')
 
@@ -7,9 +7,8 @@ from PyQt5.QtWidgets import QMessageBox, QListWidgetItem
 import pyqtgraph as pg
 
 import sys
-import time
-import json
-import socket
+
+from pull_socket_client import PullSocketClient
 
 
 DEVICE_BRIDGE = '10.54.4.88'
@@ -18,8 +17,7 @@ class MainWindow(QtWidgets.QMainWindow):
     def __init__(self, *args, **kwargs):
         super(MainWindow, self).__init__(*args, **kwargs)
 
-        self.read_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        self.read_socket.setblocking(0)
+        self.bridge_client = PullSocketClient(DEVICE_BRIDGE, timeout=0.5)
 
         uic.loadUi('device_bridge_frontend.ui', self)
 
@@ -44,21 +42,6 @@ class MainWindow(QtWidgets.QMainWindow):
         self.timer.timeout.connect(self.update)
         self.timer.start()
 
-    def _read_socket(self, cmd):
-        try:
-            socket_cmd = cmd + '#json'
-            self.read_socket.sendto(socket_cmd.encode(), (DEVICE_BRIDGE, 9000))
-            time.sleep(0.05)
-            recv = self.read_socket.recv(65535).decode('ascii')
-            data = json.loads(recv)
-            if 'OLD' in data:
-                value = None
-            else:
-                value = data[1]
-        except BlockingIOError:
-            value = None
-        return value
-
     def _on_clicked_list_item(self, item):
         print('Setting focus item to: {}'.format(item.text()))
         # self.focus_item = item.text()
@@ -67,14 +50,18 @@ class MainWindow(QtWidgets.QMainWindow):
         self.live_plot_data = {'x': [], 'y': []}        
 
     def update(self):
-        qsize = self._read_socket('qsize')
+        values = self.bridge_client.read(
+            ['qsize', 'dead', 'alive', 'latest_values']
+        )
+        qsize = values['qsize']
         self.queue_size_show.setText('{}'.format(qsize))
 
-        dead = self._read_socket('dead')
-        alive = self._read_socket('alive')
-        
-        latest_values_raw = self._read_socket('latest_values')
-        latest_values_dict = latest_values_raw
+        dead = values['dead']
+        alive = values['alive']
+
+        latest_values_dict = values['latest_values']
+        if latest_values_dict is None:
+            return
         for key, value  in latest_values_dict.items():
             if not key in self.latest_values_items:
                 item = QListWidgetItem(key)
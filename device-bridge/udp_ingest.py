@@ -0,0 +1,170 @@
+"""asyncio UDP server receiving the packets of the micropython nodes"""
+
+import json
+import time
+import socket
+import asyncio
+import struct
+import threading
+import collections
+
+import bridge_packet
+
+
+class IngestProtocol(asyncio.DatagramProtocol):
+    def __init__(self, server):
+        self.server = server
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        reply = self.server.packet_received(data)
+        self.transport.sendto(reply, addr)
+
+
+class UDPIngestServer(threading.Thread):
+    """
+    Receives packets on the port of the DataPushSocket it replaces (same
+    'json_wn#' syntax and ACK/ERROR reply), and binary frames as defined
+    in bridge_packet.py. Packets are parsed as they arrive, all packets
+    received in one iteration of the event loop are handed to the engine
+    as a single batch, and the pull socket is updated at a fixed rate
+    rather than for every packet.
+    """
+
+    def __init__(self, engine, pullsocket, port=8500, publish_interval=0.5,
+                 receive_buffer=2**20):
+        threading.Thread.__init__(self)
+        self.name = 'UDP ingest thread'
+        self.daemon = True
+        self.engine = engine
+        self.pullsocket = pullsocket
+        self.port = port
+        self.publish_interval = publish_interval
+        self.receive_buffer = receive_buffer
+        self.loop = None
+
+        self._pending = []  # (element, timestamp) waiting for the engine
+        self._batch_received = 0
+        self._sequences = {}  # Latest sequence number pr. location
+        self._batch_scheduled = False
+        self.latest_values = {}
+        self.elements = collections.deque(maxlen=5)
+        self.statistics = {
+            'packets': 0, 'errors': 0, 'largest_batch': 0, 'max_latency': 0,
+            'lost_frames': 0,
+        }
+        # Updated on every publish, used to detect a stuck event loop
+        self.heartbeat = time.time()
+
+    def packet_received(self, data):
+        """
+        Parse a single packet, called by the protocol in the event loop.
+        Returns the reply to the sender.
+        """
+        received = time.time()
+        try:
+            if bridge_packet.is_packet(data):
+                elements = self._parse_frame(data, received)
+            else:
+                elements = [(self._parse_json(data), received)]
+        except (ValueError, IndexError, struct.error) as exception:
+            # ValueError also covers decode and json errors
+            self.statistics['errors'] += 1
+            return 'ERROR#{}'.format(exception).encode()
+
+        self.statistics['packets'] += 1
+        self._pending.extend(elements)
+        if not self._batch_scheduled:
+            # Runs once all packets already waiting on the socket are parsed
+            self._batch_scheduled = True
+            self._batch_received = received
+            self.loop.call_soon(self._process_batch)
+        return b'ACK#'
+
+    @staticmethod
+    def _parse_json(data):
+        command, payload = data.decode().split('#', 1)
+        if command != 'json_wn':
+            raise ValueError('Unknown command {}'.format(command))
+        element = json.loads(payload)
+        if not isinstance(element, dict) or 'location' not in element:
+            raise ValueError('Element must be a dict with a location')
+        return element
+
+    def _parse_frame(self, data, received):
+        """
+        Returns an (element, timestamp) pr. sample in the frame
+        """
+        location, sequence, sent_ms, samples = bridge_packet.decode(data)
+        previous = self._sequences.get(location)
+        if previous is not None:
+            # Zero for the expected sequence number. A restarted node
+            # starts from 0 again, this is not counted as a loss
+            lost = (sequence - previous - 1) & 0xFFFF
+            if sequence != 0 and lost < 0x8000:
+                self.statistics['lost_frames'] += lost
+        self._sequences[location] = sequence
+
+        elements = []
+        for sample_ms, values in samples:
+            age = ((sent_ms - sample_ms) & bridge_packet.TICKS_MASK) / 1000.0
+            values['location'] = location
+            elements.append((values, received - age))
+        return elements
+
+    def _process_batch(self):
+        batch = self._pending
+        self._pending = []
+        self._batch_scheduled = False
+
+        values = []
+        for element, timestamp in batch:
+            self.elements.append(element)
+            location = element['location']
+            for key, value in element.items():
+                if key == 'location':
+                    continue
+                codename = key + '_' + location
+                values.append((codename, value, timestamp))
+                latest = self.latest_values.get(codename)
+                # Not replaced by samples caught up after an outage
+                if latest is None or latest[1] <= timestamp:
+                    self.latest_values[codename] = (value, timestamp)
+        self.engine.add_values(values)
+
+        statistics = self.statistics
+        latency = time.time() - self._batch_received
+        statistics['max_latency'] = max(statistics['max_latency'], latency)
+        statistics['largest_batch'] = max(statistics['largest_batch'], len(batch))
+
+    def _publish(self):
+        self.heartbeat = time.time()
+        self.pullsocket.set_point_now('qsize', len(self._pending))
+        self.pullsocket.set_point_now('latest_elements', list(self.elements))
+        self.pullsocket.set_point_now('latest_values', dict(self.latest_values))
+        self.pullsocket.set_point_now('ingest', dict(self.statistics))
+        self.loop.call_later(self.publish_interval, self._publish)
+
+    def stop(self):
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+
+    def run(self):
+        self.loop = asyncio.new_event_loop()
+        endpoint = self.loop.create_datagram_endpoint(
+            lambda: IngestProtocol(self), local_addr=('0.0.0.0', self.port)
+        )
+        transport, _ = self.loop.run_until_complete(endpoint)
+        # Room for bursts of packets while a batch is processed
+        transport.get_extra_info('socket').setsockopt(
+            socket.SOL_SOCKET, socket.SO_RCVBUF, self.receive_buffer
+        )
+        self.loop.call_soon(self._publish)
+        try:
+            self.loop.run_forever()
+        finally:
+            transport.close()
+            self.loop.close()
@@ -1,5 +1,5 @@
+import os
 import time
-import json
 import socket
 # import logging
 
@@ -13,33 +13,60 @@ from PyExpLabSys.common.database_saver import DataSetSaver, CustomColumn
 
 import credentials
 
+from measurement_buffer import MeasurementBuffer
+from batched_point_writer import BatchedPointWriter
+from socket_subscriber import shared_subscriber
+from instrument_trace import InstrumentTracer
+
 
 CURRENT_MEASUREMENT_PROTOTYPE = {
     'type': None,  # DC-sweep, AC-sweep
     'error': None,
     'start_time': 0,
     'current_time': 0,
-    'dew_point': [],
-    'theta_1': [],
-    'theta_2': [],
-    'current_1': [],
-    'current_2': [],
-    'lock_in_v1': [],
-    'lock_in_v2': [],
-    'v_backgate': [],  # Back gate voltage
-    'i_backgate': []  # Bakc gate leak-current
 }
 
+# Each channel is stored as a MeasurementBuffer in current_measurement
+CURRENT_MEASUREMENT_CHANNELS = [
+    'dew_point',
+    'theta_1',
+    'theta_2',
+    'current_1',
+    'current_2',
+    'lock_in_v1',
+    'lock_in_v2',
+    'v_backgate',  # Back gate voltage
+    'i_backgate',  # Bakc gate leak-current
+]
+# Maximal number of points kept in memory pr channel, older points are
+# still available in the database. None will keep all points.
+CURRENT_MEASUREMENT_MAX_POINTS = 100000
+# If not None, every instrument call of a measurement is written to a trace
+# file in this directory
+TRACE_DIRECTORY = None
+
 
 class LinkamMeasurementBase(object):
     def __init__(self, init_current_loggers=False):
         self.current_measurement = CURRENT_MEASUREMENT_PROTOTYPE.copy()
+        for channel in CURRENT_MEASUREMENT_CHANNELS:
+            self.current_measurement[channel] = MeasurementBuffer(
+                max_length=CURRENT_MEASUREMENT_MAX_POINTS
+            )
         self.lock_in_1 = SR830(interface='gpib', gpib_address=7)
         self.lock_in_2 = SR830(interface='gpib', gpib_address=6)
         self.back_gate = Keithley2400(interface='gpib', gpib_address=24)
 
         self.source_logger_1 = Keithley2000(interface='gpib', gpib_address=14)
         self.source_logger_2 = Keithley2000(interface='gpib', gpib_address=15)
+
+        # Latency of every instrument call, published by the controller
+        self.tracer = InstrumentTracer()
+        self.tracer.trace(self.lock_in_1, 'lock_in_1')
+        self.tracer.trace(self.lock_in_2, 'lock_in_2')
+        self.tracer.trace(self.back_gate, 'back_gate')
+        self.tracer.trace(self.source_logger_1, 'source_logger_1')
+        self.tracer.trace(self.source_logger_2, 'source_logger_2')
         if init_current_loggers:
             self.source_logger_1.read_ac_voltage()
             self.source_logger_1.scpi_comm(':INITiate:CONTinuous ON')
@@ -51,10 +78,15 @@ class LinkamMeasurementBase(object):
         self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
         self.sock.setblocking(1)
         self.sock.settimeout(1.0)
+        # The Vaisala is read by datalogger_vaisala.py
+        self.vaisala = shared_subscriber(
+            port=9001, codenames=['h20_concentration_linkam']
+        )
 
         self.chamber_name = 'linkam'
         # self.chamber_name = 'dummy'
         self.aborted = False
+        self.point_writer = None
         self._restart_data_set_saver()
 
     def _restart_data_set_saver(self):
@@ -62,6 +94,12 @@ class LinkamMeasurementBase(object):
                                            "xy_values_" + self.chamber_name,
                                            credentials.user, credentials.passwd)
         self.data_set_saver.start()
+        if self.point_writer is not None:
+            # Points waiting for the old connection cannot be saved with the new
+            # one, since measurement ids are local to the DataSetSaver
+            self.point_writer.stop()
+        self.point_writer = BatchedPointWriter(self.data_set_saver)
+        self.point_writer.start()
 
     # Todo, take arguments to check only the needed instruments, or
     # check each instrument but report error only if it is not None
@@ -157,11 +195,10 @@ class LinkamMeasurementBase(object):
         self.add_to_current_measurement(data)
 
     def _read_vaisala(self):
-        cmd = 'h20_concentration_linkam#json'.encode()
-        self.sock.sendto(cmd, ('127.0.0.1', 9001))
-        recv = self.sock.recv(65535)
-        data = json.loads(recv)
-        value = data[1]
+        value = self.vaisala.value('h20_concentration_linkam')
+        if value is None:
+            print('No recent value from the Vaisala')
+            return
         data = {'h20_concentration': value}
         self.add_to_current_measurement(data)
 
@@ -226,12 +263,17 @@ class LinkamMeasurementBase(object):
         stops, in this case keep the data for now.
         """
         if measurement_type is None:
+            self.point_writer.flush()
+            self.tracer.stop_trace_file()
             self.current_measurement['type'] = None
             self.current_measurement['type'] = error
         else:
+            if TRACE_DIRECTORY is not None:
+                filename = '{}_{:.0f}.jsonl'.format(measurement_type, time.time())
+                self.tracer.start_trace_file(os.path.join(TRACE_DIRECTORY, filename))
             for key, value in self.current_measurement.items():
-                if isinstance(value, list):
-                    self.current_measurement[key].clear()
+                if isinstance(value, MeasurementBuffer):
+                    value.clear()
             self.current_measurement.update(
                 {
                     'type': measurement_type,
@@ -247,11 +289,11 @@ class LinkamMeasurementBase(object):
         and temporarely in the local dict self.current_measurement
         """
         now = time.time() - self.current_measurement['start_time']
-        for key in self.current_measurement.keys():
-            if key in data_point:
-                value = data_point[key]
-                self.current_measurement[key].append((now, value))
-                self.data_set_saver.save_point(key, (now, value))
+        for key, value in data_point.items():
+            channel = self.current_measurement.get(key)
+            if isinstance(channel, MeasurementBuffer):
+                channel.append(now, value)
+                self.point_writer.save_point(key, (now, value))
         self.current_measurement['current_time'] = time.time()
 
     def abort_measurement(self):
@@ -19,8 +19,12 @@ class LinkamController(threading.Thread):
         self.pushsocket.start()
 
         self.pullsocket = DateDataPullSocket(
-            'linkam', ['status', 'lock_in_v1', 'lock_in_v2', 'v_backgate'],
-            timeouts=[999999, 30, 30, 30], port=9000
+            'linkam',
+            [
+                'status', 'lock_in_v1', 'lock_in_v2', 'v_backgate',
+                'instrument_latency',
+            ],
+            timeouts=[999999, 30, 30, 30, 999999], port=9000
         )
         self.pullsocket.start()
 
@@ -83,14 +87,17 @@ class LinkamController(threading.Thread):
                 self._handle_element(element)
 
             meas = self.measurement.current_measurement
-            self.pullsocket.set_point_now('v_backgate', meas['v_backgate'])
-            self.pullsocket.set_point_now('lock_in_v1', meas['lock_in_v1'])
-            self.pullsocket.set_point_now('lock_in_v2', meas['lock_in_v2'])
+            for channel in ('v_backgate', 'lock_in_v1', 'lock_in_v2'):
+                latest = meas[channel].latest()
+                if latest is not None:
+                    self.pullsocket.set_point_now(channel, latest)
 
             current_measurement = self.measurement.current_measurement['type']
             if not current_measurement:
                 current_measurement = 'Idle'
             self.pullsocket.set_point_now('status', current_measurement)
+            latency = self.measurement.tracer.summary()
+            self.pullsocket.set_point_now('instrument_latency', latency)
             print(self.measurement.current_measurement['type'])
 
 
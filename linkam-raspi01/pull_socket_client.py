@@ -0,0 +1,100 @@
+"""Client for reading several values from DateDataPullSockets at once"""
+
+import json
+import time
+import socket
+
+
+class PullSocketClient(object):
+    """
+    Read values from one or more DateDataPullSockets on a single host.
+
+    Instead of a request pr. codename, the 'json_wn' command is used, which
+    returns all codenames of a socket in a single datagram. When several
+    ports are read, all requests are sent before the replies are collected,
+    so reading N sockets costs a single round trip.
+    """
+
+    def __init__(self, host, timeout=0.5):
+        self.host = host
+        self.timeout = timeout
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.settimeout(timeout)
+        self.failed_reads = 0
+
+    def _drain(self):
+        # Throw away late replies to earlier requests
+        self.sock.setblocking(0)
+        try:
+            while True:
+                self.sock.recv(65535)
+        except (BlockingIOError, OSError):
+            pass
+        self.sock.settimeout(self.timeout)
+
+    @staticmethod
+    def _parse(reply, codenames, points=False):
+        values = {}
+        for codename in codenames:
+            point = reply.get(codename)
+            # Values older than the socket timeout are returned as OLD_DATA
+            if isinstance(point, list) and len(point) == 2:
+                values[codename] = tuple(point) if points else point[1]
+            else:
+                values[codename] = None
+        return values
+
+    def read_ports(self, requests, points=False):
+        """
+        Read a number of codenames from a number of ports.
+        :param requests: Dict of port -> list of codenames
+        :param points: Return (time, value) as set on the socket, rather
+        than only the value
+        :return: Dict of port -> dict of codename -> value. Values that
+        could not be read are None, also if the host cannot be reached.
+        """
+        self._drain()
+        try:
+            address = socket.gethostbyname(self.host)
+            for port in requests:
+                self.sock.sendto(b'json_wn', (address, port))
+        except OSError:  # Name lookup failed or the network is down
+            self.failed_reads += len(requests)
+            return {
+                port: self._parse({}, codenames, points)
+                for port, codenames in requests.items()
+            }
+
+        replies = {}
+        t_end = time.time() + self.timeout
+        while len(replies) < len(requests):
+            remaining = t_end - time.time()
+            if remaining <= 0:
+                break
+            self.sock.settimeout(remaining)
+            try:
+                recv, sender = self.sock.recvfrom(65535)
+            except OSError:  # Timeout or host unreachable
+                break
+            if sender[0] != address or sender[1] not in requests:
+                continue
+            try:
+                replies[sender[1]] = json.loads(recv)
+            except ValueError:
+                continue
+        self.sock.settimeout(self.timeout)
+
+        result = {}
+        for port, codenames in requests.items():
+            if port not in replies:
+                self.failed_reads += 1
+                replies[port] = {}
+            result[port] = self._parse(replies[port], codenames, points)
+        return result
+
+    def read(self, codenames, port=9000, points=False):
+        """
+        Read a list of codenames from a single port.
+        :return: Dict of codename -> value
+        """
+        return self.read_ports({port: codenames}, points)[port]
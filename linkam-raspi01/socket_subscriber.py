@@ -0,0 +1,115 @@
+"""Background cache of values published on a DateDataPullSocket"""
+
+import time
+import threading
+
+from pull_socket_client import PullSocketClient
+
+
+class SocketSubscriber(threading.Thread):
+    """
+    Keep the latest values of a set of codenames from a DateDataPullSocket.
+
+    The socket is polled from a background thread, all codenames are read
+    in a single request. value() never waits for the network, it simply
+    returns the cached value, or None if the value has not been updated
+    within max_age seconds. wait_for_update() lets a consumer act on every
+    new value as soon as it is seen. Failed reads do not stop the polling.
+    """
+
+    def __init__(self, host='127.0.0.1', port=9000, codenames=None,
+                 interval=0.5, timeout=1.0):
+        threading.Thread.__init__(self)
+        self.name = 'SocketSubscriber {}:{}'.format(host, port)
+        self.daemon = True
+        self.port = port
+        self.interval = interval
+        self.quit = False
+
+        self._lock = threading.Lock()
+        self._updated = threading.Condition(self._lock)
+        self.codenames = []
+        # codename -> (time of reception, value, time set on the socket)
+        self.values = {}
+        for codename in codenames or []:
+            self.add_codename(codename)
+
+        self.client = PullSocketClient(host, timeout=timeout)
+
+    def add_codename(self, codename):
+        with self._lock:
+            if codename not in self.codenames:
+                self.codenames.append(codename)
+
+    def value(self, codename, max_age=5):
+        """
+        Return the latest value of codename, or None if no value
+        younger than max_age seconds is available.
+        """
+        with self._lock:
+            latest = self.values.get(codename)
+        if latest is None:
+            return None
+        if max_age is not None and time.time() - latest[0] > max_age:
+            return None
+        return latest[1]
+
+    def wait_for_update(self, codename, after=None, timeout=None):
+        """
+        Wait for a value of codename set on the socket later than after
+        (a unix time). Returns (time set on the socket, value), or None if
+        no such value is received within timeout seconds.
+        """
+        t_end = None if timeout is None else time.time() + timeout
+        with self._updated:
+            while True:
+                latest = self.values.get(codename)
+                if latest is not None and (after is None or latest[2] > after):
+                    return latest[2], latest[1]
+                remaining = None if t_end is None else t_end - time.time()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self._updated.wait(remaining)
+
+    def stop(self):
+        self.quit = True
+
+    def run(self):
+        while not self.quit:
+            t_start = time.time()
+            with self._lock:
+                codenames = list(self.codenames)
+            try:
+                points = self.client.read(codenames, port=self.port, points=True)
+            except OSError as exception:
+                # Keep polling, the cached values go stale and value() returns
+                # None once they are older than max_age
+                print('{}: read failed: {}'.format(self.name, exception))
+                points = {}
+            t_read = time.time()
+            with self._updated:
+                for codename, point in points.items():
+                    if point is not None:
+                        self.values[codename] = (t_read, point[1], point[0])
+                self._updated.notify_all()
+            time.sleep(max(0, self.interval - (time.time() - t_start)))
+
+
+_SUBSCRIBERS = {}
+_SUBSCRIBERS_LOCK = threading.Lock()
+
+
+def shared_subscriber(host='127.0.0.1', port=9000, codenames=None, interval=0.5):
+    """
+    Return a running SocketSubscriber for host and port. Measurement objects
+    are created for every measurement, this way they share a single thread.
+    """
+    with _SUBSCRIBERS_LOCK:
+        subscriber = _SUBSCRIBERS.get((host, port))
+        if subscriber is None:
+            subscriber = SocketSubscriber(host, port, interval=interval)
+            subscriber.start()
+            _SUBSCRIBERS[(host, port)] = subscriber
+    for codename in codenames or []:
+        subscriber.add_codename(codename)
+    return subscriber
@@ -5,6 +5,9 @@ import network
 import machine
 import ubinascii
 
+from pulse_counter import PulseCounter, start_sampling
+from calibration import Calibration
+
 WLAN_PASSWORD =
 
 CALIBRATION = {  # Frequency to GPM, with low-flow adapter installed
@@ -16,6 +19,7 @@ CALIBRATION = {  # Frequency to GPM, with low-flow adapter installed
     186: 1.0,
     280: 2.0,  # This point is not official, but including to avoid overrun
 }
+FLOW_CALIBRATION = Calibration(CALIBRATION)
 
 def init_wlan():
     print('Connect to network')
@@ -32,19 +36,10 @@ def init_wlan():
 
 
 def frequency_to_flow(freq):
-    # Code stolen from pirani logger for glove boxes
     if freq <= 0:
         return 0
 
-    prev_ref = 0
-    for ref in sorted(CALIBRATION.keys()):
-        if ref > freq:
-            break
-        prev_ref = ref
-
-    fraction = (freq - prev_ref) / (ref - prev_ref)
-    diff = CALIBRATION[ref] - CALIBRATION[prev_ref]
-    flow = CALIBRATION[prev_ref] + diff * fraction
+    flow = FLOW_CALIBRATION(freq)
     lpm = flow * 3.78541
     return lpm
 
@@ -52,41 +47,8 @@ def blink(timer):
     LED.toggle()
 
 
-def _read_single_count(pin):
-    value = pin.value()
-    t = time.ticks_us()
-    dt = 0
-    while pin.value() == value:
-        dt = time.ticks_us() - t
-        if dt > 1e6:
-            print('No water flow')
-            break
-    return dt
-
-
-def read_flow(pin, pulse_count=600):
-    # First read is not valid, but has to return a value
-    dt = _read_single_count(pin)
-    if dt > 1e6:
-        return 0
-
-    # Read 10 pulses:
-    t_total = 0
-    no_flow = False
-    for i in range(0, pulse_count):
-        dt = _read_single_count(pin)
-        if dt > 1e6:
-            no_flow = True
-            break
-        t_total += dt
-    
-    if no_flow:
-        return 0
-    
-    avg_dt = 1.0 * t_total / pulse_count
-
-    avg_freq = 1e6/avg_dt
-    flow = frequency_to_flow(avg_freq)
+def read_flow(counter):
+    flow = frequency_to_flow(counter.frequency())
     print('Flow is: {:.4f}L/min'.format(flow))
     return flow
 
@@ -105,6 +67,12 @@ p22 = machine.Pin(22, machine.Pin.IN, machine.Pin.PULL_UP)
 #     print(p22.value())
 # 1/0
 
+# Pulses are counted in the background, more flow meters can be added to
+# the list. The calibration is in edges pr. second, both edges are counted
+EDGES = machine.Pin.IRQ_RISING | machine.Pin.IRQ_FALLING
+old_etcher_counter = PulseCounter(p22, trigger=EDGES)
+sample_timer = start_sampling([old_etcher_counter], machine.Timer())
+
 udpsocket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
 udpsocket.connect(('', 8500))
 
@@ -129,7 +97,7 @@ while True:
     temp_v = TEMP_ADC.read_u16() * (3.3 / (65535))
     temperature = 27 - (temp_v - 0.706)/0.001721
 
-    old_etcher_cwf = read_flow(p22)
+    old_etcher_cwf = read_flow(old_etcher_counter)
 
     data = {
       'location': LOCATION,
@@ -0,0 +1,62 @@
+# Piecewise linear interpolation in calibration tables, eg. voltage to
+# pressure of a gauge or frequency to flow of a flow meter.
+#
+# The table is sorted once and kept in two float arrays, the interval of
+# a value is found by bisection. With log=True the interpolation is
+# linear in log(y), for gauges with a logarithmic characteristic, all
+# y-values must then be positive. Values outside the table are clamped to
+# the first or last point.
+import math
+from array import array
+
+
+class Calibration(object):
+    # table is a dict of x: y
+    def __init__(self, table, log=False):
+        x_values = sorted(table.keys())
+        if len(x_values) < 2:
+            raise ValueError('A calibration needs at least two points')
+        self.log = log
+        self.x = array('f', x_values)
+        if log:
+            if min(table.values()) <= 0:
+                raise ValueError('log interpolation needs positive values')
+            self.y = array('f', [math.log(table[x]) for x in x_values])
+        else:
+            self.y = array('f', [table[x] for x in x_values])
+        self._last = len(x_values) - 1
+
+    def _index(self, x):
+        # Index of the first point of the interval containing x
+        low = 0
+        high = self._last
+        while high - low > 1:
+            middle = (low + high) // 2
+            if self.x[middle] > x:
+                high = middle
+            else:
+                low = middle
+        return low
+
+    def __call__(self, x):
+        if x <= self.x[0]:
+            y = self.y[0]
+        elif x >= self.x[self._last]:
+            y = self.y[self._last]
+        else:
+            i = self._index(x)
+            fraction = (x - self.x[i]) / (self.x[i + 1] - self.x[i])
+            y = self.y[i] + (self.y[i + 1] - self.y[i]) * fraction
+        if self.log:
+            return math.exp(y)
+        return y
+
+    def convert(self, values, scale=1.0, offset=0.0, out=None):
+        # Convert a block of values, eg. the raw samples of an Oversampler
+        # block, each value is first scaled to value * scale + offset.
+        # Returns an array('f'), out is reused if given
+        if out is None:
+            out = array('f', [0] * len(values))
+        for i in range(len(values)):
+            out[i] = self(values[i] * scale + offset)
+        return out
@@ -5,6 +5,9 @@ import socket
 import network
 import machine
 
+from pulse_counter import PulseCounter, start_sampling
+from calibration import Calibration
+
 CALIBRATION = {  # Frequency to GPM, with low-flow adapter installed
     0: 0,
     13: 0.1,
@@ -14,6 +17,7 @@ CALIBRATION = {  # Frequency to GPM, with low-flow adapter installed
     186: 1.0,
     280: 2.0,  # This point is not official, but including to avoid overrun
 }
+FLOW_CALIBRATION = Calibration(CALIBRATION)
 
 def blink(t):
     led.value(not led.value())
@@ -35,61 +39,18 @@ def init_wlan():
     return wlan
 
 def frequency_to_flow(freq):
-    # Code stolen from pirani logger for glove boxes
     if freq <= 0:
         return 0
 
-    prev_ref = 0
-    for ref in sorted(CALIBRATION.keys()):
-        if ref > freq:
-            break
-        prev_ref = ref
-
-    fraction = (freq - prev_ref) / (ref - prev_ref)
-    diff = CALIBRATION[ref] - CALIBRATION[prev_ref]
-    flow = CALIBRATION[prev_ref] + diff * fraction
+    flow = FLOW_CALIBRATION(freq)
     lpm = flow * 3.78541
     return lpm
 
-SINGLE_READ_NO_WATETR_FLOW = ''
-def _read_single_count(pin):
-    global SINGLE_READ_NO_WATETR_FLOW
-    value = pin.value()
-    t = time.ticks_us()
-    dt = 0
-    SINGLE_READ_NO_WATETR_FLOW = 'Flow'
-    while pin.value() == value:
-        dt = time.ticks_us() - t
-        if dt > 1e6:
-            print('No water flow')
-            SINGLE_READ_NO_WATETR_FLOW = 'No flow'
-            break
-    return dt
-
-def read_flow(pin, pulse_count=100):
-    # First read is not valid, but has to return a value
-    dt = _read_single_count(pin)
-    if dt > 1e6:
-        print('klaf')
-        return 0
-
-    # Read 10 pulses:
-    t_total = 0
-    no_flow = False
-    for i in range(0, pulse_count):
-        dt = _read_single_count(pin)
-        if dt > 1e6:
-            no_flow = True
-            break
-        t_total += dt
-   
-    if no_flow:
-        return 0
-   
-    avg_dt = 1.0 * t_total / pulse_count
-
-    avg_freq = 1e6/avg_dt
-    flow = frequency_to_flow(avg_freq)
+def read_flow(counter):
+    freq = counter.frequency()
+    if freq == 0:
+        print('No water flow')
+    flow = frequency_to_flow(freq)
     print('Flow is: {:.4f}L/min'.format(flow))
     return flow
 
@@ -114,6 +75,11 @@ udpsocket.connect(('', 8500))
 #p0 = machine.Pin(0, machine.Pin.IN, machine.Pin.PULL_DOWN)
 # p0 = machine.Pin(0, machine.Pin.IN)
 p0 = machine.Pin(18, machine.Pin.IN)
+# The calibration is in edges pr. second, both edges are counted
+EDGES = machine.Pin.IRQ_RISING | machine.Pin.IRQ_FALLING
+flow_counter = PulseCounter(p0, trigger=EDGES)
+# Timer 1 is used for the led
+sample_timer = start_sampling([flow_counter], machine.Timer(0))
 adc = machine.ADC(machine.Pin(36))  # Blue
 
 while True:
@@ -132,7 +98,7 @@ while True:
     timer.deinit()
     timer.init(period=2000, mode=machine.Timer.PERIODIC, callback=blink)
 
-    flow = read_flow(p0)
+    flow = read_flow(flow_counter)
 
     t = read_temperature(adc, avg=1000)
     # msg = 'T: {:.2f}C. Flow {:.2f}L/min'
@@ -147,7 +113,7 @@ while True:
         'new_etcher_turbo_pump_temperature': t,
         'esp32_hall_sensor': esp32_hall,
         'esp32_temp': esp32_temp,
-        'SINGLE_READ_NO_WATETR_FLOW': SINGLE_READ_NO_WATETR_FLOW,
+        'SINGLE_READ_NO_WATETR_FLOW': 'Flow' if flow > 0 else 'No flow',
     }
     udp_string = 'json_wn#' + json.dumps(data)
     print(udp_string)
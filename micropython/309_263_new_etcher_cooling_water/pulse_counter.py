@@ -0,0 +1,75 @@
+# Non-blocking frequency measurement of pulse outputs, eg. the turbine
+# flow meters of the cooling water.
+#
+# Every edge is counted in a pin interrupt, which also notes the time of
+# the edge. A periodic timer (see start_sampling) takes a snapshot of the
+# count and the time of the latest edge of all counters. The frequency
+# is the number of pulses between the oldest and the newest snapshot of
+# the window divided by the time between the corresponding edges, a
+# whole number of periods is thus measured, independent of the timer.
+#
+# Any number of pins can be counted at once, reading the frequency
+# never waits for the pulses.
+import machine
+import time
+
+# Counts and tick differences are kept small to avoid allocations in the
+# interrupt handler
+COUNT_MASK = 0x3FFFFFFF
+
+
+class PulseCounter(object):
+    # window is the number of snapshots used for the frequency, with
+    # start_sampling(period_ms=1000) the frequency is averaged over the
+    # latest window - 1 seconds
+    def __init__(self, pin, window=6, trigger=machine.Pin.IRQ_FALLING):
+        self.pin = pin
+        self.window = window
+        self.count = 0
+        self.last_edge = time.ticks_us()
+        self._counts = [0] * window
+        self._edges = [self.last_edge] * window
+        self._next = 0
+        self._snapshots = 0
+        pin.irq(trigger=trigger, handler=self._edge, hard=True)
+
+    def _edge(self, pin):
+        self.count = (self.count + 1) & COUNT_MASK
+        self.last_edge = time.ticks_us()
+
+    def sample(self):
+        # Called periodically by the timer, not in the interrupt handler
+        state = machine.disable_irq()
+        count = self.count
+        edge = self.last_edge
+        machine.enable_irq(state)
+        self._counts[self._next] = count
+        self._edges[self._next] = edge
+        self._next = (self._next + 1) % self.window
+        self._snapshots += 1
+
+    def frequency(self):
+        # Frequency in Hz, 0 when no pulses arrived within the window
+        if self._snapshots < 2:
+            return 0
+        newest = (self._next - 1) % self.window
+        if self._snapshots < self.window:
+            oldest = 0
+        else:
+            oldest = self._next
+        pulses = (self._counts[newest] - self._counts[oldest]) & COUNT_MASK
+        if pulses == 0:
+            return 0
+        dt = time.ticks_diff(self._edges[newest], self._edges[oldest])
+        if dt <= 0:
+            return 0
+        return pulses * 1e6 / dt
+
+
+def start_sampling(counters, timer, period_ms=1000):
+    # One timer samples all counters
+    def _sample(timer):
+        for counter in counters:
+            counter.sample()
+    timer.init(period=period_ms, mode=machine.Timer.PERIODIC, callback=_sample)
+    return timer
@@ -5,6 +5,8 @@ import socket
 import network
 import machine
 
+from oversampler import Oversampler
+
 def blink(t):
     led.value(not led.value())
 
@@ -19,12 +21,9 @@ def B_field(voltage):
     return B
 
 def read_voltage_diff():
-    v_list = []
-    for i in range(0, 500):
-        v1 = adc1.read_uv()
-        v2 = adc2.read_uv()
-        v_list.append(v1 - v2)
-    v_out = (sum(v_list) / len(v_list)) / 1e6
+    # Mean of the samples taken in the background since the previous call
+    v1, v2 = OVERSAMPLER.read()
+    v_out = (v1 - v2) / 1e6
     return v_out
 
 LOCATION = '309_926'
@@ -54,6 +53,13 @@ adc1 = machine.ADC(machine.Pin(36))
 adc1.atten(machine.ADC.ATTN_11DB)
 adc2 = machine.ADC(machine.Pin(34))
 adc2.atten(machine.ADC.ATTN_11DB)
+# Both inputs are sampled in the same ticks, every ms. read_uv() is
+# calibrated but does not fit an unsigned short, 'i' is used instead
+OVERSAMPLER = Oversampler(
+    [adc1.read_uv, adc2.read_uv], machine.Timer(0), block=100, typecode='i'
+)
+while OVERSAMPLER.read() is None:
+    time.sleep(0.1)
 
 while True:
     time.sleep(1)
@@ -0,0 +1,122 @@
+# Compact binary packets for the device bridge, an alternative to
+# 'json_wn#' + json.dumps(data). The same file is used by the nodes
+# (micropython) and by the device bridge (python 3).
+#
+# Frame, version 1, little endian:
+#   header:   magic b'NB', version (B), flags (B), sequence (H), sent_ms (I)
+#   location: length (B), utf-8 bytes
+#   channels: count (B), pr. channel: struct type code (B), length (B), name
+#   samples:  count (H), pr. sample: sample_ms (I), one value pr. channel
+#
+# sent_ms and sample_ms are read from the same millisecond clock of the
+# node (time.ticks_ms()), which does not need to be set: the bridge
+# timestamps a sample as time of arrival - (sent_ms - sample_ms).
+# The sequence number is incremented for every frame, a gap tells the
+# bridge that frames were lost.
+try:
+    import ustruct as struct
+except ImportError:
+    import struct
+try:
+    from utime import ticks_ms
+except ImportError:
+    import time
+
+    def ticks_ms():
+        return int(time.monotonic() * 1000) & TICKS_MASK
+
+MAGIC = b'NB'
+VERSION = 1
+HEADER = '<2sBBHI'
+HEADER_SIZE = struct.calcsize(HEADER)
+TYPES = b'bBhHiIf'  # Allowed struct codes of the channels
+# Age of a sample is calculated modulo the period of ticks_ms()
+TICKS_MASK = 0x3FFFFFFF
+
+
+class PacketEncoder(object):
+    # channels is a list of (name, struct type code), eg.
+    # [('pressure', 'f'), ('temperature', 'f')]
+    def __init__(self, location, channels, max_samples=20):
+        self.location = location.encode()
+        self.channels = channels
+        self.sample_format = '<I' + ''.join(c[1] for c in channels)
+        self.max_samples = max_samples
+        self.sequence = 0
+        self.samples = []
+
+        prefix = struct.pack('<B', len(self.location)) + self.location
+        prefix += struct.pack('<B', len(channels))
+        for name, code in channels:
+            if code.encode() not in TYPES:
+                raise ValueError('Unsupported type ' + code)
+            name = name.encode()
+            prefix += struct.pack('<BB', ord(code), len(name)) + name
+        self.prefix = prefix
+
+    def add_sample(self, values, sample_ms=None):
+        # Returns True when the frame is full and should be sent, samples
+        # added to a full frame replace the oldest sample
+        if sample_ms is None:
+            sample_ms = ticks_ms()
+        if len(self.samples) >= self.max_samples:
+            self.samples.pop(0)
+        self.samples.append(struct.pack(self.sample_format, sample_ms, *values))
+        return len(self.samples) >= self.max_samples
+
+    def pack(self, flags=0):
+        return self.pack_records(b''.join(self.samples), len(self.samples), flags)
+
+    def pack_records(self, records, count, flags=0):
+        # Frame of count samples already packed with sample_format, used
+        # by samples kept outside the encoder (see sample_ring.py)
+        header = struct.pack(
+            HEADER, MAGIC, VERSION, flags, self.sequence, ticks_ms() & TICKS_MASK
+        )
+        frame = header + self.prefix + struct.pack('<H', count)
+        return frame + records
+
+    def sent(self):
+        # Call when the frame is sent, the next frame starts empty
+        self.samples = []
+        self.sequence = (self.sequence + 1) & 0xFFFF
+
+
+def is_packet(data):
+    return data[:2] == MAGIC
+
+
+def decode(data):
+    # Returns location, sequence, sent_ms and a list of (sample_ms, values),
+    # values is a dict of channel name and value
+    magic, version, flags, sequence, sent_ms = struct.unpack_from(HEADER, data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError('Not a version {} packet'.format(VERSION))
+    pos = HEADER_SIZE
+    length = data[pos]
+    location = bytes(data[pos + 1:pos + 1 + length]).decode()
+    pos += 1 + length
+
+    names = []
+    sample_format = '<I'
+    channel_count = data[pos]
+    pos += 1
+    for _ in range(channel_count):
+        code, length = struct.unpack_from('<BB', data, pos)
+        if code not in TYPES:
+            raise ValueError('Unsupported type {}'.format(code))
+        names.append(bytes(data[pos + 2:pos + 2 + length]).decode())
+        sample_format += chr(code)
+        pos += 2 + length
+
+    count = struct.unpack_from('<H', data, pos)[0]
+    pos += 2
+    size = struct.calcsize(sample_format)
+    if len(data) != pos + count * size:
+        raise ValueError('Packet length does not match the sample count')
+    samples = []
+    for _ in range(count):
+        fields = struct.unpack_from(sample_format, data, pos)
+        samples.append((fields[0], dict(zip(names, fields[1:]))))
+        pos += size
+    return location, sequence, sent_ms, samples
@@ -1,10 +1,13 @@
-import json
 import time
 import socket
 import network
 import machine
 import ubinascii
 
+from bridge_packet import PacketEncoder
+from sample_ring import SampleRing
+from oversampler import Oversampler
+from calibration import Calibration
 
 # Pinout of Edwards RJ45 wire;
 # 7: hvid
@@ -67,6 +70,7 @@ EDWARDS_CALIBRATION = {
     10.0: 1000.0,
     11.0: 1000.0,
 }
+PRESSURE_CALIBRATION = Calibration(EDWARDS_CALIBRATION)
 
 def init_wlan():
     print('Connect to network')
@@ -85,16 +89,7 @@ def voltage_to_pressure(voltage):
     if voltage < 0:
         return 0
 
-    prev_ref_v = 0
-    for ref_v in sorted(EDWARDS_CALIBRATION.keys()):
-        if ref_v > voltage:
-            break
-        prev_ref_v = ref_v
-
-    fraction = (voltage - prev_ref_v) / (ref_v - prev_ref_v)
-    # print(prev_ref_v, ref_v)
-    p_diff = EDWARDS_CALIBRATION[ref_v] - EDWARDS_CALIBRATION[prev_ref_v]
-    p = EDWARDS_CALIBRATION[prev_ref_v] + p_diff * fraction
+    p = PRESSURE_CALIBRATION(voltage)
     
     if p < 1e-4:
         p = 1e-4
@@ -102,19 +97,10 @@ def voltage_to_pressure(voltage):
     return p
 
 def analog_read():
-    v = ADC.read_u16()
-    if v > 2**15:
-        avg_length = 500
-    else:
-        avg_length = 50
+    # Mean of the samples taken in the background since the previous call
+    v_raw = OVERSAMPLER.read()[0]
     # todo: add measurement of v_ref and v_grnd to correct for measurement
-    # errors. For now simply return the value
-    
-    v_raw = 0
-    for i in range(0, avg_length):
-        v_raw += ADC.read_u16()
-        time.sleep(0.001)
-    v_raw = 1.0 * v_raw / avg_length
+    # errors (ground= and reference= of the Oversampler)
     # Here we should subtract the ground reading, but so far just subtract a typical value
     v_raw = v_raw - 320
     
@@ -131,33 +117,28 @@ def blink(timer):
 LOCATION = '309_moorfield_common_vacuum'
 ADC = machine.ADC(26)
 TEMP_ADC = machine.ADC(4)
+# The pressure is sampled every ms, averaged in blocks of 100 samples
+OVERSAMPLER = Oversampler([ADC.read_u16], machine.Timer(), block=100)
 
 LED = machine.Pin("LED", machine.Pin.OUT)
 GAIN = 10.006 / 3.1978 # Gain of voltage divider
 
 udpsocket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
 udpsocket.connect(('', 8500))
+BRIDGE = ('10.196.161.242', 8500)
+RECONNECT_INTERVAL = 30000  # ms
+encoder = PacketEncoder(LOCATION, [('pressure', 'f'), ('temperature', 'f')])
+# Half an hour of samples are kept while the wifi is down
+ring = SampleRing(encoder, capacity=1800)
 
 timer = machine.Timer()
 timer.init(freq=10, mode=machine.Timer.PERIODIC, callback=blink)
 wlan = init_wlan()
+while OVERSAMPLER.read() is None:
+    time.sleep(0.1)
+last_attempt = time.ticks_ms()
 while True:
     time.sleep(1)
-    # ifconfig = wlan.ifconfig()
-    # ip_addr = ifconfig[0]
-    connected = wlan.isconnected()
-    print(wlan)
-    print(wlan.isconnected())
-    if not connected:
-        timer.init(freq=10.0, mode=machine.Timer.PERIODIC, callback=blink)
-        print('Not connected to wifi -  try again')
-        wlan.disconnect()
-        time.sleep(2)
-        wlan.connect('DTUdevice', WLAN_PASSWORD)
-        time.sleep(5)
-        continue
-
-    timer.init(freq=1.0, mode=machine.Timer.PERIODIC, callback=blink)
     v = analog_read() * GAIN
     pressure = voltage_to_pressure(v)
 
@@ -167,14 +148,24 @@ while True:
     msg = 'V: {:.23}V. P {:.5f}mbar. T: {:.2f}'
     # print(v, pressure)
     
-    data = {
-      'location': LOCATION,
-      'pressure': pressure,
-      'temperature': temperature,
-    }
-    udp_string = 'json_wn#' + json.dumps(data)
-    print(udp_string)
+    print(msg.format(v, pressure, temperature))
+    # Sampling continues while the wifi is down, the samples are sent
+    # with their original time stamps once the node is back online
+    ring.add((pressure, temperature))
+
+    if not wlan.isconnected():
+        timer.init(freq=10.0, mode=machine.Timer.PERIODIC, callback=blink)
+        print('Not connected to wifi, {} samples waiting'.format(len(ring)))
+        # connect() does not block, keep sampling while it proceeds
+        if time.ticks_diff(time.ticks_ms(), last_attempt) > RECONNECT_INTERVAL:
+            print('Try again')
+            last_attempt = time.ticks_ms()
+            wlan.disconnect()
+            wlan.connect('DTUdevice', WLAN_PASSWORD)
+        continue
+
+    timer.init(freq=1.0, mode=machine.Timer.PERIODIC, callback=blink)
     try:
-        udpsocket.sendto(udp_string, ('10.196.161.242', 8500))
+        ring.send(udpsocket, BRIDGE)
     except OSError:
-        print('Did not manage to send udp')
+        print('Did not manage to send udp, {} samples waiting'.format(len(ring)))
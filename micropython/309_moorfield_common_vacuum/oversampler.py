@@ -0,0 +1,85 @@
+# Timer driven oversampling of ADC channels.
+#
+# A periodic timer reads all channels once pr. tick into preallocated
+# arrays of block samples. A full block is decimated to its mean,
+# optionally corrected by the mean of a grounded channel and of a channel
+# with a known reference voltage, all sampled in the same ticks as the
+# channels. read() returns the mean of the blocks completed since the
+# previous call and never waits for the ADC, the main loop is free to
+# send data or reconnect the wifi while the sampling continues.
+#
+# The samples of the latest full block are available in completed, one
+# array pr. channel (followed by ground and reference if given).
+import machine
+from array import array
+
+
+class Oversampler(object):
+    # channels is a list of read functions, eg. [adc.read_u16]. typecode
+    # must hold the values of the read functions, 'H' fits read_u16()
+    def __init__(self, channels, timer, block=100, period_ms=1, ground=None,
+                 reference=None, reference_value=None, typecode='H'):
+        self.channels = list(channels)
+        self.block = block
+        self.reference_value = reference_value
+        self._reads = list(channels)
+        if ground is not None:
+            self._reads.append(ground)
+        if reference is not None:
+            self._reads.append(reference)
+        self._ground = ground is not None
+        self._reference = reference is not None
+        self._filling = [array(typecode, [0] * block) for _ in self._reads]
+        self.completed = [array(typecode, [0] * block) for _ in self._reads]
+        self._position = 0
+        # Sum of the block means and number of blocks since the latest read
+        self._state = ([0.0] * len(self.channels), 0)
+        self.latest = None
+        self.timer = timer
+        timer.init(
+            period=period_ms, mode=machine.Timer.PERIODIC, callback=self._tick
+        )
+
+    def stop(self):
+        self.timer.deinit()
+
+    def _tick(self, timer):
+        position = self._position
+        filling = self._filling
+        for i in range(len(self._reads)):
+            filling[i][position] = self._reads[i]()
+        position += 1
+        if position == self.block:
+            position = 0
+            self._filling = self.completed
+            self.completed = filling
+            self._block_done()
+        self._position = position
+
+    def _block_done(self):
+        means = [sum(samples) / self.block for samples in self.completed]
+        n = len(self.channels)
+        values = means[:n]
+        ground = 0
+        if self._ground:
+            ground = means[n]
+            values = [value - ground for value in values]
+        if self._reference:
+            span = means[-1] - ground
+            if span > 0:
+                scale = self.reference_value / span
+                values = [value * scale for value in values]
+        sums, blocks = self._state
+        self._state = ([s + v for s, v in zip(sums, values)], blocks + 1)
+
+    def read(self):
+        # Mean of the channels over the blocks completed since the previous
+        # read, the previous result if no block has completed since then
+        # and None before the first block. A block completed between the
+        # two assignments is dropped, this only shortens the average
+        state = self._state
+        self._state = ([0.0] * len(self.channels), 0)
+        sums, blocks = state
+        if blocks > 0:
+            self.latest = [s / blocks for s in sums]
+        return self.latest
@@ -0,0 +1,73 @@
+# Ring buffer of timestamped samples for the nodes sending binary frames
+# (bridge_packet.py) to the device bridge.
+#
+# Every sample is added to the ring, also while the wifi is down. Samples
+# are removed only once they are handed to a successful sendto(), after an
+# outage the oldest samples are sent first, in frames of at most
+# encoder.max_samples. When the ring is full the oldest sample is
+# overwritten.
+#
+# The samples are kept in RAM: the timestamps are read from ticks_ms(),
+# which restarts on reset, samples saved to flash could not be placed in
+# time after a reboot.
+try:
+    import ustruct as struct
+except ImportError:
+    import struct
+
+from bridge_packet import ticks_ms
+
+
+class SampleRing(object):
+    def __init__(self, encoder, capacity=1800):
+        self.encoder = encoder
+        self.capacity = capacity
+        self.record_size = struct.calcsize(encoder.sample_format)
+        # Allocated once, a long outage does not fragment the heap
+        self.buffer = bytearray(self.record_size * capacity)
+        self.first = 0  # Index of the oldest sample
+        self.count = 0
+        self.overwritten = 0
+
+    def __len__(self):
+        return self.count
+
+    def add(self, values, sample_ms=None):
+        if sample_ms is None:
+            sample_ms = ticks_ms()
+        index = (self.first + self.count) % self.capacity
+        if self.count == self.capacity:
+            # Full, index is the oldest sample
+            self.first = (self.first + 1) % self.capacity
+            self.overwritten += 1
+        else:
+            self.count += 1
+        offset = index * self.record_size
+        struct.pack_into(
+            self.encoder.sample_format, self.buffer, offset, sample_ms, *values
+        )
+
+    def _oldest(self, count):
+        start = self.first * self.record_size
+        end = start + count * self.record_size
+        if end <= len(self.buffer):
+            return bytes(self.buffer[start:end])
+        # The samples wrap around the end of the buffer
+        wrapped = end - len(self.buffer)
+        return bytes(self.buffer[start:]) + bytes(self.buffer[:wrapped])
+
+    def send(self, udpsocket, address, max_frames=10):
+        # Send the oldest samples, at most max_frames frames pr. call to keep
+        # the sampling going while a long backlog is sent. An OSError from
+        # sendto() is raised with the unsent samples still in the ring.
+        # Returns the number of frames sent
+        frames = 0
+        while self.count > 0 and frames < max_frames:
+            count = min(self.count, self.encoder.max_samples)
+            frame = self.encoder.pack_records(self._oldest(count), count)
+            udpsocket.sendto(frame, address)
+            self.encoder.sent()
+            self.first = (self.first + count) % self.capacity
+            self.count -= count
+            frames += 1
+        return frames
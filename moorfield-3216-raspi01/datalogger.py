@@ -7,10 +7,12 @@ from PyExpLabSys.common.sockets import DataPushSocket
 from PyExpLabSys.common.sockets import DateDataPullSocket
 
 from PyExpLabSys.common.value_logger import ValueLogger
-from PyExpLabSys.common.database_saver import ContinuousDataSaver
 
 import credentials
 
+from data_spool import SpooledContinuousDataSaver
+from register_blocks import BlockReader
+
 import mapping
 
 
@@ -21,17 +23,30 @@ class MoorfieldReader(threading.Thread):
         threading.Thread.__init__(self)
         self.name = 'MoorfieldReader Thread'
         self.moorfield = MoorfieldMinilab(mapping.mapping)
+        # Values with a register type in mapping.py are read directly from
+        # the registers in blocks, the rest by the driver. A block read that
+        # does not agree with the driver at startup is left to the driver.
+        self.block_reader = BlockReader(
+            self.moorfield.instrument.read_registers,
+            mapping.mapping,
+            getattr(mapping, 'register_types', {}),
+            intervals=getattr(mapping, 'poll_intervals', None),
+            fallback=self._driver_values,
+        )
+        self.block_reader.verify()
 
         self.values = {}
-        for key, value in mapping.mapping.items():
+        timeouts = []
+        for key, interval in self.block_reader.intervals.items():
             codename_key = mapping.data_table + '_' + key
-            if value is not None:
-                self.values[codename_key] = -1
+            self.values[codename_key] = -1
+            # Slowly polled values must not time out between two reads
+            timeouts.append(max(3, 2 * interval))
 
         self.pullsocket = DateDataPullSocket(
             mapping.system_name + 'Values',
             list(self.values.keys()),
-            timeouts=[3] * len(self.values),
+            timeouts=timeouts,
             port=9000,
         )
         self.pullsocket.start()
@@ -54,27 +69,36 @@ class MoorfieldReader(threading.Thread):
         return_val = self.values[codename]
         return return_val
 
-    def _update_values(self):
-        codename_key = mapping.data_table + '_' + 'full_range_pressure'
-        if codename_key in self.values:
-            self.values[codename_key] = self.moorfield.read_full_range_gauge()
-
-        codename_key = mapping.data_table + '_' + 'baratron_pressure'
-        if codename_key in self.values:
-            self.values[codename_key] = self.moorfield.read_baratron_gauge()
-
-        codename_key = mapping.data_table + '_' + 'turbo_speed'
-        if codename_key in self.values:
-            self.values[codename_key] = self.moorfield.read_turbo_speed()
+    def _driver_call(self, method, *args):
+        try:
+            return method(*args)
+        except (IOError, ValueError) as exception:
+            print('{} failed: {}'.format(method.__name__, exception))
+            return None
+
+    def _driver_values(self, keys):
+        """Read keys with the driver, one request pr. value"""
+        values = {}
+        if 'full_range_pressure' in keys:
+            values['full_range_pressure'] = self._driver_call(
+                self.moorfield.read_full_range_gauge
+            )
+        if 'baratron_pressure' in keys:
+            values['baratron_pressure'] = self._driver_call(
+                self.moorfield.read_baratron_gauge
+            )
+        if 'turbo_speed' in keys:
+            values['turbo_speed'] = self._driver_call(
+                self.moorfield.read_turbo_speed
+            )
 
         for mfc in range(1, 4):
-            codename_key = mapping.data_table + '_' + 'mfc_{}_flow'.format(mfc)
-            if codename_key in self.values:
-                flow = self.moorfield.read_mfc(mfc)
-                self.values[codename_key] = flow['actual']
-                codename_key = mapping.data_table + '_' + 'mfc_{}_setpoint'.format(mfc)
-                if codename_key in self.values:
-                    self.values[codename_key] = flow['setpoint']
+            flow_key = 'mfc_{}_flow'.format(mfc)
+            setpoint_key = 'mfc_{}_setpoint'.format(mfc)
+            if flow_key in keys or setpoint_key in keys:
+                flow = self._driver_call(self.moorfield.read_mfc, mfc) or {}
+                values[flow_key] = flow.get('actual')
+                values[setpoint_key] = flow.get('setpoint')
 
         rf_params = [
             'rf_forward_power',
@@ -83,33 +107,36 @@ class MoorfieldReader(threading.Thread):
             'tune_motor',
             'load_motor',
         ]
-        rf_values = self.moorfield.read_rf_values()
-        for param in rf_params:
-            codename_key = mapping.data_table + '_' + param
-            if codename_key in self.values:
-                if rf_values[param] is not None:
-                    self.values[codename_key] = rf_values[param]
+        if any(param in keys for param in rf_params):
+            rf_values = self._driver_call(self.moorfield.read_rf_values)
+            for param in rf_params:
+                values[param] = (rf_values or {}).get(param)
 
         dc_params = [
             'dc_psu_voltage',
             'dc_psu_current',
             'dc_psu_power',
         ]
-        dc_values = self.moorfield.read_dc_psu_values()
-        for param in dc_params:
-            codename_key = mapping.data_table + '_' + param
-            if codename_key in self.values:
-                if dc_values[param] is not None:
-                    self.values[codename_key] = dc_values[param]
+        if any(param in keys for param in dc_params):
+            dc_values = self._driver_call(self.moorfield.read_dc_psu_values)
+            for param in dc_params:
+                values[param] = (dc_values or {}).get(param)
+
+        return {key: value for key, value in values.items() if key in keys}
 
-        for key, value in self.values.items():
-            self.pullsocket.set_point_now(key, value)
-            self.livesocket.set_point_now(key, value)
+    def _update_values(self):
+        values = self.block_reader.update()
+        for key, value in values.items():
+            codename_key = mapping.data_table + '_' + key
+            self.values[codename_key] = value
+            self.pullsocket.set_point_now(codename_key, value)
+            self.livesocket.set_point_now(codename_key, value)
 
     def run(self):
         while not self.quit:
             self.ttl = 100
-            time.sleep(0.5)
+            # Sleep until the next group of registers is due
+            time.sleep(max(self.block_reader.next_due() - time.time(), 0))
             self._update_values()
             # print(self.values)
 
@@ -139,7 +166,7 @@ class Logger:
             if 'dc_psu' in key:
                 codenames[key] = (0.25, 'lin')
 
-        self.db_logger = ContinuousDataSaver(
+        self.db_logger = SpooledContinuousDataSaver(
             continuous_data_table='dateplots_' + mapping.data_table,
             username=credentials.user,
             password=credentials.passwd,
@@ -24,3 +24,19 @@ mapping = {
 
     'turbo_speed': None,
 }
+
+# Modbus function code and struct format of the values read in register
+# blocks, 32 bit floats are two holding registers, high word first. Values
+# not listed here (eg. the turbo speed and the motor positions) are read by
+# the driver. The block reads are compared with the driver at startup.
+register_types = {
+    'full_range_pressure': (3, '>f'),
+    'baratron_pressure': (3, '>f'),
+    'mfc_1_flow': (3, '>f'),
+    'mfc_1_setpoint': (3, '>f'),
+    'mfc_2_flow': (3, '>f'),
+    'mfc_2_setpoint': (3, '>f'),
+    'dc_psu_voltage': (3, '>f'),
+    'dc_psu_current': (3, '>f'),
+    'dc_psu_power': (3, '>f'),
+}
@@ -0,0 +1,203 @@
+"""Block reads of the Modbus registers listed in mapping.py"""
+
+import math
+import time
+import struct
+
+# Largest number of registers in a single Modbus read
+MAX_REGISTERS = 125
+
+
+def default_interval(key):
+    """
+    Default time between two reads of a value in seconds, pressures
+    change fast, the matching network and the sample stage slowly.
+    """
+    if 'pressure' in key:
+        return 0.2
+    if 'motor' in key or 'rotation' in key or 'turbo' in key:
+        return 5
+    return 1
+
+
+def _valid(value):
+    """Failed reads give None, a NaN float is not a measurement either"""
+    return value is not None and not (isinstance(value, float) and math.isnan(value))
+
+
+class RegisterBlock(object):
+    """
+    A contiguous range of registers read in a single request. The values
+    are decoded by one precompiled struct, unused registers in between are
+    skipped as padding.
+    """
+
+    def __init__(self, start, values, functioncode=3):
+        # values is a sorted list of (address, key, struct format)
+        self.start = start
+        self.functioncode = functioncode
+        self.keys = []
+        layout = '>'
+        address = start
+        for value_address, key, value_format in values:
+            padding = 'xx' * (value_address - address)
+            layout += padding + value_format.lstrip('<>!=')
+            address = value_address + struct.calcsize(value_format) // 2
+            self.keys.append(key)
+        self.count = address - start
+        self.layout = struct.Struct(layout)
+        self._registers = struct.Struct('>{}H'.format(self.count))
+
+    def decode(self, registers):
+        raw = self._registers.pack(*registers)
+        return dict(zip(self.keys, self.layout.unpack(raw)))
+
+
+def compile_blocks(registers, register_types, max_gap=8):
+    """
+    Group registers (dict of key: address) in as few blocks as possible.
+    register_types holds the (function code, struct format) of every key,
+    only registers read by the same function code can share a block.
+    Reading up to max_gap unused registers is cheaper than a new request.
+    """
+    values = sorted(
+        (register_types[key][0], address, key, register_types[key][1])
+        for key, address in registers.items()
+    )
+    blocks = []
+    current = []
+    current_code = None
+    end = None
+    for functioncode, address, key, value_format in values:
+        size = struct.calcsize(value_format) // 2
+        if current and (
+            functioncode != current_code
+            or address - end > max_gap
+            or address + size - current[0][0] > MAX_REGISTERS
+        ):
+            blocks.append(RegisterBlock(current[0][0], current, current_code))
+            current = []
+        current_code = functioncode
+        current.append((address, key, value_format))
+        end = address + size
+    if current:
+        blocks.append(RegisterBlock(current[0][0], current, current_code))
+    return blocks
+
+
+class BlockReader(object):
+    """
+    Reads the values of a mapping (key: register address, None for values
+    not available on the system) in register blocks. Values are grouped by
+    poll interval, every group has its own blocks and is read when due.
+
+    read_registers(address, count, functioncode) must return count
+    registers as ints, eg. read_registers of a minimalmodbus Instrument.
+    register_types holds the (function code, struct format) of the keys
+    that can be block read. The other keys, and keys that fail verify(),
+    are read by fallback(keys), which must return a dict of key: value.
+    """
+
+    def __init__(self, read_registers, mapping, register_types, intervals=None,
+                 fallback=None, max_gap=8):
+        self.read_registers = read_registers
+        self.mapping = mapping
+        self.register_types = dict(register_types)
+        self.fallback = fallback
+        self.max_gap = max_gap
+        self.failed_reads = 0
+        self.intervals = {}  # Poll interval pr. key
+        for key, address in mapping.items():
+            if address is None:
+                continue
+            if key not in self.register_types and fallback is None:
+                raise ValueError('No register type for {}'.format(key))
+            self.intervals[key] = (intervals or {}).get(key, default_interval(key))
+        self.groups = []  # [interval, next read, blocks, fallback keys]
+        self._compile()
+
+    def _compile(self):
+        groups = {}
+        for key, interval in self.intervals.items():
+            registers, fallback_keys = groups.setdefault(interval, ({}, []))
+            if key in self.register_types:
+                registers[key] = self.mapping[key]
+            else:
+                fallback_keys.append(key)
+
+        self.groups = []
+        for interval, (registers, fallback_keys) in sorted(groups.items()):
+            blocks = compile_blocks(registers, self.register_types, self.max_gap)
+            self.groups.append([interval, 0, blocks, sorted(fallback_keys)])
+
+    def requests_pr_second(self):
+        # The fallback is assumed to use a request pr. value
+        return sum(
+            (len(group[2]) + len(group[3])) / group[0] for group in self.groups
+        )
+
+    def next_due(self):
+        return min(group[1] for group in self.groups)
+
+    def _read_blocks(self, blocks):
+        values = {}
+        for block in blocks:
+            try:
+                registers = self.read_registers(
+                    block.start, block.count, block.functioncode
+                )
+            except (IOError, ValueError) as exception:
+                # A failed block gives no values, the next round tries again
+                self.failed_reads += 1
+                msg = 'Failed to read block at {}: {}'
+                print(msg.format(block.start, exception))
+                continue
+            values.update(block.decode(registers))
+        return values
+
+    def verify(self, rel_tol=0.1):
+        """
+        Compare a block read of all values with the fallback and read the
+        values that do not match, or could not be read, by the fallback from
+        now on. Catches a wrong function code, format, word order or scaling
+        in register_types. Returns the keys moved to the fallback.
+        """
+        blocks = [block for group in self.groups for block in group[2]]
+        block_values = self._read_blocks(blocks)
+        keys = [key for block in blocks for key in block.keys]
+        expected = self.fallback(keys)
+        mismatches = []
+        for key in sorted(keys):
+            value = block_values.get(key)
+            reference = expected.get(key)
+            if value is None or reference is None or not math.isclose(
+                value, reference, rel_tol=rel_tol, abs_tol=1e-9
+            ):
+                print('{}: block read {}, driver {}'.format(key, value, reference))
+                mismatches.append(key)
+        for key in mismatches:
+            del self.register_types[key]
+        if mismatches:
+            self._compile()
+        return mismatches
+
+    def update(self, now=None):
+        """
+        Read the groups that are due, returns a dict of the values read.
+        Values of failed reads are left out.
+        """
+        if now is None:
+            now = time.time()
+        values = {}
+        for group in self.groups:
+            interval, next_read, blocks, fallback_keys = group
+            if now < next_read:
+                continue
+            values.update(self._read_blocks(blocks))
+            if fallback_keys:
+                values.update(self.fallback(fallback_keys))
+            # Keep the schedule, but do not try to catch up on missed reads
+            group[1] = next_read + interval
+            if group[1] <= now:
+                group[1] = now + interval
+        return {key: value for key, value in values.items() if _valid(value)}
@@ -0,0 +1,129 @@
+"""
+Block reads must give the same values as the per-register driver calls,
+run with:
+    python3 -m pytest test_register_blocks.py
+"""
+import math
+
+import pytest
+
+import mapping
+from register_blocks import BlockReader
+
+minimalmodbus = pytest.importorskip('minimalmodbus')
+serial = pytest.importorskip('serial')
+
+# Holding registers of the 3216 system, two words pr. float, high word first
+RECORDED_REGISTERS = {
+    398: 13877, 399: 12710,  # full_range_pressure, 2.7e-6
+    1202: 16798, 1203: 47186,  # mfc_1_flow, 19.84
+    1204: 16542, 1205: 47186,  # mfc_2_flow, 4.96
+    1213: 16800, 1214: 0,  # mfc_1_setpoint, 20.0
+    1215: 16544, 1216: 0,  # mfc_2_setpoint, 5.0
+    1376: 15433, 1377: 34288,  # baratron_pressure, 0.0123
+    1584: 16082, 1585: 61866,  # dc_psu_current, 0.412
+    1586: 17304, 1587: 55706,  # dc_psu_voltage, 305.7
+    1588: 17147, 1589: 52429,  # dc_psu_power, 125.9
+}
+
+
+class RecordedInstrument(minimalmodbus.Instrument):
+    """
+    minimalmodbus Instrument answering read requests from recorded
+    registers, all of the decoding is done by minimalmodbus
+    """
+
+    def __init__(self, holding, input_registers=None):
+        minimalmodbus.Instrument.__init__(self, serial.serial_for_url('loop://'), 1)
+        self.registers = {3: holding, 4: input_registers or {}}
+        self.requests = []
+
+    def _perform_command(self, functioncode, payload_to_slave):
+        address = int.from_bytes(payload_to_slave[0:2], 'big')
+        count = int.from_bytes(payload_to_slave[2:4], 'big')
+        self.requests.append((functioncode, address, count))
+        registers = self.registers[functioncode]
+        data = b''.join(
+            registers.get(register, 0).to_bytes(2, 'big')
+            for register in range(address, address + count)
+        )
+        return bytes([len(data)]) + data
+
+
+def driver_values(instrument, register_types):
+    """The per-register reads, as the driver does them"""
+
+    def read(keys):
+        return {
+            key: instrument.read_float(
+                mapping.mapping[key], functioncode=register_types[key][0]
+            )
+            for key in keys
+        }
+
+    return read
+
+
+def test_block_read_matches_driver():
+    instrument = RecordedInstrument(RECORDED_REGISTERS)
+    reader = BlockReader(
+        instrument.read_registers, mapping.mapping, mapping.register_types
+    )
+    values = reader.update(now=0)
+    block_requests = len(instrument.requests)
+
+    expected = driver_values(instrument, mapping.register_types)(values.keys())
+    assert sorted(values) == sorted(mapping.register_types)
+    for key, value in expected.items():
+        assert values[key] == value
+    assert block_requests < len(values)
+
+
+def test_function_codes_are_read_in_separate_blocks():
+    registers = {'pressure': 10, 'temperature': 12}
+    register_types = {'pressure': (3, '>f'), 'temperature': (4, '>f')}
+    instrument = RecordedInstrument(
+        {10: 16800, 11: 0}, input_registers={12: 16544, 13: 0}
+    )
+    reader = BlockReader(
+        instrument.read_registers, registers, register_types, intervals={}
+    )
+    assert reader.update(now=0) == {'pressure': 20.0, 'temperature': 5.0}
+    assert sorted(instrument.requests) == [(3, 10, 2), (4, 12, 2)]
+
+
+def test_failed_reads_are_left_out():
+    registers = {'pressure': 10, 'flow': 100, 'turbo_speed': 200}
+    register_types = {'pressure': (3, '>f'), 'flow': (3, '>f')}
+    instrument = RecordedInstrument({100: 0x7FC0, 101: 0})  # flow is NaN
+
+    def read_registers(address, count, functioncode):
+        if address == 10:
+            raise minimalmodbus.NoResponseError('No communication')
+        return instrument.read_registers(address, count, functioncode)
+
+    reader = BlockReader(
+        read_registers,
+        registers,
+        register_types,
+        intervals={'turbo_speed': 1},
+        fallback=lambda keys: {key: None for key in keys},
+    )
+    assert reader.update(now=0) == {}
+    assert reader.failed_reads == 1
+
+
+def test_verify_leaves_mismatches_to_the_driver():
+    # mfc_1_flow declared as an integer, the driver reads a float
+    register_types = dict(mapping.register_types, mfc_1_flow=(3, '>i'))
+    instrument = RecordedInstrument(RECORDED_REGISTERS)
+    reader = BlockReader(
+        instrument.read_registers,
+        mapping.mapping,
+        register_types,
+        fallback=driver_values(instrument, mapping.register_types),
+    )
+    assert reader.verify() == ['mfc_1_flow']
+    values = reader.update(now=0)
+    assert math.isclose(values['mfc_1_flow'], 19.84, rel_tol=1e-6)
+    assert values == driver_values(instrument, mapping.register_types)(values)
@@ -0,0 +1,308 @@
+"""
+Datalogger for ADS1x15 ADCs on a Raspberry Pi, configured by a TOML file.
+
+    python3 adc_logger.py config.toml
+
+Needs the ADS1x15 package (ADS1x15-ADC on PyPI) and, on Python older than
+3.11, tomli.
+
+[ADC_mapping] lists the channels pr. I2C address:
+    i2c_address.codename = [adc_index, offset, scale, min_log_value]
+adc_index is 0-3 for a single-ended input or eg. '0-1' for a differential
+input, the logged value is scale * x + offset, where x is the voltage or,
+for codenames listed in [RTDs], the resistance of an RTD in series with a
+shunt: x = r_shunt * v / (v_ex - v). min_log_value is the comparison value
+of the logger. The table is given in [database]. Optional settings of the
+ADCs and sockets, with their defaults:
+
+    [ADC]
+    bus = 1
+    gain = 1  # ADS1x15 gain setting, 1: +/-4.096V, 16: +/-0.256V
+    data_rate = 4  # 128 sps on ADS1115
+    averages = 1  # Conversions averaged pr. channel and scan
+    interval = 1.0  # Time between the start of two scans
+    mode = 'single'  # or 'continuous'
+    filter_scans = 1  # Moving average of the values over this many scans
+
+In single mode every conversion is started and awaited separately. In
+continuous mode each ADC converts the selected input continuously at the
+data rate, the conversion register is read once pr. conversion period and
+the samples are averaged (decimated) to one value pr. channel. This allows
+a high data rate with many samples pr. scan, together with filter_scans
+the noise of a slow data rate is reached at a faster update rate.
+
+A scan converts averages samples of every channel of the ADC with most
+channels, in continuous mode plus two discarded conversions pr. channel.
+If that takes more than 80% of the interval at the data rate, averages is
+reduced to fit and a warning is printed. Scans still taking longer than
+the interval are reported as well.
+
+    [sockets]
+    pull_name = 'ADCValues'
+    live_name = 'ADCLive'
+    port = 9000
+    timeout = 3  # At least 3 * interval
+"""
+import sys
+import time
+import threading
+
+try:
+    import tomllib
+except ImportError:  # Python < 3.11
+    import tomli as tomllib
+
+import numpy as np
+
+import ADS1x15
+
+from PyExpLabSys.common.sockets import LiveSocket
+from PyExpLabSys.common.sockets import DateDataPullSocket
+
+import credentials
+
+from data_spool import SpooledContinuousDataSaver
+from value_logger_engine import ValueLoggerEngine
+
+# Samples pr. second of the data_rate settings of the ADS1115
+DATA_RATES = [8, 16, 32, 64, 128, 250, 475, 860]
+# Part of the interval the conversions of a scan may use, the rest is left
+# for the I2C transfers and the processing of the values
+SCAN_MARGIN = 0.8
+
+
+def load_config(filename):
+    with open(filename, 'rb') as config_file:
+        config = tomllib.load(config_file)
+
+    channels = []
+    for address, codenames in config['ADC_mapping'].items():
+        for codename, (adc_index, offset, scale, comp_val) in codenames.items():
+            channels.append(
+                {
+                    'address': int(address, 0),
+                    'codename': codename,
+                    'adc_index': adc_index,
+                    'offset': offset,
+                    'scale': scale,
+                    'comp_val': comp_val,
+                }
+            )
+    config['channels'] = channels
+    return config
+
+
+class ADCScanner(threading.Thread):
+    """
+    Measure all channels of all ADCs. Conversions are interleaved: every
+    ADC starts the conversion of its next channel at the same time, the
+    scan thus takes as long as the ADC with most channels.
+    """
+
+    def __init__(self, config, engine):
+        threading.Thread.__init__(self)
+        self.name = 'ADC scanner'
+        self.daemon = True
+        self.engine = engine
+        adc_config = config.get('ADC', {})
+        self.averages = adc_config.get('averages', 1)
+        self.interval = adc_config.get('interval', 1.0)
+        self.continuous = adc_config.get('mode', 'single') == 'continuous'
+        self.period = 1.0 / DATA_RATES[adc_config.get('data_rate', 4)]
+        channels = config['channels']
+        self.codenames = [c['codename'] for c in channels]
+
+        self.adcs = {}
+        # The channels of each ADC in the order they are converted
+        self.schedule = {}
+        for i, channel in enumerate(channels):
+            address = channel['address']
+            if address not in self.adcs:
+                adc = ADS1x15.ADS1115(adc_config.get('bus', 1), address)
+                adc.setGain(adc_config.get('gain', 1))
+                adc.setDataRate(adc_config.get('data_rate', 4))
+                # 0: Continuous conversion, 1: Single-shot conversion
+                adc.setMode(0 if self.continuous else 1)
+                self.adcs[address] = adc
+                self.schedule[address] = []
+            self.schedule[address].append((i, self._request(channel['adc_index'])))
+        self.rounds = max(len(s) for s in self.schedule.values())
+        self.averages = self._fit_averages(self.averages)
+
+        # Conversion of all channels in a single pass over the arrays
+        self.offset = np.array([c['offset'] for c in channels])
+        self.scale = np.array([c['scale'] for c in channels])
+        rtds = config.get('RTDs', {})
+        rtd_config = [rtds.get(codename, {}) for codename in self.codenames]
+        self.rtd = np.array([codename in rtds for codename in self.codenames])
+        self.v_ex = np.array([rtd.get('v_ex', 1) for rtd in rtd_config])
+        self.r_shunt = np.array([rtd.get('r_shunt', 1) for rtd in rtd_config])
+        # The latest scans, the values are the mean over the rows
+        self.history = np.full(
+            (adc_config.get('filter_scans', 1), len(channels)), np.nan
+        )
+        self._history_index = 0
+
+        sockets = config.get('sockets', {})
+        timeout = max(sockets.get('timeout', 3), 3 * self.interval)
+        self.pullsocket = DateDataPullSocket(
+            sockets.get('pull_name', 'ADCValues'),
+            self.codenames,
+            timeouts=[timeout] * len(self.codenames),
+            port=sockets.get('port', 9000),
+        )
+        self.pullsocket.start()
+        self.livesocket = LiveSocket(
+            sockets.get('live_name', 'ADCLive'), self.codenames
+        )
+        self.livesocket.start()
+        self.quit = False
+        self.scans = 0
+        self.failed_scans = 0
+        self.slow_scans = 0
+
+    def _fit_averages(self, averages):
+        # The conversion periods available to each channel in a scan
+        periods = int(SCAN_MARGIN * self.interval / (self.period * self.rounds))
+        if self.continuous:
+            periods -= 2  # The discarded conversions after the input switch
+        if averages <= periods:
+            return averages
+        fitted = max(periods, 1)
+        msg = 'averages = {} does not fit in an interval of {} s, using {}'
+        print(msg.format(averages, self.interval, fitted))
+        return fitted
+
+    @staticmethod
+    def _request(adc_index):
+        # Name of the driver method starting a conversion of the input
+        if isinstance(adc_index, str):
+            return 'requestADC_Differential_' + adc_index.replace('-', '_'), ()
+        return 'requestADC', (adc_index,)
+
+    def _convert_round(self, n, voltages):
+        pending = []
+        for address, schedule in self.schedule.items():
+            if n >= len(schedule):
+                continue
+            index, (method, args) = schedule[n]
+            adc = self.adcs[address]
+            getattr(adc, method)(*args)
+            pending.append((adc, index))
+        for adc, index in pending:
+            while adc.isBusy():
+                time.sleep(0.001)
+            voltages[index] += adc.toVoltage(adc.getValue())
+
+    def _sample_round(self, n, voltages):
+        active = []
+        for address, schedule in self.schedule.items():
+            if n >= len(schedule):
+                continue
+            index, (method, args) = schedule[n]
+            adc = self.adcs[address]
+            # Switches the input, the ADC keeps converting it
+            getattr(adc, method)(*args)
+            active.append((adc, index))
+        # The conversion running while the input was switched is not used
+        time.sleep(2 * self.period)
+        raw = np.zeros((len(active), self.averages))
+        next_read = time.time()
+        for sample in range(self.averages):
+            for i, (adc, _) in enumerate(active):
+                raw[i, sample] = adc.getValue()
+            next_read += self.period
+            time.sleep(max(next_read - time.time(), 0))
+        means = raw.mean(axis=1)
+        for i, (adc, index) in enumerate(active):
+            # toVoltage() is linear, the mean can be converted directly
+            voltages[index] = adc.toVoltage(means[i])
+
+    def scan(self):
+        """
+        Returns the scaled values of all channels
+        """
+        x = np.zeros(len(self.codenames))
+        if self.continuous:
+            for n in range(self.rounds):
+                self._sample_round(n, x)
+        else:
+            for _ in range(self.averages):
+                for n in range(self.rounds):
+                    self._convert_round(n, x)
+            x = x / self.averages
+        with np.errstate(divide='ignore', invalid='ignore'):
+            resistance = self.r_shunt * x / (self.v_ex - x)
+        x = np.where(self.rtd, resistance, x)
+        values = self.scale * x + self.offset
+
+        self.history[self._history_index] = values
+        self._history_index = (self._history_index + 1) % len(self.history)
+        return np.nanmean(self.history, axis=0)
+
+    def run(self):
+        while not self.quit:
+            t_start = time.time()
+            try:
+                values = self.scan()
+            except OSError as exception:
+                # A single failed I2C transfer should not stop the logger
+                print('Scan failed: {}'.format(exception))
+                self.failed_scans += 1
+                time.sleep(self.interval)
+                continue
+            self.scans += 1
+            now = time.time()
+            if now - t_start > self.interval:
+                self.slow_scans += 1
+                msg = 'Scan took {:.3f} s, longer than the interval of {} s'
+                print(msg.format(now - t_start, self.interval))
+            self.engine.add_values(
+                [(c, v, now) for c, v in zip(self.codenames, values)]
+            )
+            for codename, value in zip(self.codenames, values):
+                self.pullsocket.set_point_now(codename, value)
+                self.livesocket.set_point_now(codename, value)
+            time.sleep(max(self.interval - (time.time() - t_start), 0))
+
+
+class Logger(object):
+    def __init__(self, config_file):
+        config = load_config(config_file)
+        print(config.get('description', config_file))
+        self.engine = ValueLoggerEngine(maximumtime=600)
+        for channel in config['channels']:
+            self.engine.add_logger(channel['codename'], comp_val=channel['comp_val'])
+
+        self.db_logger = SpooledContinuousDataSaver(
+            continuous_data_table=config['database']['table'],
+            username=credentials.user,
+            password=credentials.passwd,
+            measurement_codenames=[c['codename'] for c in config['channels']],
+        )
+        self.db_logger.name = 'DB Logger Thread'
+        self.db_logger.start()
+
+        self.scanner = ADCScanner(config, self.engine)
+        self.scanner.start()
+
+    def main(self):
+        """
+        Main function
+        """
+        time.sleep(5)
+        while self.scanner.is_alive():
+            time.sleep(1)
+            _, to_log = self.engine.evaluate()
+            for name, value, timestamp in to_log:
+                msg = '{} is logging value: {}'
+                print(msg.format(name, value))
+                self.db_logger.save_point(name, (timestamp, value))
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 2:
+        print('Usage: python3 adc_logger.py config.toml')
+        sys.exit(1)
+    logger = Logger(sys.argv[1])
+    logger.main()
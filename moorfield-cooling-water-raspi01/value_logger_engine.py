@@ -0,0 +1,191 @@
+"""Single-thread replacement for one ValueLogger thread pr. codename"""
+
+import time
+import threading
+
+import numpy as np
+
+
+class ValueLoggerEngine(object):
+    """
+    Keeps the latest samples of all codenames in arrays and decides which
+    values to log, using the same criteria as PyExpLabSys' ValueLogger:
+    a value is logged when the mean of the recent samples has moved
+    comp_val (absolute for 'lin', relative for 'log') away from the
+    latest logged value, or when maximumtime has passed since then.
+
+    add_value() is called by the network reader for every received value,
+    evaluate() checks all codenames in a single pass.
+
+    Samples older than backdate_limit when they arrive are sent by a node
+    catching up after an outage. They are not part of the mean, each of
+    them is compared to the latest logged value and logged with its own
+    timestamp.
+    """
+
+    def __init__(self, maximumtime=600, max_age=300, window=30, backdate_limit=10):
+        self._lock = threading.Lock()
+        self.maximumtime = maximumtime
+        self.max_age = max_age  # Older samples are not part of the mean
+        self.window = window  # Maximal number of samples in the mean
+        self.backdate_limit = backdate_limit
+        self.codenames = []
+        self.index = {}
+
+        self._samples = np.zeros((0, window))
+        self._times = np.zeros((0, window))
+        self._next = np.zeros(0, dtype=int)  # Next position in the ring buffer
+        self._length = np.zeros(0, dtype=int)  # Length of the ring buffer
+        self._logged = np.zeros(0, dtype=bool)
+        self._comp_val = np.zeros(0)
+        self._log_comp = np.zeros(0, dtype=bool)
+        self._last_value = np.zeros(0)
+        self._last_time = np.zeros(0)
+        self._backdated = []  # (codename, value, timestamp) to be logged
+
+    def _add_row(self, codename):
+        # Noisy resistance measurements are averaged over more samples
+        if codename.find('resistance') > -1:
+            length = self.window
+        else:
+            length = 5
+        self.index[codename] = len(self.codenames)
+        self.codenames.append(codename)
+        self._samples = np.vstack([self._samples, np.zeros(self.window)])
+        self._times = np.vstack([self._times, np.full(self.window, -np.inf)])
+        self._next = np.append(self._next, 0)
+        self._length = np.append(self._length, length)
+        self._logged = np.append(self._logged, False)
+        self._comp_val = np.append(self._comp_val, 0)
+        self._log_comp = np.append(self._log_comp, False)
+        self._last_value = np.append(self._last_value, np.nan)
+        self._last_time = np.append(self._last_time, 0)
+        return self.index[codename]
+
+    def add_logger(self, codename, comp_val=0.5, comp_type='lin'):
+        """
+        Start logging codename, samples are kept also for codenames that
+        are not logged.
+        """
+        with self._lock:
+            row = self.index.get(codename)
+            if row is None:
+                row = self._add_row(codename)
+            self._logged[row] = True
+            self._comp_val[row] = comp_val
+            self._log_comp[row] = comp_type == 'log'
+
+    def logged_codenames(self):
+        with self._lock:
+            return [c for c, logged in zip(self.codenames, self._logged) if logged]
+
+    def unlogged_codenames(self):
+        """
+        Codenames that have received values but are not logged
+        """
+        with self._lock:
+            return [
+                c for c, logged in zip(self.codenames, self._logged) if not logged
+            ]
+
+    def _add_sample(self, codename, value, timestamp):
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            return False
+        row = self.index.get(codename)
+        if row is None:
+            row = self._add_row(codename)
+        position = self._next[row]
+        self._samples[row, position] = value
+        self._times[row, position] = timestamp
+        self._next[row] = (position + 1) % self._length[row]
+        return True
+
+    def _add_backdated(self, codename, value, timestamp):
+        row = self.index.get(codename)
+        if row is None or not self._logged[row]:
+            return
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            return
+        last_value = self._last_value[row]
+        if timestamp <= self._last_time[row]:
+            # Covered by a value that is already logged, eg. a resent frame
+            return
+        if self._log_comp[row]:
+            limit = self._comp_val[row] * abs(last_value)
+        else:
+            limit = self._comp_val[row]
+        time_trigged = timestamp - self._last_time[row] > self.maximumtime
+        # False for the initial nan
+        value_trigged = abs(value - last_value) >= limit
+        if time_trigged or value_trigged:
+            self._last_value[row] = value
+            self._last_time[row] = timestamp
+            self._backdated.append((codename, value, timestamp))
+
+    def add_value(self, codename, value, timestamp=None):
+        now = time.time()
+        if timestamp is None:
+            timestamp = now
+        with self._lock:
+            if now - timestamp > self.backdate_limit:
+                return self._add_backdated(codename, value, timestamp)
+            return self._add_sample(codename, value, timestamp)
+
+    def add_values(self, values):
+        """
+        Add a batch of (codename, value, timestamp), backdated samples of a
+        codename must be in chronological order.
+        """
+        now = time.time()
+        with self._lock:
+            for codename, value, timestamp in values:
+                if now - timestamp > self.backdate_limit:
+                    self._add_backdated(codename, value, timestamp)
+                else:
+                    self._add_sample(codename, value, timestamp)
+
+    def evaluate(self, now=None):
+        """
+        Update the mean of all codenames and find the values to be logged.
+        Returns a dict with the current mean (None if there are no recent
+        samples) of all logged codenames and a list of (codename, value,
+        timestamp) that should be saved, including backdated samples.
+        """
+        if now is None:
+            now = time.time()
+        with self._lock:
+            recent = (now - self._times) < self.max_age
+            counts = recent.sum(axis=1)
+            sums = np.where(recent, self._samples, 0).sum(axis=1)
+            has_value = counts > 0
+            with np.errstate(invalid='ignore', divide='ignore'):
+                means = sums / counts
+                limits = np.where(
+                    self._log_comp,
+                    self._comp_val * np.abs(self._last_value),
+                    self._comp_val,
+                )
+                # Comparisons with the initial nan are False, the first
+                # value is always logged due to the time trigger
+                value_trigged = np.abs(means - self._last_value) >= limits
+            time_trigged = (now - self._last_time) > self.maximumtime
+            trigged = self._logged & has_value & (time_trigged | value_trigged)
+            self._last_value[trigged] = means[trigged]
+            self._last_time[trigged] = now
+
+            values = {}
+            for row in np.flatnonzero(self._logged):
+                values[self.codenames[row]] = (
+                    float(means[row]) if has_value[row] else None
+                )
+            to_log = self._backdated
+            self._backdated = []
+            to_log += [
+                (self.codenames[row], float(means[row]), now)
+                for row in np.flatnonzero(trigged)
+            ]
+        return values, to_log
@@ -0,0 +1,168 @@
+import time
+import threading
+
+
+class BatchedPointWriter(threading.Thread):
+    """
+    Collect xy-points in memory and send them to the database in batches.
+
+    DataSetSaver.save_point() results in a single queue item and a single
+    insert for every point. Here points are grouped by codename (and thus
+    measurement id) and written with DataSetSaver.save_points_batch(), which
+    becomes a multi-row insert. A flush happens when batch_size points are
+    waiting, when the oldest waiting point is older than flush_interval or
+    when flush() is called.
+
+    Points are matched to measurement ids when written, so flush() must be
+    called before new measurements are added to the DataSetSaver. Points
+    for a codename without a measurement are dropped.
+    """
+
+    def __init__(self, data_set_saver, batch_size=500, flush_interval=1.0):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.data_set_saver = data_set_saver
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.quit = False
+
+        self._lock = threading.Lock()
+        self._wake_up = threading.Event()
+        self._pending = {}  # codename -> list of points
+        self._oldest_pending = None
+        self._flush_waiters = []
+
+        # Counters, see status()
+        self.backlog = 0
+        self.flushes = 0
+        self.flushed_points = 0
+        self.failed_flushes = 0
+        self.latest_flush_latency = 0
+        self.max_flush_latency = 0
+
+    def save_point(self, codename, point):
+        """
+        Queue a single point, same signature as DataSetSaver.save_point()
+        """
+        with self._lock:
+            self._pending.setdefault(codename, []).append(point)
+            if self._oldest_pending is None:
+                self._oldest_pending = time.time()
+            self.backlog += 1
+            full = self.backlog >= self.batch_size
+        if full:
+            self._wake_up.set()
+
+    def save_points(self, codename, points):
+        """
+        Queue a list of points for the same codename
+        """
+        with self._lock:
+            self._pending.setdefault(codename, []).extend(points)
+            if self._oldest_pending is None:
+                self._oldest_pending = time.time()
+            self.backlog += len(points)
+            full = self.backlog >= self.batch_size
+        if full:
+            self._wake_up.set()
+
+    def flush(self, timeout=10):
+        """
+        Write all waiting points and wait for the writer to finish.
+        Returns False if the points were not written within timeout.
+        """
+        flushed = threading.Event()
+        with self._lock:
+            self._flush_waiters.append(flushed)
+        self._wake_up.set()
+        return flushed.wait(timeout)
+
+    def status(self):
+        with self._lock:
+            status = {
+                'backlog': self.backlog,
+                'flushes': self.flushes,
+                'flushed_points': self.flushed_points,
+                'failed_flushes': self.failed_flushes,
+                'latest_flush_latency': self.latest_flush_latency,
+                'max_flush_latency': self.max_flush_latency,
+            }
+        return status
+
+    def _write_pending(self):
+        """
+        Write all waiting points, returns False if some of them failed and
+        were put back in the queue.
+        """
+        with self._lock:
+            pending = self._pending
+            self._pending = {}
+            self._oldest_pending = None
+        if not pending:
+            return True
+
+        t_start = time.time()
+        written = 0
+        dropped = 0
+        failed = {}
+        for codename, points in pending.items():
+            try:
+                self.data_set_saver.save_points_batch(
+                    codename, points, batchsize=self.batch_size
+                )
+                written += len(points)
+            except KeyError:
+                # No measurement was added for this codename, retrying will
+                # not help
+                print('No measurement for {}, dropping {} points'.format(
+                    codename, len(points)))
+                dropped += len(points)
+            except Exception as exception:  # Typically lost connection
+                print('Could not save batch for {}: {}'.format(codename, exception))
+                failed[codename] = points
+        latency = time.time() - t_start
+
+        with self._lock:
+            # Failed points are put back in front to be retried on next flush
+            for codename, points in failed.items():
+                points.extend(self._pending.get(codename, []))
+                self._pending[codename] = points
+            if failed:
+                self.failed_flushes += 1
+                self._oldest_pending = t_start
+            self.backlog -= written + dropped
+            self.flushes += 1
+            self.flushed_points += written
+            self.latest_flush_latency = latency
+            self.max_flush_latency = max(self.max_flush_latency, latency)
+        return not failed
+
+    def stop(self):
+        self.quit = True
+        self._wake_up.set()
+        self.join()
+
+    def run(self):
+        while not self.quit:
+            self._wake_up.wait(self.flush_interval / 4)
+            self._wake_up.clear()
+            with self._lock:
+                oldest = self._oldest_pending
+                full = self.backlog >= self.batch_size
+                waiters = self._flush_waiters
+                self._flush_waiters = []
+            # Points arriving during the write are not waited for, the
+            # waiters only need the points queued before they called flush()
+            all_written = True
+            if oldest is not None:
+                too_old = time.time() - oldest > self.flush_interval
+                if full or too_old or waiters:
+                    all_written = self._write_pending()
+            if all_written:
+                for flushed in waiters:
+                    flushed.set()
+            else:
+                # Wait for the retry of the failed points
+                with self._lock:
+                    self._flush_waiters = waiters + self._flush_waiters
+        self._write_pending()
@@ -6,6 +6,8 @@ from PyExpLabSys.common.database_saver import DataSetSaver, CustomColumn
 
 import credentials
 
+from batched_point_writer import BatchedPointWriter
+
 
 class NoiseSpectrumRecorder:
     def __init__(self, port='/dev/ttyUSB0'):
@@ -19,6 +21,8 @@ class NoiseSpectrumRecorder:
             credentials.passwd,
         )
         self.data_set_saver.start()
+        self.point_writer = BatchedPointWriter(self.data_set_saver)
+        self.point_writer.start()
         self.current_data = {
             'x': -1,
             'y': -1,
@@ -39,10 +43,10 @@ class NoiseSpectrumRecorder:
                 break
             delta_t = time.time() - t
             data = self.lock_in.read_x_and_y_noise()
-            self.data_set_saver.save_point('x_noise', (delta_t, data[0]))
-            self.data_set_saver.save_point('y_noise', (delta_t, data[1]))
-            self.data_set_saver.save_point('x_value', (delta_t, data[2]))
-            self.data_set_saver.save_point('y_value', (delta_t, data[3]))
+            self.point_writer.save_point('x_noise', (delta_t, data[0]))
+            self.point_writer.save_point('y_noise', (delta_t, data[1]))
+            self.point_writer.save_point('x_value', (delta_t, data[2]))
+            self.point_writer.save_point('y_value', (delta_t, data[3]))
             self.current_data.update({'x': data[2], 'y': data[3]})
 
     def _perform_sweeped_xy_measurement(self, time_pr_step, frequencies):
@@ -65,11 +69,11 @@ class NoiseSpectrumRecorder:
                 delta_t = time.time() - t
                 total_t = time.time() - t_start
                 data = self.lock_in.read_x_and_y_noise()
-                self.data_set_saver.save_point('freq', (total_t, freq))
-                self.data_set_saver.save_point('x_noise', (total_t, data[0]))
-                self.data_set_saver.save_point('y_noise', (total_t, data[1]))
-                self.data_set_saver.save_point('x_value', (total_t, data[2]))
-                self.data_set_saver.save_point('y_value', (total_t, data[3]))
+                self.point_writer.save_point('freq', (total_t, freq))
+                self.point_writer.save_point('x_noise', (total_t, data[0]))
+                self.point_writer.save_point('y_noise', (total_t, data[1]))
+                self.point_writer.save_point('x_value', (total_t, data[2]))
+                self.point_writer.save_point('y_value', (total_t, data[3]))
                 self.current_data = {'x': data[2], 'y': data[3], 'freq': freq}
 
     def _perform_spectrum_measurement(self, frequencies):
@@ -82,10 +86,10 @@ class NoiseSpectrumRecorder:
             if data is None:
                 print('Could not record data at {}Hz'.format(freq))
                 continue
-            self.data_set_saver.save_point('x_noise', (freq, data[0]))
-            self.data_set_saver.save_point('y_noise', (freq, data[1]))
-            self.data_set_saver.save_point('x_value', (freq, data[2]))
-            self.data_set_saver.save_point('y_value', (freq, data[3]))
+            self.point_writer.save_point('x_noise', (freq, data[0]))
+            self.point_writer.save_point('y_noise', (freq, data[1]))
+            self.point_writer.save_point('x_value', (freq, data[2]))
+            self.point_writer.save_point('y_value', (freq, data[3]))
             self.current_data = {'x': data[2], 'y': data[3], 'freq': freq}
 
     def _caluculate_frequency_steps(self, freq_high, freq_low, steps, log_scale=True):
@@ -164,6 +168,7 @@ class NoiseSpectrumRecorder:
         self._prepare_data_recording(metadata)
         frequencies = self._caluculate_frequency_steps(high, low, steps, log_scale)
         self._perform_spectrum_measurement(frequencies)
+        self.point_writer.flush()
         self.measurement_running = False
         print('record spectrum done')
 
@@ -177,6 +182,7 @@ class NoiseSpectrumRecorder:
         del metadata['voltage']  # This is recorded as y-value
         self._prepare_data_recording(metadata)
         self._perform_xy_measurement(acquisition_time)
+        self.point_writer.flush()
         self.measurement_running = False
         print('record_xy_measurement done')
 
@@ -190,6 +196,7 @@ class NoiseSpectrumRecorder:
         self._prepare_data_recording(metadata, frequency_as_y=True)
         frequencies = self._caluculate_frequency_steps(high, low, steps, log_scale)
         self._perform_sweeped_xy_measurement(time_pr_step, frequencies)
+        self.point_writer.flush()
         self.measurement_running = False
         print('record sweeped xy measurements done')
 
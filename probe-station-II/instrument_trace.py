@@ -0,0 +1,188 @@
+"""
+Latency tracing of the communication with the instruments.
+
+InstrumentTracer.trace() wraps the public methods of a driver and the write,
+query and read methods of its VISA/GPIB connection. Every driver call and
+every SCPI command or TSP script sent to the instrument is timed and added to
+a histogram pr. instrument and call, eg. 'back_gate.read_latest' and
+'back_gate.query :READ?'. A driver call is thus also counted in the commands
+it sends.
+"""
+import json
+import time
+import inspect
+import threading
+
+
+class LatencyHistogram(object):
+    """
+    Histogram of the time it takes an instrument to deliver a reading.
+    Bins are roughly logarithmic, in milliseconds.
+    """
+
+    BIN_EDGES = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000]
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.counts = [0] * (len(self.BIN_EDGES) + 1)
+            self.count = 0
+            self.total = 0
+            self.max = 0
+
+    def add(self, latency):
+        """
+        Add a single latency, given in seconds.
+        """
+        latency_ms = latency * 1000
+        index = len(self.BIN_EDGES)
+        for i, edge in enumerate(self.BIN_EDGES):
+            if latency_ms < edge:
+                index = i
+                break
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.total += latency_ms
+            self.max = max(self.max, latency_ms)
+
+    def summary(self):
+        with self._lock:
+            labels = ['<{}ms'.format(edge) for edge in self.BIN_EDGES]
+            labels.append('>={}ms'.format(self.BIN_EDGES[-1]))
+            summary = {
+                'count': self.count,
+                'mean_ms': self.total / self.count if self.count else None,
+                'max_ms': self.max,
+                'histogram': dict(zip(labels, self.counts)),
+            }
+        return summary
+
+
+def command_name(command):
+    """
+    Reduce a command to its name, arguments are removed to avoid
+    a new histogram for every value sent to the instrument:
+    ':SOUR:CURR 1e-6' -> ':SOUR:CURR', 'smu.source.level = 0.1' ->
+    'smu.source.level', for TSP scripts only the first line is used.
+    """
+    if isinstance(command, bytes):
+        command = command.decode(errors='replace')
+    command = str(command).strip()
+    lines = command.split('\n', 1)
+    name = lines[0].strip()
+    for separator in (' ', '=', '('):
+        name = name.split(separator)[0]
+    if len(lines) > 1:
+        name += ' ...'
+    return name[:40]
+
+
+class InstrumentTracer(object):
+    """
+    Collects the latency of all traced instrument calls and optionally
+    writes every call to a trace file (one json object pr. line).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.histograms = {}
+        self._trace_file = None
+
+    def _record(self, instrument, kind, command, t_start, duration):
+        key = '{}.{} {}'.format(instrument, kind, command).strip()
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = LatencyHistogram()
+                self.histograms[key] = histogram
+            if self._trace_file is not None:
+                line = {
+                    'time': t_start,
+                    'instrument': instrument,
+                    'kind': kind,
+                    'command': command,
+                    'duration': duration,
+                }
+                self._trace_file.write(json.dumps(line) + '\n')
+        histogram.add(duration)
+
+    def _wrap(self, function, instrument, kind, latest_command=None):
+        def traced(*args, **kwargs):
+            if latest_command is None:
+                # A driver method, the commands are traced on the connection
+                command = ''
+            elif kind == 'read':
+                # A read has no command, time it as part of the latest write
+                command = latest_command[0]
+            else:
+                command = args[0] if args else kwargs.get('message', '')
+                command = command_name(command)
+                latest_command[0] = command
+            t_start = time.time()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                duration = time.time() - t_start
+                self._record(instrument, kind, command, t_start, duration)
+        return traced
+
+    def trace(self, instrument, name):
+        """
+        Trace the communication of a driver, calls are recorded under name.
+        Returns the driver itself.
+        """
+        for method, _ in inspect.getmembers(type(instrument), inspect.isfunction):
+            if method.startswith('_'):
+                continue
+            wrapped = self._wrap(getattr(instrument, method), name, method)
+            setattr(instrument, method, wrapped)
+
+        latest_command = ['']
+        connection = getattr(instrument, 'instr', None)
+        if connection is not None and hasattr(connection, 'write'):
+            for kind in ('write', 'query', 'read'):
+                function = getattr(connection, kind, None)
+                if function is None:
+                    continue
+                wrapped = self._wrap(function, name, kind, latest_command)
+                setattr(connection, kind, wrapped)
+        elif hasattr(instrument, 'scpi_comm'):
+            # Without a connection object the commands are seen in scpi_comm()
+            wrapped = self._wrap(
+                instrument.scpi_comm, name, 'scpi_comm', latest_command
+            )
+            instrument.scpi_comm = wrapped
+        return instrument
+
+    def start_trace_file(self, filename):
+        self.stop_trace_file()
+        with self._lock:
+            self._trace_file = open(filename, 'w')
+
+    def stop_trace_file(self):
+        with self._lock:
+            if self._trace_file is not None:
+                self._trace_file.close()
+                self._trace_file = None
+
+    def summary(self):
+        """
+        Compact summary that fits in a single socket reply, the histogram
+        counts are given in the bins of LatencyHistogram.BIN_EDGES.
+        """
+        with self._lock:
+            histograms = list(self.histograms.items())
+        summary = {}
+        for key, histogram in sorted(histograms):
+            with histogram._lock:
+                summary[key] = {
+                    'count': histogram.count,
+                    'mean_ms': histogram.total / max(histogram.count, 1),
+                    'max_ms': histogram.max,
+                    'counts': list(histogram.counts),
+                }
+        return summary
@@ -22,14 +22,15 @@ class ProbeStationController(threading.Thread):
 
         self.pullsocket = DateDataPullSocket(
             'probestation',
-            ['status', 'v_xx', 'v_tot'],
-            timeouts=[999999, 3, 3],
+            ['status', 'v_xx', 'v_tot', 'instrument_latency'],
+            timeouts=[999999, 3, 3, 999999],
             port=9002,
         )
         self.pullsocket.start()
 
     def start_2point_double_stepped_v_source(self, **kwargs):
         # TODO: Check that measurement is not already running
+        self.measurement.stop()
         del self.measurement
         self.measurement = ProbeStation2PointDoubleSteppedVSource()
         t = threading.Thread(
@@ -40,6 +41,7 @@ class ProbeStationController(threading.Thread):
 
     def start_4point_double_stepped_i_source(self, **kwargs):
         # TODO: Check that measurement is not already running
+        self.measurement.stop()
         del self.measurement
         self.measurement = ProbeStation4PointDoubleSteppedISource()
         t = threading.Thread(
@@ -100,15 +102,16 @@ class ProbeStationController(threading.Thread):
             # Do not feed socket with old data, update v_xx only if a measurement
             # is running
             if self.measurement.current_measurement['type'] is not None:
-                if len(self.measurement.current_measurement['v_xx']) > 2:
-                    self.pullsocket.set_point_now(
-                        'v_xx', self.measurement.current_measurement['v_xx'][-1]
-                    )
+                v_xx = self.measurement.current_measurement['v_xx']
+                if len(v_xx) > 2:
+                    self.pullsocket.set_point_now('v_xx', v_xx.latest())
             status = {
                 'type': self.measurement.current_measurement['type'],
                 'start_time': self.measurement.current_measurement['start_time'],
             }
             self.pullsocket.set_point_now('status', status)
+            latency = self.measurement.tracer.summary()
+            self.pullsocket.set_point_now('instrument_latency', latency)
 
             if self.measurement.current_measurement['type'] is None:
                 # gate_v = self.measurement.read_gate(store_data=False)
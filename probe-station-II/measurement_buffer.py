@@ -0,0 +1,156 @@
+import threading
+
+import numpy as np
+
+
+def _missing_as_none(value):
+    # NaN is the only value not equal to itself
+    if value != value:
+        return None
+    return value
+
+
+class MeasurementBuffer(object):
+    """
+    Column based storage of the (time, value) points of a single channel
+    in the current measurement.
+
+    Times and values are kept in preallocated float64 arrays that are doubled
+    in size when full, so appending a point is amortized O(1). If max_length
+    is given the buffer acts as a ring buffer that keeps only the newest
+    max_length points.
+
+    len() and indexing works as for the list of (time, value) tuples
+    that used to hold the data. Missing values (None) are stored as NaN and
+    returned as None by indexing and latest(), slice() and snapshot() return
+    the arrays with NaN.
+    """
+
+    def __init__(self, max_length=None, initial_size=1024):
+        if max_length is not None:
+            initial_size = min(initial_size, max_length)
+        self.max_length = max_length
+        self.initial_size = initial_size
+        self._lock = threading.Lock()
+        self._allocate(initial_size)
+
+    def _allocate(self, size):
+        self._times = np.empty(size, dtype=np.float64)
+        self._values = np.empty(size, dtype=np.float64)
+        self._start = 0  # Index of the oldest point, moves only in ring mode
+        self._length = 0
+
+    def _grow(self):
+        # Growing only happens before the ring has wrapped, so the valid
+        # data is always found in [0:self._length]
+        size = 2 * len(self._times)
+        if self.max_length is not None:
+            size = min(size, self.max_length)
+        times = np.empty(size, dtype=np.float64)
+        values = np.empty(size, dtype=np.float64)
+        times[:self._length] = self._times[:self._length]
+        values[:self._length] = self._values[:self._length]
+        self._times = times
+        self._values = values
+
+    def _ordered_indices(self, start=None, stop=None):
+        capacity = len(self._times)
+        order = np.arange(self._length)[start:stop]
+        return (order + self._start) % capacity
+
+    def __len__(self):
+        return self._length
+
+    def __getitem__(self, index):
+        with self._lock:
+            if isinstance(index, slice):
+                indices = self._ordered_indices(index.start, index.stop)
+                indices = indices[::index.step]
+                values = self._values[indices].tolist()
+                values = [_missing_as_none(v) for v in values]
+                return list(zip(self._times[indices].tolist(), values))
+            if index < 0:
+                index += self._length
+            if not 0 <= index < self._length:
+                raise IndexError('MeasurementBuffer index out of range')
+            i = (self._start + index) % len(self._times)
+            return (float(self._times[i]), _missing_as_none(float(self._values[i])))
+
+    def append(self, t, value):
+        if value is None:
+            value = np.nan
+        with self._lock:
+            capacity = len(self._times)
+            if self._length == capacity:
+                if self.max_length is None or capacity < self.max_length:
+                    self._grow()
+                    capacity = len(self._times)
+                else:
+                    # Ring buffer is full, overwrite the oldest point
+                    self._start = (self._start + 1) % capacity
+                    self._length -= 1
+            i = (self._start + self._length) % capacity
+            self._times[i] = t
+            self._values[i] = value
+            self._length += 1
+
+    def extend(self, times, values):
+        """
+        Append a block of points given as two sequences of equal length.
+        """
+        times = np.asarray(times, dtype=np.float64)
+        values = np.asarray(values, dtype=np.float64)
+        if self.max_length is not None and len(times) > self.max_length:
+            times = times[-self.max_length:]
+            values = values[-self.max_length:]
+        n = len(times)
+        with self._lock:
+            while self._length + n > len(self._times):
+                if self.max_length is not None:
+                    if len(self._times) >= self.max_length:
+                        break
+                self._grow()
+            capacity = len(self._times)
+            # In ring mode, the oldest points are overwritten
+            overflow = max(0, self._length + n - capacity)
+            indices = (self._start + self._length + np.arange(n)) % capacity
+            self._times[indices] = times
+            self._values[indices] = values
+            self._start = (self._start + overflow) % capacity
+            self._length += n - overflow
+
+    def clear(self):
+        with self._lock:
+            self._allocate(self.initial_size)
+
+    def latest(self):
+        """
+        Return the newest point as a (time, value) tuple or None if
+        the buffer is empty. value is None if the reading was missing.
+        """
+        with self._lock:
+            if self._length == 0:
+                return None
+            i = (self._start + self._length - 1) % len(self._times)
+            return (float(self._times[i]), _missing_as_none(float(self._values[i])))
+
+    def slice(self, start=None, stop=None):
+        """
+        Return a copy of a range of the points as two arrays (times, values).
+        start and stop follows the usual python slicing conventions.
+        """
+        with self._lock:
+            indices = self._ordered_indices(start, stop)
+            return self._times[indices], self._values[indices]
+
+    def snapshot(self):
+        """
+        Return a consistent copy of all points as two arrays (times, values).
+        """
+        return self.slice()
+
+    def to_list(self):
+        """
+        Return all points as a list of (time, value) tuples, suitable for json.
+        """
+        return self[:]
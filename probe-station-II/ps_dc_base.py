@@ -123,10 +123,10 @@ class ProbeStationDCBase(ProbeStationMeasurementBase):
         # Todo: Check status if device is in compliance
 
         if function == 'v':
-            v_xx = (reading['source_value'],)
+            v_xx = reading['source_value']
             current = reading['value']
         else:
-            v_xx = (reading['value'],)
+            v_xx = reading['value']
             current = reading['source_value']
 
         data = {'v_xx': v_xx, 'current': current}
@@ -71,6 +71,14 @@ class ProbeStation2PointDoubleSteppedVSource(ProbeStationMeasurementBase):
             inner_node = 1  # Gate
             outer_node = 2  # Source
 
+        # Optionally run the entire inner sweep in the trigger models of the
+        # instruments rather than triggering every single point from here
+        hardware_sweep = params.get('hardware_sweep', False)
+        if hardware_sweep:
+            self.configure_hardware_sweep(
+                inner_steps, inner_node, delay=params['source_measure_delay']
+            )
+
         latest_inner = 0
         for outer_v in outer_steps:
             if self.current_measurement['type'] == 'aborting':
@@ -81,6 +89,10 @@ class ProbeStation2PointDoubleSteppedVSource(ProbeStationMeasurementBase):
             self.tsp_link.auto_zero_now(node=2)
             self.tsp_link.set_output_level(outer_v, node=outer_node)
 
+            if hardware_sweep:
+                self.run_hardware_sweep()
+                continue
+
             for inner_v in inner_steps:
                 if self.current_measurement['type'] == 'aborting':
                     # Measurement has been aborted, skip through the
@@ -103,6 +115,9 @@ class ProbeStation2PointDoubleSteppedVSource(ProbeStationMeasurementBase):
 
         time.sleep(2)
 
+        if hardware_sweep:
+            # Restore the single-point trigger model used by read()
+            self.prepare_tsp_triggers()
         data = self.read()
         v_from = data['v_backgate']
         if not self.aborted:
@@ -127,7 +142,8 @@ class ProbeStation2PointDoubleSteppedVSource(ProbeStationMeasurementBase):
             params = {
                 'autozero': False,
                 'readback': False,
-                'source_measure_delay':  1e-3
+                'source_measure_delay':  1e-3,
+                'hardware_sweep': False,
             },
             source={
                 'v_low': -0.2,
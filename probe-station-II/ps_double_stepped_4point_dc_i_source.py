@@ -76,6 +76,14 @@ class ProbeStation4PointDoubleSteppedISource(ProbeStationDCBase):
             inner_node = 1  # Gate
             outer_node = 2  # Source
 
+        # Optionally run the entire inner sweep in the trigger models of the
+        # instruments rather than triggering every single point from here
+        hardware_sweep = params.get('hardware_sweep', False)
+        if hardware_sweep:
+            self.configure_hardware_sweep(
+                inner_steps, inner_node, delay=params['source_measure_delay']
+            )
+
         latest_inner = 0
         for outer_v in outer_steps:
             if self.current_measurement['type'] == 'aborting':
@@ -86,6 +94,10 @@ class ProbeStation4PointDoubleSteppedISource(ProbeStationDCBase):
             self.tsp_link.auto_zero_now(node=2)
             self.tsp_link.set_output_level(outer_v, node=outer_node)
 
+            if hardware_sweep:
+                self.run_hardware_sweep()
+                continue
+
             for inner_v in inner_steps:
                 if self.current_measurement['type'] == 'aborting':
                     # Measurement has been aborted, skip through the
@@ -103,11 +115,14 @@ class ProbeStation4PointDoubleSteppedISource(ProbeStationDCBase):
                 if not self._check_I_source_status():
                     # TODO!!! This always returns True!!!!
                     return
-                # Todo: This is a 4 (3....) point measurement - read DMM!
-                self.read(read_dmm=False)
+                # The DMM reads the 2-point voltage
+                self.read(read_dmm=True)
 
         time.sleep(2)
 
+        if hardware_sweep:
+            # Restore the single-point trigger model used by read()
+            self.prepare_tsp_triggers()
         data = self.read()
         v_from = data['v_backgate']
         if not self.aborted:
@@ -133,7 +148,8 @@ class ProbeStation4PointDoubleSteppedISource(ProbeStationDCBase):
             params = {
                 'autozero': False,
                 'readback': False,
-                'source_measure_delay':  1e-3
+                'source_measure_delay':  1e-3,
+                'hardware_sweep': False,
             },
             source={
                 'i_low': -5e-4,
@@ -1,6 +1,8 @@
+import os
 import json
 import time
 import socket
+from concurrent.futures import ThreadPoolExecutor
 
 import numpy as np
 
@@ -12,19 +14,33 @@ from PyExpLabSys.common.database_saver import DataSetSaver, CustomColumn
 
 import credentials
 
+from measurement_buffer import MeasurementBuffer
+from batched_point_writer import BatchedPointWriter
+from instrument_trace import InstrumentTracer
+
 
 CURRENT_MEASUREMENT_PROTOTYPE = {
     'type': None,  # DC-sweep, AC-sweep
     'error': None,
     'start_time': 0,
     'current_time': 0,
-    'current': [],
-    'v_total': [],
-    'v_xx': [],
-    'v_backgate': [],  # Back gate voltage
-    'i_backgate': [],  # Bakc gate leak-current
 }
 
+# Each channel is stored as a MeasurementBuffer in current_measurement
+CURRENT_MEASUREMENT_CHANNELS = [
+    'current',
+    'v_total',
+    'v_xx',
+    'v_backgate',  # Back gate voltage
+    'i_backgate',  # Bakc gate leak-current
+]
+# Maximal number of points kept in memory pr channel, older points are
+# still available in the database. None will keep all points.
+CURRENT_MEASUREMENT_MAX_POINTS = 100000
+# If not None, every instrument call of a measurement is written to a trace
+# file in this directory
+TRACE_DIRECTORY = None
+
 
 # Todo: This is now in practice a TSP-link base
 # If we want to also implement fully software timed measurements (to be used
@@ -32,6 +48,10 @@ CURRENT_MEASUREMENT_PROTOTYPE = {
 class ProbeStationMeasurementBase(object):
     def __init__(self):
         self.current_measurement = CURRENT_MEASUREMENT_PROTOTYPE.copy()
+        for channel in CURRENT_MEASUREMENT_CHANNELS:
+            self.current_measurement[channel] = MeasurementBuffer(
+                max_length=CURRENT_MEASUREMENT_MAX_POINTS
+            )
         # Todo: Take ip from configuration
         self.tsp_link = Keithley2450(interface='lan', hostname='192.168.0.3')
         self.tsp_link.instr.timeout = 10000
@@ -39,6 +59,17 @@ class ProbeStationMeasurementBase(object):
         self.dmm = Keithley2100(
             interface='usbtmc', visa_string='USB::0x05E6::0x2100::INSTR'
         )
+        # read() reads the DMM in this thread while the TSP-link nodes measure
+        self._dmm_reader = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix='ps_dmm'
+        )
+        # Time in seconds from trigger to reading for the latest data point
+        self.acquisition_times = {}
+
+        # Latency of every instrument call, published by the controller
+        self.tracer = InstrumentTracer()
+        self.tracer.trace(self.tsp_link, 'tsp_link')
+        self.tracer.trace(self.dmm, 'dmm')
 
         self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
         self.sock.setblocking(1)
@@ -54,6 +85,8 @@ class ProbeStationMeasurementBase(object):
             credentials.passwd,
         )
         self.data_set_saver.start()
+        self.point_writer = BatchedPointWriter(self.data_set_saver)
+        self.point_writer.start()
 
     def _read_socket(self, cmd):
         try:
@@ -138,13 +171,22 @@ class ProbeStationMeasurementBase(object):
         stops, in this case keep the data for now.
         """
         if measurement_type is None:
+            self.point_writer.flush()
+            self.tracer.stop_trace_file()
             self.current_measurement['type'] = None
             self.current_measurement['error'] = error
         else:
             for key, value in self.current_measurement.items():
-                if isinstance(value, list):
-                    self.current_measurement[key].clear()
+                if isinstance(value, MeasurementBuffer):
+                    value.clear()
             if not keep_measuring:
+                if TRACE_DIRECTORY is not None:
+                    filename = '{}_{:.0f}.jsonl'.format(
+                        measurement_type, time.time()
+                    )
+                    self.tracer.start_trace_file(
+                        os.path.join(TRACE_DIRECTORY, filename)
+                    )
                 self.current_measurement.update(
                     {
                         'type': measurement_type,
@@ -157,17 +199,35 @@ class ProbeStationMeasurementBase(object):
 
         return True
 
-    def add_to_current_measurement(self, data_point: dict):
+    def add_to_current_measurement(self, data_point: dict, timestamp=None):
         """
         Here we store the data, both permenantly in the database
         and temporarely in the local dict self.current_measurement
+        :param timestamp: Unixtime of the data point, default is now
+        """
+        if timestamp is None:
+            timestamp = time.time()
+        now = timestamp - self.current_measurement['start_time']
+        for key, value in data_point.items():
+            channel = self.current_measurement.get(key)
+            if isinstance(channel, MeasurementBuffer):
+                channel.append(now, value)
+                self.point_writer.save_point(key, (now, value))
+        self.current_measurement['current_time'] = time.time()
+
+    def add_batch_to_current_measurement(self, data: dict, timestamps):
+        """
+        As add_to_current_measurement() but for a block of data points.
+        :param data: Dict of channel name -> array of values
+        :param timestamps: Array of unixtimes of the data points
         """
-        now = time.time() - self.current_measurement['start_time']
-        for key in self.current_measurement.keys():
-            if key in data_point:
-                value = data_point[key]
-                self.current_measurement[key].append((now, value))
-                self.data_set_saver.save_point(key, (now, value))
+        now = np.asarray(timestamps) - self.current_measurement['start_time']
+        for key, values in data.items():
+            channel = self.current_measurement.get(key)
+            if isinstance(channel, MeasurementBuffer):
+                channel.extend(now, values)
+                points = list(zip(now.tolist(), np.asarray(values).tolist()))
+                self.point_writer.save_points(key, points)
         self.current_measurement['current_time'] = time.time()
 
     def _add_metadata(
@@ -295,6 +355,7 @@ class ProbeStationMeasurementBase(object):
             source_range = max(abs(source['i_high']), abs(source['i_low']))
             source_function = 'i'
             sense_function = 'v'
+        self.source_function = source_function
 
         self.tsp_link.clear_output_queue()
         self.tsp_link.use_rear_terminals(node=1)
@@ -355,7 +416,30 @@ class ProbeStationMeasurementBase(object):
         self.tsp_link.load_script('execute_iteration', execute_iteration)
         print('Configure done')
 
+    def stop(self):
+        """
+        Stop the background threads, called before the controller replaces
+        the measurement object
+        """
+        self.point_writer.stop()
+        self._dmm_reader.shutdown(wait=True)
+
+    def _timed_read(self, read_function, t_trigger):
+        value = read_function()
+        return value, time.time() - t_trigger
+
     def read(self, read_dmm=False):
+        """
+        Trigger both nodes and read the result as a single data point,
+        timestamped at the trigger. With read_dmm, the DMM is read in
+        parallel with the TSP-link measurement. The time from trigger to
+        reading is available in self.acquisition_times.
+        """
+        t_trigger = time.time()
+        if read_dmm:
+            dmm_future = self._dmm_reader.submit(
+                self._timed_read, self.dmm.read_dc_voltage, t_trigger
+            )
         self.tsp_link.execute_script('execute_iteration')
         # This script always output exactly three lines
         gate = self.tsp_link.instr.read().strip().split(',')
@@ -372,6 +456,7 @@ class ProbeStationMeasurementBase(object):
         # current iteration number
         # Todo: Assert this...
         control = self.tsp_link.instr.read().strip()
+        self.acquisition_times = {'tsp_link': time.time() - t_trigger}
 
         # Todo: Check status if device is in compliance
         data = {
@@ -381,15 +466,218 @@ class ProbeStationMeasurementBase(object):
             'current': current,
         }
 
-        # TODO! This needs to be implemented and testet. The trigger is already
-        # running all we need is to make sure we can read fast enough from usb
         if read_dmm:
-            v_total = self.dmm.read_dc_voltage()
-            data['v_total'] = v_total
+            data['v_total'], self.acquisition_times['dmm'] = dmm_future.result()
 
-        self.add_to_current_measurement(data)
+        self.add_to_current_measurement(data, timestamp=t_trigger)
         return data
 
+    def configure_hardware_sweep(
+        self, inner_steps, inner_node, delay, gate_step=0.025, gate_rate=0.5
+    ):
+        """
+        Upload a complete inner sweep to the instruments. The steps are stored
+        in a source configuration list on the inner node, and the trigger models
+        on both nodes are set up to step through the entire list, with node 1
+        and node 2 handshaking every point over the TSP-link lines.
+
+        If the gate is the inner node, the steps are sub-divided and slowed down
+        to follow the same limits as _ramp_gate(). The sweep starts from 0V,
+        which is where _calculate_steps() leaves the previous sweep. The list
+        is stored with the output of the inner node turned off, the output
+        would otherwise follow every level as it is stored.
+
+        This replaces the single-point trigger model from prepare_tsp_triggers(),
+        which must be called again before using read().
+        :param inner_steps: List of source levels for the inner node
+        :param inner_node: The node to step, 1 (gate) or 2 (source)
+        :param delay: Delay from setting the level to measurement in seconds
+        """
+        if inner_node == 1:
+            levels = [0]
+            for level in inner_steps:
+                sub_steps = int(np.ceil(abs(level - levels[-1]) / gate_step))
+                if sub_steps > 1:
+                    ramp = np.linspace(levels[-1], level, sub_steps + 1)
+                    levels.extend(ramp[1:-1])
+                levels.append(level)
+            inner_steps = levels
+            delay = max(delay, gate_step / gate_rate)
+
+        n = len(inner_steps)
+        level_lines = []
+        for i in range(0, n, 10):
+            values = inner_steps[i:i + 10]
+            level_lines.append(', '.join('{:.9g}'.format(v) for v in values) + ',')
+        levels = '\n        '.join(level_lines)
+
+        config_1 = inner_node == 1
+        config_2 = inner_node == 2
+        sweepscript = """
+        local levels = {{
+        {levels}
+        }}
+        local level = node[{node}].smu.source.level
+        node[{node}].smu.source.output = node[{node}].smu.OFF
+        pcall(node[{node}].smu.source.configlist.delete, "innersweep")
+        node[{node}].smu.source.configlist.create("innersweep")
+        for i = 1, table.getn(levels) do
+            node[{node}].smu.source.level = levels[i]
+            node[{node}].smu.source.configlist.store("innersweep")
+        end
+        node[{node}].smu.source.level = level
+        node[{node}].smu.source.output = node[{node}].smu.ON
+
+        local n2 = node[2].trigger
+        trigger.model.load("Empty")
+        n2.model.load("Empty")
+
+        -- Node 1: Wait for the level to settle, trig node 2, measure and wait
+        -- for node 2 to finish its measurement
+        {recall_1}
+        trigger.model.setblock(2, trigger.BLOCK_DELAY_CONSTANT, {delay})
+        trigger.model.setblock(3, trigger.BLOCK_NOTIFY, trigger.EVENT_NOTIFY1)
+        trigger.model.setblock(4, trigger.BLOCK_NOTIFY, trigger.EVENT_NOTIFY2)
+        trigger.model.setblock(5, trigger.BLOCK_MEASURE_DIGITIZE)
+        trigger.model.setblock(6, trigger.BLOCK_WAIT, trigger.EVENT_TSPLINK2)
+        {next_1}
+        trigger.model.setblock(8, trigger.BLOCK_BRANCH_COUNTER, {n}, 2)
+
+        -- Node 2: Wait for node 1, measure and report back
+        {recall_2}
+        n2.model.setblock(2, n2.BLOCK_WAIT, n2.EVENT_TSPLINK1)
+        n2.model.setblock(3, n2.BLOCK_MEASURE_DIGITIZE)
+        n2.model.setblock(4, n2.BLOCK_NOTIFY, n2.EVENT_NOTIFY2)
+        {next_2}
+        n2.model.setblock(6, n2.BLOCK_BRANCH_COUNTER, {n}, 2)
+        """.format(
+            levels=levels,
+            node=inner_node,
+            n=n,
+            delay=delay,
+            recall_1=self._config_block(1, 1, 'recall', config_1),
+            next_1=self._config_block(1, 7, 'next', config_1),
+            recall_2=self._config_block(2, 1, 'recall', config_2),
+            next_2=self._config_block(2, 5, 'next', config_2),
+        )
+        self.tsp_link.load_script('sweepscript', sweepscript)
+        self.tsp_link.execute_script('sweepscript')
+
+    def _config_block(self, node, number, block, use_config_list):
+        """
+        Lua code for the configuration list blocks of the sweep trigger model.
+        Nodes that do not step through a configuration list gets a NOP-block.
+        n2 is the alias of node[2].trigger in the sweep script.
+        """
+        if node == 1:
+            trigger = 'trigger'
+        else:
+            trigger = 'n2'
+        if block == 'recall':
+            args = 'BLOCK_CONFIG_RECALL, "innersweep", 1'
+        else:
+            args = 'BLOCK_CONFIG_NEXT, "innersweep"'
+        if not use_config_list:
+            args = 'BLOCK_NOP'
+        return '{0}.model.setblock({1}, {0}.{2})'.format(trigger, number, args)
+
+    def _trigger_model_running(self):
+        state = self.tsp_link.instr.query('print(trigger.model.state())')
+        return any(s in state for s in ('RUNNING', 'WAITING', 'ABORTING'))
+
+    @staticmethod
+    def _parse_printbuffer(reply, columns):
+        """
+        The comma separated reply of printbuffer() as an array with one row
+        pr. reading
+        """
+        values = np.array(reply.strip().split(','), dtype=float)
+        return values.reshape(-1, columns)
+
+    def _parse_sweep_chunk(self, first, last):
+        """
+        Read and parse readings number first to last (both included) from the
+        buffers of both nodes. One printbuffer query is used pr. node.
+        """
+        cmd = (
+            'printbuffer({0}, {1}, node[1].defbuffer1.relativetimestamps, '
+            'node[1].defbuffer1, node[1].defbuffer1.sourcevalues)'
+        ).format(first, last)
+        gate_raw = self.tsp_link.instr.query(cmd)
+        gate = self._parse_printbuffer(gate_raw, 3)
+
+        cmd = (
+            'printbuffer({0}, {1}, node[2].defbuffer1, '
+            'node[2].defbuffer1.sourcevalues)'
+        ).format(first, last)
+        source_raw = self.tsp_link.instr.query(cmd)
+        source = self._parse_printbuffer(source_raw, 2)
+
+        if self.source_function == 'v':
+            current = source[:, 0]
+            v_xx = source[:, 1]
+        else:
+            current = source[:, 1]
+            v_xx = source[:, 0]
+        data = {
+            'relative_time': gate[:, 0],
+            'i_backgate': gate[:, 1],
+            'v_backgate': gate[:, 2],
+            'v_xx': v_xx,
+            'current': current,
+        }
+        return data
+
+    def _sweep_readings_available(self):
+        """
+        Number of readings that are stored in the buffers of both nodes
+        """
+        cmd = 'print(node[1].defbuffer1.endindex, node[2].defbuffer1.endindex)'
+        reply = self.tsp_link.instr.query(cmd)
+        return min(int(float(index)) for index in reply.split())
+
+    def run_hardware_sweep(self, chunk_size=500, poll_interval=0.25):
+        """
+        Run the sweep uploaded by configure_hardware_sweep() and store the
+        results. The sweep runs without interaction from the computer, while
+        it runs the new readings are read back in chunks of at most chunk_size
+        readings, so the data is available for live plots and the database
+        during the sweep.
+        If the measurement is aborted, the trigger models are stopped and the
+        readings performed so far are stored.
+        :return: False if the sweep was aborted, otherwise True
+        """
+        self.tsp_link.clear_buffer(node=1)
+        self.tsp_link.clear_buffer(node=2)
+        t_start = time.time()
+        self.tsp_link.instr.write('node[2].trigger.model.initiate()')
+        self.tsp_link.instr.write('trigger.model.initiate()')
+
+        completed = True
+        running = True
+        read = 0  # Number of readings already read back
+        while running:
+            # Check the state before reading the buffers, this way all
+            # readings are guaranteed to be read after the sweep ended
+            running = self._trigger_model_running()
+            if running and self.current_measurement['type'] == 'aborting':
+                self.tsp_link.instr.write('trigger.model.abort()')
+                self.tsp_link.instr.write('node[2].trigger.model.abort()')
+                completed = False
+                running = False
+
+            available = self._sweep_readings_available()
+            while read < available:
+                last = min(read + chunk_size, available)
+                data = self._parse_sweep_chunk(read + 1, last)
+                timestamps = t_start + data.pop('relative_time')
+                self.add_batch_to_current_measurement(data, timestamps)
+                read = last
+
+            if running:
+                time.sleep(poll_interval)
+        return completed
+
     def dummy_background_measurement(self):
         # This should be a simple measurement that runs
         # when nothing else is running and allowing to
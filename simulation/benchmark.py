@@ -0,0 +1,339 @@
+"""
+Benchmark of the measurement entry points against the simulated instruments.
+
+Every scenario is run in a separate python process (the measurement
+directories share module names) and reports:
+ - points/s of the primary channel of the measurement
+ - p50/p99 step latency, the time between two points of the primary channel
+ - the time spent in instrument I/O, in the bookkeeping of
+   add_to_current_measurement(), in enqueueing points in the BatchedPointWriter,
+   in explicit sleeps of the measurement code, and in the database writes of
+   the writer thread
+
+Instrument I/O, sleeps and database writes can happen in several threads at
+once, their totals can therefore add up to more than the wall time.
+
+    python3 benchmark.py                      # All scenarios, JSON on stdout
+    python3 benchmark.py --max-sleep 0.01 delta_gate_sweep
+    python3 benchmark.py --output new.json --compare old.json
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+import subprocess
+
+import numpy as np
+
+import simulated_instruments
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCENARIOS = {
+    'double_stepped_4point': {
+        'path': 'probe-station-II',
+        'module': 'ps_double_stepped_4point_dc_i_source',
+        'class': 'ProbeStation4PointDoubleSteppedISource',
+        'method': 'dc_4_point_measurement_i_source',
+        'primary': 'v_xx',
+        'kwargs': {
+            'comment': 'benchmark',
+            'inner': 'source',
+            'params': {
+                'autozero': False,
+                'readback': False,
+                'source_measure_delay': 1e-3,
+                'hardware_sweep': False,
+            },
+            'source': {
+                'i_low': -1e-4, 'i_high': 1e-4, 'repeats': 0, 'steps': 50,
+                'limit': 2, 'nplc': 1, 'step_type': 'linear',
+            },
+            'gate': {
+                'v_low': -1.0, 'v_high': 1.0, 'repeats': 0, 'steps': 4,
+                'limit': 1e-5, 'nplc': 1, 'step_type': 'linear',
+            },
+        },
+    },
+    'delta_gate_sweep': {
+        'path': 'cryostat-raspi01/electrical_measurements',
+        'module': 'cryostat_constant_current_gate_sweep_delta',
+        'class': 'CryostatDeltaConstantCurrentGateSweep',
+        'method': 'delta_constant_current_gate_sweep',
+        'primary': 'v_xx',
+        'kwargs': {
+            'comment': 'benchmark', 'current': 1e-6, 'v_low': -1, 'v_high': 1,
+            'steps': 10, 'repeats': 0, 'v_limit': 1, 'v_xx_range': 1, 'nplc': 1,
+        },
+    },
+    'differential_conductance': {
+        'path': 'cryostat-raspi01/electrical_measurements',
+        'module': 'cryostat_diff_conductance',
+        'class': 'CryostatDifferentialConductance',
+        'method': 'differential_conductance_measurement',
+        'primary': 'v_xx',
+        'kwargs': {
+            'comment': 'benchmark', 'start': -1e-5, 'stop': 1e-5, 'steps': 100,
+            'delta': 1e-7, 'v_limit': 1, 'nplc': 1,
+        },
+    },
+    'sweeped_one_shot_vdp': {
+        'path': 'linkam-raspi01',
+        'module': 'linkam_sweeped_one_shot_vdp',
+        'class': 'LinkamSweepedOneShotVDP',
+        'method': 'sweeped_one_shot_vdp',
+        'primary': 'lock_in_v1',
+        'kwargs': {
+            'comment': 'benchmark', 'v_low': -1, 'v_high': 1, 'compliance': 1e-6,
+            'steps': 50, 'repeats': 0, 'time_pr_step': 0.01, 'end_wait': 1,
+        },
+    },
+    'noise_spectrum': {
+        'path': 'noise-spectrum-raspi01',
+        'module': 'record_spectrum',
+        'class': 'NoiseSpectrumRecorder',
+        'method': 'record_spectrum',
+        'primary': 'x_noise',
+        'kwargs': {'comment': 'benchmark', 'high': 1000, 'low': 10, 'steps': 10},
+    },
+}
+
+
+class Timers(object):
+    """
+    Accumulated time and number of calls pr. category
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.time = {}
+        self.calls = {}
+
+    def add(self, category, duration):
+        with self._lock:
+            self.time[category] = self.time.get(category, 0) + duration
+            self.calls[category] = self.calls.get(category, 0) + 1
+
+    def wrap(self, category, function, exclude=()):
+        """
+        Return function timed as category. Time already accounted to the
+        categories in exclude while function runs is subtracted.
+        """
+        def timed(*args, **kwargs):
+            excluded = sum(self.time.get(c, 0) for c in exclude)
+            t = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                duration = time.perf_counter() - t
+                excluded = sum(self.time.get(c, 0) for c in exclude) - excluded
+                self.add(category, duration - excluded)
+        return timed
+
+
+class TimedSleep(object):
+    """
+    Replaces the time module of the measurement modules. Sleeps in
+    non-daemon threads (the measurement itself) are timed, and optionally
+    shortened to at most max_sleep.
+    """
+
+    def __init__(self, timers, max_sleep=None):
+        self._timers = timers
+        self._max_sleep = max_sleep
+
+    def __getattr__(self, name):
+        return getattr(time, name)
+
+    def sleep(self, duration):
+        if self._max_sleep is not None:
+            duration = min(duration, self._max_sleep)
+        if threading.current_thread().daemon:
+            time.sleep(duration)
+            return
+        t = time.perf_counter()
+        time.sleep(duration)
+        self._timers.add('sleep', time.perf_counter() - t)
+
+
+class StepRecorder(object):
+    """
+    Record the time at which points of the primary channel are enqueued
+    """
+
+    def __init__(self, codename):
+        self.codename = codename
+        self.times = []
+        self.points = 0
+
+    def record(self, codename, count):
+        if codename != self.codename:
+            return
+        now = time.perf_counter()
+        if self.times and count > 1:
+            # A block of points, spread the interval evenly over them
+            step = (now - self.times[-1]) / count
+            self.times.extend(self.times[-1] + step * (i + 1) for i in range(count))
+        else:
+            self.times.extend([now] * count)
+        self.points += count
+
+    def latencies(self):
+        return np.diff(self.times)
+
+
+def _instrument_measurement(measurement, timers, steps):
+    writer = measurement.point_writer
+    save_point = writer.save_point
+    save_points = writer.save_points
+
+    def enqueue_point(codename, point):
+        steps.record(codename, 1)
+        return save_point(codename, point)
+
+    def enqueue_points(codename, points):
+        points = list(points)
+        steps.record(codename, len(points))
+        return save_points(codename, points)
+
+    writer.save_point = timers.wrap('db_enqueue', enqueue_point)
+    writer.save_points = timers.wrap('db_enqueue', enqueue_points)
+    saver = measurement.data_set_saver
+    saver.save_points_batch = timers.wrap('db_write', saver.save_points_batch)
+
+    for name in ('add_to_current_measurement', 'add_batch_to_current_measurement'):
+        if hasattr(measurement, name):
+            function = timers.wrap(
+                'bookkeeping', getattr(measurement, name), exclude=('db_enqueue',)
+            )
+            setattr(measurement, name, function)
+
+
+def run_scenario(name, max_sleep=None):
+    """
+    Run a single scenario in this process and return the result as a dict
+    """
+    scenario = SCENARIOS[name]
+    simulated_instruments.install()
+    sys.path.insert(0, os.path.join(ROOT, scenario['path']))
+    module = __import__(scenario['module'])
+
+    timers = Timers()
+    sleeper = TimedSleep(timers, max_sleep)
+    measurement_dir = os.path.join(ROOT, scenario['path'])
+    for loaded in list(sys.modules.values()):
+        filename = getattr(loaded, '__file__', None) or ''
+        if filename.startswith(measurement_dir) and hasattr(loaded, 'time'):
+            loaded.time = sleeper
+
+    measurement = getattr(module, scenario['class'])()
+    steps = StepRecorder(scenario['primary'])
+    _instrument_measurement(measurement, timers, steps)
+
+    stats = simulated_instruments.STATISTICS
+    stats.reset()
+    t = time.perf_counter()
+    getattr(measurement, scenario['method'])(**scenario['kwargs'])
+    wall_time = time.perf_counter() - t
+    measurement.point_writer.flush()
+
+    latencies = steps.latencies()
+    if len(latencies) == 0:
+        latencies = np.array([np.nan])
+    result = {
+        'scenario': name,
+        'wall_time': wall_time,
+        'points': steps.points,
+        'points_pr_second': steps.points / wall_time,
+        'step_latency_p50': float(np.percentile(latencies, 50)),
+        'step_latency_p99': float(np.percentile(latencies, 99)),
+        'time': {
+            'instrument_io': stats.io_time,
+            'bookkeeping': timers.time.get('bookkeeping', 0),
+            'db_enqueue': timers.time.get('db_enqueue', 0),
+            'sleep': timers.time.get('sleep', 0),
+            'db_write': timers.time.get('db_write', 0),
+        },
+        'calls': {
+            'instrument_io': stats.io_calls,
+            'bookkeeping': timers.calls.get('bookkeeping', 0),
+            'db_enqueue': timers.calls.get('db_enqueue', 0),
+            'sleep': timers.calls.get('sleep', 0),
+            'db_write': timers.calls.get('db_write', 0),
+        },
+        'max_sleep': max_sleep,
+        'settings': simulated_instruments.SETTINGS,
+    }
+    return result
+
+
+def _run_in_subprocess(name, max_sleep):
+    cmd = [sys.executable, os.path.abspath(__file__), '--single', name]
+    if max_sleep is not None:
+        cmd += ['--max-sleep', str(max_sleep)]
+    # The measurement code prints a lot, only the last line is the result
+    process = subprocess.run(
+        cmd, stdout=subprocess.PIPE, cwd=os.path.dirname(os.path.abspath(__file__))
+    )
+    if process.returncode != 0:
+        return {'scenario': name, 'error': process.returncode}
+    return json.loads(process.stdout.decode().strip().split('\n')[-1])
+
+
+def compare(results, baseline):
+    """
+    Print the change of the main figures relative to an earlier run
+    """
+    old = {r['scenario']: r for r in baseline['results']}
+    for result in results:
+        previous = old.get(result['scenario'])
+        if previous is None or 'error' in result or 'error' in previous:
+            continue
+        print(result['scenario'], file=sys.stderr)
+        for key in ('points_pr_second', 'step_latency_p50', 'step_latency_p99'):
+            change = result[key] / previous[key] - 1 if previous[key] else np.nan
+            msg = '  {:<18} {:10.4g} -> {:10.4g} ({:+.1%})'
+            print(msg.format(key, previous[key], result[key], change),
+                  file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('scenarios', nargs='*', help='Default: all scenarios')
+    parser.add_argument('--max-sleep', type=float, default=None,
+                        help='Shorten sleeps of the measurement code to this')
+    parser.add_argument('--output', help='Write the JSON result to this file')
+    parser.add_argument('--compare', help='JSON result of an earlier run')
+    parser.add_argument('--single', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single:
+        result = run_scenario(args.single, args.max_sleep)
+        sys.stdout.flush()
+        print('\n' + json.dumps(result))
+        # Background threads of the measurement classes are not stopped
+        os._exit(0)
+
+    names = args.scenarios or list(SCENARIOS.keys())
+    results = []
+    for name in names:
+        print('Running {}'.format(name), file=sys.stderr)
+        results.append(_run_in_subprocess(name, args.max_sleep))
+
+    report = json.dumps({'time': time.time(), 'results': results}, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(report)
+    else:
+        print(report)
+
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            compare(results, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,832 @@
+"""
+Simulated instruments and database savers for running the measurement
+classes without hardware.
+
+install() registers drop-in replacements for the PyExpLabSys drivers and
+database savers (and for Gpib, pyvisa and credentials if they are missing)
+in sys.modules, so it must be called before the measurement modules are
+imported:
+
+    import simulated_instruments
+    simulated_instruments.install()
+    sys.path.insert(0, '../cryostat-raspi01/electrical_measurements')
+    from cryostat_4point_dc import Cryostat4PointDC
+
+All instruments are connected to a common SimulatedSample, a resistor with
+a gate, so the voltmeters measure what the current sources apply.
+
+Command latencies are looked up in SETTINGS['latency'], first as
+'ClassName.command' then as 'command', falling back to
+SETTINGS['default_latency']. Measurements additionally take their
+integration time (nplc / 50 s). The database savers write to an in-memory
+SQLite database with a latency of SETTINGS['db_latency'] pr. query and
+SETTINGS['db_row_latency'] pr. row.
+"""
+
+import re
+import sys
+import json
+import time
+import types
+import random
+import sqlite3
+import threading
+
+
+SETTINGS = {
+    'default_latency': 0.001,
+    'latency': {
+        # Observed on the real setups
+        'SR830.read_r_and_theta': 0.035,
+        'SR830.read_x_and_y': 0.035,
+        'SR830.read_x_and_y_noise': 0.07,
+        'SR830.estimate_noise_at_frequency': 1.0,
+        'Keithley2182.read_fresh': 0.01,
+        'Keithley2000.next_reading': 0.01,
+        'Keithley2100.read_dc_voltage': 0.02,
+        'Keithley6220.read_delta_measurement': 0.05,
+        'OxfordMercury': 0.05,
+    },
+    'noise': 1e-6,  # Relative noise of all readings
+    'error_rate': 0,  # Probability that a 2182 returns no reading
+    'db_latency': 0.002,
+    'db_row_latency': 0.00001,
+}
+
+
+class SimulatedSample(object):
+    """
+    The device under test: a gated resistor, R = r0 / (1 + k * Vg^2)
+    """
+
+    def __init__(self, r0=1000.0, gate_coupling=0.05, gate_leak=1e-9):
+        self.r0 = r0
+        self.gate_coupling = gate_coupling
+        self.gate_leak = gate_leak
+        self.current = 0.0
+        self.voltage = None  # Set when the sample is voltage sourced
+        self.gate_voltage = 0.0
+        self.front_gate_voltage = 0.0
+
+    def resistance(self):
+        return self.r0 / (1 + self.gate_coupling * self.gate_voltage ** 2)
+
+    def v_xx(self):
+        if self.voltage is not None:
+            return self.voltage
+        return self.current * self.resistance()
+
+    def i_xx(self):
+        if self.voltage is not None:
+            return self.voltage / self.resistance()
+        return self.current
+
+    def gate_current(self, voltage):
+        return voltage * self.gate_leak
+
+
+SAMPLE = SimulatedSample()
+
+
+class Statistics(object):
+    """
+    Counters of the time spent in simulated instrument communication
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.io_calls = 0
+            self.io_time = 0
+
+    def add_io(self, command):
+        with self._lock:
+            self.io_calls += 1
+
+    def add_io_time(self, duration):
+        with self._lock:
+            self.io_time += duration
+
+
+STATISTICS = Statistics()
+
+
+def _noisy(value):
+    return value * (1 + random.gauss(0, SETTINGS['noise'])) + random.gauss(
+        0, SETTINGS['noise'] * 1e-3
+    )
+
+
+class SimulatedVisa(object):
+    """
+    Stand-in for the pyvisa resource found as .instr on the drivers.
+    Lines written by the instrument are queued until read.
+    """
+
+    def __init__(self, owner):
+        self.owner = owner
+        self.timeout = 5000
+        self.output = []
+
+    def write(self, cmd):
+        self.owner._wait('write')
+        self.owner.handle_write(cmd)
+
+    def read(self):
+        self.owner._wait('read')
+        if not self.output:
+            raise IOError('Simulated VISA timeout, nothing to read')
+        return self.output.pop(0)
+
+    def query(self, cmd):
+        self.owner._wait('query')
+        return self.owner.handle_query(cmd)
+
+
+class SimulatedInstrument(object):
+    """
+    Base class of the simulated drivers. Configuration commands that
+    do not affect the simulation are accepted and recorded in self.settings.
+    """
+
+    CONFIG_PREFIXES = (
+        'set_', 'configure_', 'use_', 'clear_', 'output_', 'remote_', 'auto_',
+        'make_', 'reset_', 'stop_', 'scpi_comm', 'select_',
+    )
+    IDN = 'SIMULATED'
+
+    def __init__(self, *args, **kwargs):
+        self.connection_args = (args, kwargs)
+        self.settings = {}
+        self.instr = SimulatedVisa(self)
+        self.latest_error = ''
+        self.command_count = 0
+
+    def _wait(self, command, extra=0):
+        self.command_count += 1
+        STATISTICS.add_io(command)
+        latency = SETTINGS['latency']
+        name = type(self).__name__
+        delay = latency.get('{}.{}'.format(name, command))
+        if delay is None:
+            delay = latency.get(name, latency.get(command))
+        if delay is None:
+            delay = SETTINGS['default_latency']
+        time.sleep(delay + extra)
+        STATISTICS.add_io_time(delay + extra)
+
+    def __getattr__(self, name):
+        if not name.startswith(self.CONFIG_PREFIXES):
+            raise AttributeError(name)
+
+        def configure(*args, **kwargs):
+            self._wait(name)
+            self.settings[name] = (args, kwargs)
+            return True
+        return configure
+
+    def handle_write(self, cmd):
+        self.settings[cmd] = True
+
+    def handle_query(self, cmd):
+        if '*IDN?' in cmd:
+            return self.IDN
+        return ''
+
+    def read_software_version(self):
+        self._wait('read_software_version')
+        return self.IDN
+
+
+class Keithley6220(SimulatedInstrument):
+    IDN = 'KEITHLEY INSTRUMENTS INC.,MODEL 6221,SIM,0'
+
+    def set_current(self, current):
+        self._wait('set_current')
+        SAMPLE.voltage = None
+        SAMPLE.current = current
+        return True
+
+    def read_status(self):
+        self._wait('read_status')
+        return True
+
+    def prepare_delta_measurement(self, current, v_xx_range=None):
+        self._wait('prepare_delta_measurement')
+        SAMPLE.voltage = None
+        SAMPLE.current = current
+        return True
+
+    def read_delta_measurement(self):
+        self._wait('read_delta_measurement')
+        return _noisy(SAMPLE.v_xx()), time.time()
+
+    def end_delta_measurement(self):
+        self._wait('end_delta_measurement')
+        SAMPLE.current = 0
+        return True
+
+    def perform_differential_conductance_measurement(
+            self, start, stop, steps, delta, v_limit=None, nplc=None):
+        self._wait('perform_differential_conductance_measurement')
+        self.diff_conduct_sweep = [
+            start + (stop - start) * i / steps for i in range(steps + 1)
+        ]
+        return True
+
+    def read_diff_conduct_line(self):
+        self._wait('read_diff_conduct_line')
+        sweep = getattr(self, 'diff_conduct_sweep', None)
+        if not sweep:
+            return {}
+        SAMPLE.voltage = None
+        SAMPLE.current = sweep.pop(0)
+        return {
+            'reading': _noisy(SAMPLE.resistance()),
+            'avoltage': _noisy(SAMPLE.v_xx()),
+            'current': SAMPLE.current,
+            'time': time.time(),
+        }
+
+
+class Keithley2182(SimulatedInstrument):
+    IDN = 'KEITHLEY INSTRUMENTS INC.,MODEL 2182A,SIM,0'
+
+    def set_integration_time(self, nplc):
+        self.settings['nplc'] = nplc
+        return True
+
+    def read_fresh(self):
+        self._wait('read_fresh', self.settings.get('nplc', 1) / 50.0)
+        if random.random() < SETTINGS['error_rate']:
+            return None
+        return _noisy(SAMPLE.v_xx())
+
+
+class Keithley2000(SimulatedInstrument):
+    IDN = 'KEITHLEY INSTRUMENTS INC.,MODEL 2000,SIM,0'
+
+    def set_integration_time(self, nplc):
+        self.settings['nplc'] = nplc
+        return True
+
+    def _measure(self, command):
+        self._wait(command, self.settings.get('nplc', 1) / 50.0)
+        # The DMM measures the 2-point voltage, including contacts
+        return _noisy(1.1 * SAMPLE.v_xx())
+
+    def next_reading(self):
+        return self._measure('next_reading')
+
+    def read_dc_voltage(self):
+        return self._measure('read_dc_voltage')
+
+    def read_ac_voltage(self):
+        return self._measure('read_ac_voltage')
+
+
+class Keithley2100(Keithley2000):
+    IDN = 'KEITHLEY INSTRUMENTS INC.,MODEL 2100,SIM,0'
+
+
+class Keithley2400(SimulatedInstrument):
+    IDN = 'KEITHLEY INSTRUMENTS INC.,MODEL 2400,SIM,0'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.voltage = 0
+
+    def set_voltage(self, voltage):
+        self._wait('set_voltage')
+        self.voltage = voltage
+        SAMPLE.gate_voltage = voltage
+        return True
+
+    def read_voltage(self):
+        self._wait('read_voltage')
+        return _noisy(self.voltage)
+
+    def read_current(self):
+        self._wait('read_current')
+        return _noisy(SAMPLE.gate_current(self.voltage))
+
+
+class _SMUNode(object):
+    """
+    State of a single 2450 on the TSP-link, node 1 is the gate.
+    """
+
+    def __init__(self, number):
+        self.number = number
+        self.source_function = 'v'
+        self.level = 0.0
+        self.buffer = []  # (relative time, reading, source value)
+
+    def apply(self):
+        if self.number == 1:
+            SAMPLE.gate_voltage = self.level
+        elif self.source_function == 'v':
+            SAMPLE.voltage = self.level
+        else:
+            SAMPLE.voltage = None
+            SAMPLE.current = self.level
+
+    def measure(self, relative_time):
+        self.apply()
+        if self.number == 1:
+            reading = SAMPLE.gate_current(self.level)
+        elif self.source_function == 'v':
+            reading = SAMPLE.i_xx()
+        else:
+            reading = SAMPLE.v_xx()
+        point = (relative_time, _noisy(reading), self.level)
+        self.buffer.append(point)
+        return point
+
+
+class Keithley2450(SimulatedInstrument):
+    """
+    Used both as a stand-alone 2450 and as the master of the TSP-link.
+    Only the TSP scripts and queries used by the probe station are
+    understood.
+    """
+
+    IDN = 'KEITHLEY INSTRUMENTS,MODEL 2450,SIM,0'
+    MEASURE_TIME = 0.002  # Time pr. reading in the trigger model
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.nodes = {1: _SMUNode(1), 2: _SMUNode(2)}
+        self.scripts = {}
+        self.sweep = None  # (t_start, levels, inner node, delay) when running
+        self.t_zero = time.time()
+
+    # Stand-alone use
+    def set_voltage(self, voltage):
+        return self.set_output_level(voltage)
+
+    def set_output_level(self, level, node=1):
+        self._wait('set_output_level')
+        self.nodes[node].level = level
+        self.nodes[node].apply()
+        return True
+
+    def set_source_function(self, function, source_range=None, node=1):
+        self._wait('set_source_function')
+        self.nodes[node].source_function = function.lower()
+        return True
+
+    def clear_buffer(self, *args, node=1, **kwargs):
+        self._wait('clear_buffer')
+        self.nodes[node].buffer = []
+        self.t_zero = time.time()
+        return True
+
+    def trigger_measurement(self, node=1):
+        self._wait('trigger_measurement', self.MEASURE_TIME)
+        self.nodes[node].measure(time.time() - self.t_zero)
+        return True
+
+    def read_latest(self, node=1):
+        self._wait('read_latest')
+        if not self.nodes[node].buffer:
+            self.nodes[node].measure(time.time() - self.t_zero)
+        _, reading, source = self.nodes[node].buffer[-1]
+        return {'value': reading, 'source_value': source}
+
+    def read_voltage(self):
+        self._wait('read_voltage')
+        return _noisy(self.nodes[1].level)
+
+    # TSP-link use
+    def load_script(self, name, script):
+        self._wait('load_script')
+        self.scripts[name] = script
+
+    def execute_script(self, name):
+        self._wait('execute_script')
+        script = self.scripts[name]
+        if name == 'execute_iteration':
+            self._execute_iteration()
+        elif 'configlist.create' in script:
+            self._load_sweep(script)
+
+    def _execute_iteration(self):
+        output = self.instr.output
+        now = time.time() - self.t_zero
+        time.sleep(2 * self.MEASURE_TIME)
+        for node in (1, 2):
+            smu = self.nodes[node]
+            _, reading, source = smu.measure(now)
+            if node == 1 or smu.source_function == 'v':
+                unit = 'Amp DC'
+            else:
+                unit = 'Volt DC'
+            output.append('{}, {}, {}\n'.format(reading, unit, source))
+        output.append('end {0} {1}\n'.format(
+            len(self.nodes[1].buffer), len(self.nodes[2].buffer)))
+
+    def _load_sweep(self, script):
+        levels = re.search(r'local levels = \{(.*?)\}', script, re.S).group(1)
+        levels = [
+            float(v) for v in levels.replace('\n', ' ').split(',') if v.strip()
+        ]
+        node = re.search(r'node\[(\d)\]\.smu\.source\.configlist', script)
+        node = int(node.group(1))
+        delay = re.search(r'BLOCK_DELAY_CONSTANT, ([0-9.eE+-]+)', script)
+        delay = float(delay.group(1))
+        self.sweep_config = (levels, node, delay)
+
+    def _update_sweep(self):
+        """
+        Add the readings the trigger models would have made by now
+        """
+        if self.sweep is None:
+            return
+        t_start, levels, node, delay = self.sweep
+        period = delay + 2 * self.MEASURE_TIME
+        done = min(len(levels), int((time.time() - t_start) / period))
+        for i in range(len(self.nodes[1].buffer), done):
+            self.nodes[node].level = levels[i]
+            t = t_start - self.t_zero + i * period + delay
+            self.nodes[1].measure(t)
+            self.nodes[2].measure(t)
+        if done == len(levels):
+            self.sweep = None
+
+    def handle_write(self, cmd):
+        if cmd == 'trigger.model.initiate()' and hasattr(self, 'sweep_config'):
+            levels, node, delay = self.sweep_config
+            self.sweep = (time.time(), levels, node, delay)
+        elif 'trigger.model.abort()' in cmd:
+            self._update_sweep()
+            self.sweep = None
+
+    def handle_query(self, cmd):
+        self._update_sweep()
+        if 'trigger.model.state()' in cmd:
+            if self.sweep is None:
+                return 'trigger.STATE_IDLE\ttrigger.STATE_IDLE\t1\n'
+            return 'trigger.STATE_RUNNING\ttrigger.STATE_RUNNING\t5\n'
+        if 'endindex' in cmd:
+            return '{} {}\n'.format(
+                len(self.nodes[1].buffer), len(self.nodes[2].buffer))
+        if cmd.startswith('printbuffer'):
+            return self._printbuffer(cmd)
+        return super().handle_query(cmd)
+
+    def _printbuffer(self, cmd):
+        indices = re.findall(r'printbuffer\((\d+), (\d+)', cmd)[0]
+        first, last = [int(v) for v in indices]
+        node = self.nodes[int(re.search(r'node\[(\d)\]', cmd).group(1))]
+        values = []
+        for t, reading, source in node.buffer[first - 1:last]:
+            if 'relativetimestamps' in cmd:
+                values.append(t)
+            values.extend([reading, source])
+        return ', '.join('{:.9e}'.format(v) for v in values) + '\n'
+
+
+class SR830(SimulatedInstrument):
+    IDN = 'Stanford_Research_Systems,SR830,s/n00000,ver1.07'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.frequency = 1000.0
+
+    def use_internal_freq_reference(self, frequency):
+        self._wait('use_internal_freq_reference')
+        self.frequency = frequency
+        return True
+
+    def read_r_and_theta(self):
+        self._wait('read_r_and_theta')
+        r = _noisy(SAMPLE.v_xx() or 1e-6)
+        return r, _noisy(0.5), self.frequency
+
+    def read_x_and_y(self):
+        self._wait('read_x_and_y')
+        return _noisy(1e-6), _noisy(1e-8), self.frequency
+
+    def read_x_and_y_noise(self):
+        self._wait('read_x_and_y_noise')
+        return _noisy(1e-9), _noisy(1e-9), _noisy(1e-6), _noisy(1e-8)
+
+    def estimate_noise_at_frequency(self, frequency):
+        self._wait('estimate_noise_at_frequency')
+        self.frequency = frequency
+        return self.read_x_and_y_noise()
+
+    def time_constant(self):
+        self._wait('time_constant')
+        return 0.1
+
+    def sensitivity(self):
+        self._wait('sensitivity')
+        return 1e-3
+
+    def filter_slope(self):
+        self._wait('filter_slope')
+        return 12
+
+    def reserve_configuration(self):
+        self._wait('reserve_configuration')
+        return 'Normal'
+
+    def input_configuration(self):
+        self._wait('input_configuration')
+        return {'summary': 'A, AC, float'}
+
+
+class OxfordMercury(SimulatedInstrument):
+    IDN = 'IDN:OXFORD INSTRUMENTS:MERCURY IPS:SIM:0'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.field = 0.0
+        self.temperatures = {}
+
+    def read_magnet_details(self, uid):
+        self._wait('read_magnet_details')
+        return {
+            'voltage': (_noisy(0.01), 'V'),
+            'current': (_noisy(self.field * 10), 'A'),
+        }
+
+    def read_magnetic_field(self, uid):
+        self._wait('read_magnetic_field')
+        return (_noisy(self.field), 'T')
+
+    def b_field_setpoint(self, uid, setpoint):
+        self._wait('b_field_setpoint')
+        self.field = setpoint
+        return True
+
+    def temperature_setpoint(self, uid, setpoint):
+        self._wait('temperature_setpoint')
+        self.temperatures[uid] = setpoint
+        return True
+
+    def read_temperature(self, uid):
+        self._wait('read_temperature')
+        return (_noisy(self.temperatures.get(uid, 1.8)), 'K')
+
+    def read_pressure(self, uid):
+        self._wait('read_pressure')
+        return (_noisy(6.0), 'mB')
+
+    def read_heater(self, uid):
+        self._wait('read_heater')
+        return (_noisy(0.1), 'W')
+
+
+# Database savers
+
+
+class CustomColumn(object):
+    def __init__(self, value, format_string):
+        self.value = value
+        self.format_string = format_string
+
+
+def _db_wait(rows=1):
+    time.sleep(SETTINGS['db_latency'] + rows * SETTINGS['db_row_latency'])
+
+
+class _SQLiteCursor(object):
+    """
+    Accept the MySQL flavour of the queries used in this repository
+    """
+
+    def __init__(self, connection, lock):
+        self.cursor = connection.cursor()
+        self.lock = lock
+
+    @staticmethod
+    def _translate(query):
+        query = query.replace('FROM_UNIXTIME(%s)', '%s')
+        return query.replace('%s', '?')
+
+    def execute(self, query, args=()):
+        _db_wait()
+        with self.lock:
+            return self.cursor.execute(self._translate(query), args)
+
+    def executemany(self, query, args):
+        args = list(args)
+        _db_wait(len(args))
+        with self.lock:
+            return self.cursor.executemany(self._translate(query), args)
+
+    def fetchall(self):
+        return self.cursor.fetchall()
+
+
+class _SQLiteConnection(object):
+    def __init__(self, filename=':memory:'):
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(filename, check_same_thread=False)
+
+    def cursor(self):
+        return _SQLiteCursor(self.connection, self.lock)
+
+    def commit(self):
+        with self.lock:
+            self.connection.commit()
+
+    def close(self):
+        pass
+
+
+DATABASE = _SQLiteConnection()
+DATABASE.connection.executescript("""
+CREATE TABLE IF NOT EXISTS measurements (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, codename TEXT, metadata TEXT);
+CREATE TABLE IF NOT EXISTS xy_values (measurement INTEGER, x REAL, y REAL);
+CREATE TABLE IF NOT EXISTS continuous_codenames (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, codename TEXT UNIQUE);
+""")
+
+
+class DataSetSaver(object):
+    """
+    Stand-in for PyExpLabSys' DataSetSaver, the queue and thread of the
+    real saver is skipped and points are written at once.
+    """
+
+    def __init__(self, measurements_table, xy_values_table, username, password,
+                 measurement_specs=None):
+        self.measurement_ids = {}
+        self.saved_points = 0
+        self.queries = 0
+        self._lock = threading.Lock()
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def add_measurement(self, codename, metadata):
+        values = {}
+        for key, value in metadata.items():
+            if isinstance(value, CustomColumn):
+                value = value.value
+            values[key] = value
+        with self._lock:
+            cursor = DATABASE.cursor()
+            cursor.execute(
+                'INSERT INTO measurements (codename, metadata) VALUES (%s, %s)',
+                (codename, json.dumps(values, default=str)),
+            )
+            self.measurement_ids[codename] = cursor.cursor.lastrowid
+            self.queries += 1
+
+    def save_point(self, codename, point):
+        self.save_points_batch(codename, [point])
+
+    def save_points_batch(self, codename, values, batchsize=1000):
+        measurement_id = self.measurement_ids[codename]
+        values = list(values)
+        with self._lock:
+            for i in range(0, len(values), batchsize):
+                batch = values[i:i + batchsize]
+                DATABASE.cursor().executemany(
+                    'INSERT INTO xy_values (measurement, x, y) VALUES (%s, %s, %s)',
+                    [(measurement_id, x, y) for x, y in batch],
+                )
+                self.queries += 1
+            DATABASE.commit()
+            self.saved_points += len(values)
+
+    def get_unique_values_from_measurements(self, column):
+        return set()
+
+
+class ContinuousDataSaver(object):
+    """
+    Stand-in for PyExpLabSys' ContinuousDataSaver
+    """
+
+    def __init__(self, continuous_data_table, username, password,
+                 measurement_codenames=None):
+        self.connection = DATABASE
+        self.codename_translation = {}
+        self.saved_points = 0
+        DATABASE.connection.execute(
+            'CREATE TABLE IF NOT EXISTS {} ('
+            'type INTEGER, time REAL, value REAL)'.format(continuous_data_table)
+        )
+        self.table = continuous_data_table
+        for codename in measurement_codenames or []:
+            self.add_continuous_measurement(codename)
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def add_continuous_measurement(self, codename):
+        cursor = DATABASE.cursor()
+        cursor.execute(
+            'INSERT OR IGNORE INTO continuous_codenames (codename) VALUES (%s)',
+            (codename,),
+        )
+        cursor.execute(
+            'SELECT id FROM continuous_codenames WHERE codename = %s', (codename,)
+        )
+        self.codename_translation[codename] = cursor.fetchall()[0][0]
+
+    def save_point(self, codename, point):
+        DATABASE.cursor().execute(
+            'INSERT INTO {} (type, time, value) VALUES (%s, %s, %s)'.format(
+                self.table),
+            (self.codename_translation[codename], point[0], point[1]),
+        )
+        DATABASE.commit()
+        self.saved_points += 1
+
+    def save_point_now(self, codename, value):
+        now = time.time()
+        self.save_point(codename, (now, value))
+        return now
+
+
+# Registration in sys.modules
+
+DRIVERS = {
+    'keithley_6220': [Keithley6220],
+    'keithley_2182': [Keithley2182],
+    'keithley_2000': [Keithley2000],
+    'keithley_2100': [Keithley2100],
+    'keithley_2400': [Keithley2400],
+    'keithley_2450': [Keithley2450],
+    'srs_sr830': [SR830],
+    'oxford_mercury': [OxfordMercury],
+}
+
+
+def _module(name, **attributes):
+    module = types.ModuleType(name)
+    module.__dict__.update(attributes)
+    sys.modules[name] = module
+    return module
+
+
+def _missing(name):
+    try:
+        __import__(name)
+    except ImportError:
+        return True
+    return False
+
+
+def install(sample=None):
+    """
+    Make the simulated drivers and savers importable under their
+    PyExpLabSys names. PyExpLabSys modules not simulated here (sockets,
+    loggers, ...) are still imported from the real package if available.
+    """
+    global SAMPLE
+    if sample is not None:
+        SAMPLE = sample
+
+    try:
+        import PyExpLabSys
+        import PyExpLabSys.drivers
+        import PyExpLabSys.common
+    except ImportError:
+        PyExpLabSys = _module('PyExpLabSys')
+        PyExpLabSys.__path__ = []
+        PyExpLabSys.drivers = _module('PyExpLabSys.drivers')
+        PyExpLabSys.drivers.__path__ = []
+        PyExpLabSys.common = _module('PyExpLabSys.common')
+        PyExpLabSys.common.__path__ = []
+
+    for name, classes in DRIVERS.items():
+        module = _module(
+            'PyExpLabSys.drivers.' + name,
+            **{cls.__name__: cls for cls in classes}
+        )
+        setattr(PyExpLabSys.drivers, name, module)
+    module = _module(
+        'PyExpLabSys.common.database_saver',
+        DataSetSaver=DataSetSaver,
+        ContinuousDataSaver=ContinuousDataSaver,
+        CustomColumn=CustomColumn,
+    )
+    PyExpLabSys.common.database_saver = module
+
+    if _missing('Gpib'):
+        gpib_error = type('GpibError', (Exception,), {})
+        _module('Gpib', gpib=types.SimpleNamespace(GpibError=gpib_error),
+                Gpib=SimulatedInstrument)
+    if _missing('pyvisa'):
+        visa_error = type('VisaIOError', (IOError,), {})
+        _module('pyvisa', errors=types.SimpleNamespace(VisaIOError=visa_error))
+    if _missing('credentials'):
+        _module('credentials', user='simulation', passwd='simulation')